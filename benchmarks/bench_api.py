@@ -0,0 +1,275 @@
+"""Load test and latency benchmark for the webapi endpoints.
+
+By default runs in-process: imports webapi/app.py, loads a stand-in model (see
+standin_model.py; pass --model-dir for a real one) and sends requests through
+the ASGI app without a server. With --url it load-tests a running instance
+instead. Each endpoint is driven at every --concurrency level with distinct
+images (so the result cache does not hide inference cost), and the run reports
+throughput, p50/p95/p99 latency, errors and peak RSS (of this process and its
+workers in-process, or of --pid for a remote server).
+
+--save-baseline writes the results as JSON; --compare prints the change against
+such a file and exits with status 1 when throughput drops or p95 grows by more
+than --tolerance.
+
+    python benchmarks/bench_api.py [--url http://127.0.0.1:8000] [--concurrency 1,8] [--requests 64]
+        [--endpoints predict,predict_raw,predict_base64,predict_clipboard,convert_format]
+        [--save-baseline baseline.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+import psutil  # noqa: E402
+from PIL import Image  # noqa: E402
+
+ENDPOINTS = ["predict", "predict_raw", "predict_base64", "predict_clipboard", "convert_format"]
+
+LATEX_SAMPLES = [
+    r"\frac{a}{b} + \sqrt{x^{2} + y^{2}} = \alpha \beta",
+    r"\sum_{i=1}^{n} i = \frac{n(n+1)}{2}",
+    r"\int_{0}^{\infty} e^{-x} dx = 1",
+    r"\begin{align*} E &= mc^{2} \\ F &= ma \end{align*}",
+]
+
+
+def make_png(seed):
+    """A distinct noisy image per request; sizes vary like real formula crops."""
+    rng = np.random.default_rng(seed)
+    height, width = [(50, 120), (300, 700), (448, 448), (120, 900), (30, 30), (600, 600)][seed % 6]
+    arr = np.clip(rng.normal(rng.integers(0, 256), 40, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(arr).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def build_request(endpoint, seed):
+    """(path, keyword arguments for httpx) for one request to endpoint."""
+    if endpoint == "convert_format":
+        latex = LATEX_SAMPLES[seed % len(LATEX_SAMPLES)] + f" + {seed}"
+        return "/convert_format", {"data": {"latex_text": latex, "target_format": "typst"}}
+    png = make_png(seed)
+    if endpoint == "predict":
+        return "/predict", {"files": {"file": ("image.png", png, "image/png")}}
+    if endpoint == "predict_raw":
+        return "/predict_raw", {"content": png, "headers": {"Content-Type": "image/png"}}
+    encoded = base64.b64encode(png).decode()
+    if endpoint == "predict_clipboard":
+        return "/predict_clipboard", {"data": {"image_data": "data:image/png;base64," + encoded}}
+    return "/predict_base64", {"data": {"image_data": encoded}}
+
+
+class MemorySampler:
+    """Samples the RSS of a process and its children in the background, keeping the peak."""
+
+    def __init__(self, pid, interval=0.05):
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def rss(self):
+        total = 0
+        for process in [self.process] + self.process.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.rss())
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.peak = self.rss()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.peak
+
+
+async def run_load(client, endpoint, concurrency, count, seed_offset):
+    """Send count requests with at most concurrency in flight; returns (latencies, errors, seconds)."""
+    requests = [build_request(endpoint, seed_offset + i) for i in range(count)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], []
+
+    async def one(path, kwargs):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, **kwargs)
+                if response.status_code != 200:
+                    errors.append(f"HTTP {response.status_code}: {response.text[:200]}")
+                    return
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(path, kwargs) for path, kwargs in requests))
+    return latencies, errors, time.perf_counter() - start
+
+
+def summarize(latencies, errors, elapsed, count):
+    result = {"requests": count, "errors": len(errors), "seconds": round(elapsed, 3)}
+    result["throughput_rps"] = round(len(latencies) / elapsed, 2) if elapsed else 0.0
+    if latencies:
+        ms = np.array(latencies) * 1000
+        for name, q in (("p50_ms", 50), ("p95_ms", 95), ("p99_ms", 99)):
+            result[name] = round(float(np.percentile(ms, q)), 2)
+        result["mean_ms"] = round(float(ms.mean()), 2)
+    if errors:
+        result["first_error"] = errors[0]
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Print the change per endpoint/concurrency; returns the number of regressions."""
+    regressions = 0
+    print(f"\n{'run':<28} {'rps':>9} {'base':>9} {'change':>8} {'p95 ms':>9} {'base':>9} {'change':>8}")
+    for key, current in results["runs"].items():
+        base = baseline["runs"].get(key)
+        if base is None or "p95_ms" not in current or "p95_ms" not in base:
+            print(f"{key:<28} (no comparable baseline)")
+            continue
+        rps_change = current["throughput_rps"] / base["throughput_rps"] - 1 if base["throughput_rps"] else 0.0
+        p95_change = current["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        regressed = rps_change < -tolerance or p95_change > tolerance
+        regressions += regressed
+        print(
+            f"{key:<28} {current['throughput_rps']:>9.1f} {base['throughput_rps']:>9.1f} {rps_change:>+8.1%} "
+            f"{current['p95_ms']:>9.1f} {base['p95_ms']:>9.1f} {p95_change:>+8.1%}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    if baseline.get("meta", {}).get("cpus") != results["meta"]["cpus"]:
+        print("note: the baseline was recorded on a machine with a different CPU count")
+    return regressions
+
+
+async def run_benchmarks(args, client, pid):
+    concurrencies = [int(n) for n in args.concurrency.split(",") if n]
+    endpoints = [name for name in args.endpoints.split(",") if name]
+    runs = {}
+    sampler = MemorySampler(pid).start() if pid else None
+    rss_start = sampler.peak if sampler else None
+
+    print(f"{'endpoint':<18} {'conc':>4} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    seed = 0
+    for endpoint in endpoints:
+        for concurrency in concurrencies:
+            # warm-up requests are not counted (distinct seeds, so they don't pre-fill the cache)
+            await run_load(client, endpoint, concurrency, min(args.warmup, args.requests), 10**6 + seed)
+            latencies, errors, elapsed = await run_load(client, endpoint, concurrency, args.requests, seed)
+            seed += args.requests
+            result = summarize(latencies, errors, elapsed, args.requests)
+            runs[f"{endpoint}@{concurrency}"] = result
+            print(
+                f"{endpoint:<18} {concurrency:>4} {result['throughput_rps']:>9.1f} {result.get('p50_ms', 0):>9.1f} "
+                f"{result.get('p95_ms', 0):>9.1f} {result.get('p99_ms', 0):>9.1f} {len(errors):>7}"
+            )
+            if errors:
+                print(f"  first error: {errors[0]}")
+
+    memory = {}
+    if sampler:
+        memory = {"rss_start_mb": round(rss_start / 2**20, 1), "rss_peak_mb": round(sampler.stop() / 2**20, 1)}
+        print(f"RSS: {memory['rss_start_mb']} MiB at start, {memory['rss_peak_mb']} MiB peak")
+    return runs, memory
+
+
+async def run_in_process(args):
+    import app
+
+    model_dir = args.model_dir
+    if model_dir is None:
+        from standin_model import build_standin_model
+
+        model_dir = str(build_standin_model(Path(tempfile.mkdtemp(prefix="mixtex-standin-"))))
+    app.MODEL_PATHS = [os.path.abspath(model_dir)]
+    if not await asyncio.get_running_loop().run_in_executor(None, app.load_model):
+        raise SystemExit(f"could not load a model from {model_dir}")
+
+    transport = httpx.ASGITransport(app=app.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            return await run_benchmarks(args, client, os.getpid())
+    finally:
+        if app.worker_pool is not None:
+            app.worker_pool.close()
+
+
+async def run_remote(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        return await run_benchmarks(args, client, args.pid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--pid", type=int, help="server process to sample memory from (with --url)")
+    parser.add_argument("--model-dir", help="model for the in-process app (default: a fresh stand-in model)")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=8, help="uncounted requests before each run")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--save-baseline", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative change before flagging")
+    args = parser.parse_args()
+
+    if args.url:
+        runs, memory = asyncio.run(run_remote(args))
+    else:
+        # keep per-request logging out of the measurements
+        os.environ.setdefault("MIXTEX_LOG_LEVEL", "WARNING")
+        runs, memory = asyncio.run(run_in_process(args))
+
+    results = {
+        "meta": {
+            "target": args.url or f"in-process ({args.model_dir or 'stand-in model'})",
+            "serving_mode": os.environ.get("MIXTEX_SERVING_MODE", "thread") if not args.url else None,
+            "cpus": os.cpu_count(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "runs": runs,
+        "memory": memory,
+    }
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"saved baseline to {args.save_baseline}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
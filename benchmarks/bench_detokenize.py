@@ -0,0 +1,80 @@
+"""Per-token detokenization cost: per-step tokenizer.decode vs token IDs + one final decode.
+
+Encodes a long formula with the model's tokenizer, then replays its token IDs
+the way the generation loop sees them:
+
+  before: text += tokenizer.decode(token_id, skip_special_tokens=True) every step
+  after:  store the ID, push it through StreamingDetokenizer (used for the
+          repetition check), and call tokenizer.decode once at the end
+
+    python benchmarks/bench_detokenize.py [--model-dir model] [--repeat 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+import numpy as np  # noqa: E402
+from transformers import RobertaTokenizer  # noqa: E402
+
+from detokenize import StreamingDetokenizer, build_token_bytes  # noqa: E402
+
+LONG_FORMULA = (
+    r"\begin{align*} \mathcal{L}(\theta) &= -\frac{1}{N} \sum_{i=1}^{N} \log p_{\theta}(y_{i} \mid x_{i}) "
+    r"+ \lambda \left\| \theta \right\|_{2}^{2} \\ \nabla_{\theta} \mathcal{L} &= -\frac{1}{N} \sum_{i=1}^{N} "
+    r"\frac{\nabla_{\theta} p_{\theta}(y_{i} \mid x_{i})}{p_{\theta}(y_{i} \mid x_{i})} + 2 \lambda \theta "
+    r"\end{align*} 其中 \( \lambda > 0 \) 为正则化系数，\( \theta \in \mathbb{R}^{d} \)。"
+)
+
+
+def before(tokenizer, ids):
+    text = ""
+    for token_id in ids:
+        text += tokenizer.decode(token_id, skip_special_tokens=True)
+    return text
+
+
+def after(tokenizer, token_bytes, ids):
+    buffer = np.empty(len(ids), dtype=np.int64)
+    detokenizer = StreamingDetokenizer(token_bytes)
+    for step, token_id in enumerate(ids):
+        buffer[step] = token_id
+        detokenizer.push(token_id)
+    return tokenizer.decode(buffer.tolist(), skip_special_tokens=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", default=str(ROOT / "model"))
+    parser.add_argument("--repeat", type=int, default=20, help="timing repetitions")
+    args = parser.parse_args()
+
+    tokenizer = RobertaTokenizer.from_pretrained(args.model_dir)
+    token_bytes = build_token_bytes(tokenizer.get_vocab(), tokenizer.all_special_ids)
+
+    ids = tokenizer(LONG_FORMULA).input_ids[1:]
+    # cap at the generation limit, as the decode loop would
+    ids = (ids * (512 // len(ids) + 1))[:512]
+    print(f"{len(ids)} tokens")
+
+    expected = tokenizer.decode(ids, skip_special_tokens=True)
+    old_text = before(tokenizer, ids)
+    new_text = after(tokenizer, token_bytes, ids)
+    print(f"final decode matches tokenizer.decode(ids): {new_text == expected}")
+    print(f"per-step decode matches tokenizer.decode(ids): {old_text == expected}")
+
+    for name, run in [("before", lambda: before(tokenizer, ids)), ("after", lambda: after(tokenizer, token_bytes, ids))]:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        print(f"{name:>6}: {best * 1000:8.2f} ms per decode, {best / len(ids) * 1e6:7.2f} us per token")
+
+
+if __name__ == "__main__":
+    main()
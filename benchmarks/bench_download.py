@@ -0,0 +1,143 @@
+"""Model download against a local stand-in HTTP server: throughput, resume and verification.
+
+Serves a generated MixTex-B.zip (an onnx/ directory plus unrelated members) from
+a local server that supports Range requests and limits each connection to
+--rate MiB/s, like a CDN does. Then downloads it with webapi/downloader.py using
+1..N connections, interrupts a download half-way and resumes it, checks that a
+wrong SHA-256 is rejected, and extracts only onnx/ into a version directory.
+
+    python benchmarks/bench_download.py [--size-mb 64] [--rate 16] [--workers 1,4,8]
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+from downloader import DownloadError, DownloadProgress, download_file, extract_subdir  # noqa: E402
+
+
+def make_archive(path, size_mb):
+    """Write a zip laid out like the release asset; onnx/ holds incompressible data."""
+    rng_bytes = os.urandom(size_mb * 2**20)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("README.md", "stand-in release\n")
+        archive.writestr("onnx/decoder_model_merged.onnx", rng_bytes[: len(rng_bytes) // 2])
+        archive.writestr("onnx/encoder_model.onnx", rng_bytes[len(rng_bytes) // 2:])
+        archive.writestr("onnx/tokenizer.json", "{}")
+        archive.writestr("other/unused.bin", b"\0" * 2**20)
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves one file with Range support, a per-connection rate limit and an optional byte budget."""
+
+    data = b""
+    rate = 0
+    budget = None  # total bytes to send before dropping connections (simulates an interruption)
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _range(self):
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if not match:
+            return 0, len(self.data) - 1, False
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else len(self.data) - 1
+        return start, min(end, len(self.data) - 1), True
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.data)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", '"standin"')
+        self.end_headers()
+
+    def do_GET(self):
+        start, end, partial = self._range()
+        self.send_response(206 if partial else 200)
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.data)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        block = 256 * 1024
+        for offset in range(start, end + 1, block):
+            piece = self.data[offset: min(offset + block, end + 1)]
+            with RangeHandler.lock:
+                if RangeHandler.budget is not None:
+                    if RangeHandler.budget <= 0:
+                        self.close_connection = True
+                        return
+                    RangeHandler.budget -= len(piece)
+            self.wfile.write(piece)
+            if self.rate:
+                time.sleep(len(piece) / (self.rate * 2**20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--rate", type=float, default=16, help="per-connection limit in MiB/s (0 = unlimited)")
+    parser.add_argument("--workers", default="1,4,8", help="comma-separated connection counts")
+    parser.add_argument("--chunk-mb", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        sha256 = make_archive(tmp / "source.zip", args.size_mb)
+        RangeHandler.data = (tmp / "source.zip").read_bytes()
+        RangeHandler.rate = args.rate
+        server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/MixTex-B.zip"
+        chunk_size = args.chunk_mb * 2**20
+
+        print(f"{len(RangeHandler.data) / 2**20:.1f} MiB archive, {args.rate} MiB/s per connection")
+        print(f"{'connections':>11} {'seconds':>9} {'MiB/s':>9}")
+        for workers in [int(n) for n in args.workers.split(",") if n]:
+            dest = tmp / f"download-{workers}.zip"
+            start = time.perf_counter()
+            download_file(url, dest, sha256=sha256, chunk_size=chunk_size, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>11} {elapsed:>9.2f} {len(RangeHandler.data) / 2**20 / elapsed:>9.1f}")
+            dest.unlink()
+
+        # interrupted download: the server stops sending after 40% of the file
+        dest = tmp / "resumed.zip"
+        RangeHandler.budget = int(len(RangeHandler.data) * 0.4)
+        try:
+            download_file(url, dest, sha256=sha256, chunk_size=chunk_size, workers=4)
+            raise SystemExit("expected the interrupted download to fail")
+        except Exception as e:
+            print(f"interrupted: {type(e).__name__}")
+        RangeHandler.budget = None
+        progress = DownloadProgress()
+        download_file(url, dest, sha256=sha256, chunk_size=chunk_size, workers=4, progress=progress)
+        snapshot = progress.snapshot()
+        print(f"resumed: {snapshot['resumed_bytes'] / 2**20:.1f} MiB reused, "
+              f"{(snapshot['downloaded_bytes'] - snapshot['resumed_bytes']) / 2**20:.1f} MiB fetched")
+
+        try:
+            download_file(url, tmp / "bad.zip", sha256="0" * 64, chunk_size=chunk_size, workers=4)
+            raise SystemExit("expected a checksum mismatch")
+        except DownloadError as e:
+            print(f"checksum mismatch rejected: {not (tmp / 'bad.zip.part').exists()}")
+
+        version_dir = extract_subdir(dest, "onnx", tmp / "versions" / "standin")
+        print(f"extracted: {sorted(p.name for p in version_dir.iterdir())}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Latency of light clients next to a greedy one: FIFO vs per-client fair queueing.
+
+Drives webapi/inference_pool.InferencePool with a fake inference job (a sleep of
+--service-ms) so no model is needed. A greedy client keeps --greedy-inflight
+requests outstanding; --polite clients each send one request at a time with a
+think time in between. In "fifo" mode every request is submitted as the same
+client, which reduces the pool to its previous first-come-first-served queue;
+in "fair" mode each client is scheduled by its own finish tags.
+
+    python benchmarks/bench_fairness.py [--workers 2] [--duration 5] [--polite 3]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+from inference_pool import InferencePool, QueueFullError  # noqa: E402
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run_mode(mode, args):
+    pool = InferencePool(args.workers, args.queue, max_queue_per_client=args.queue)
+    latencies = {}
+    rejected = {}
+    deadline = time.monotonic() + args.duration
+
+    async def request(client):
+        start = time.monotonic()
+        try:
+            await pool.run(time.sleep, args.service_ms / 1000, client=client if mode == "fair" else "")
+        except QueueFullError:
+            rejected[client] = rejected.get(client, 0) + 1
+            await asyncio.sleep(args.service_ms / 1000)
+            return
+        latencies.setdefault(client, []).append(time.monotonic() - start)
+
+    async def greedy_loop():
+        while time.monotonic() < deadline:
+            await request("greedy")
+
+    async def polite_loop(client):
+        while time.monotonic() < deadline:
+            await request(client)
+            await asyncio.sleep(args.think_ms / 1000)
+
+    tasks = [greedy_loop() for _ in range(args.greedy_inflight)]
+    tasks += [polite_loop(f"polite-{i}") for i in range(args.polite)]
+    await asyncio.gather(*tasks)
+    pool._executor.shutdown()
+    return latencies, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--queue", type=int, default=64)
+    parser.add_argument("--service-ms", type=float, default=20)
+    parser.add_argument("--greedy-inflight", type=int, default=32)
+    parser.add_argument("--polite", type=int, default=3)
+    parser.add_argument("--think-ms", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, {args.service_ms:g} ms per request, greedy client with "
+          f"{args.greedy_inflight} in flight, {args.polite} polite clients")
+    print(f"{'mode':<5} {'client':<8} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'rejected':>8}")
+    for mode in ("fifo", "fair"):
+        latencies, rejected = asyncio.run(run_mode(mode, args))
+        polite = [value for client, values in latencies.items() if client != "greedy" for value in values]
+        groups = [("greedy", latencies.get("greedy", []), rejected.get("greedy", 0)),
+                  ("polite", polite, sum(n for client, n in rejected.items() if client != "greedy"))]
+        for name, values, shed in groups:
+            print(f"{mode:<5} {name:<8} {len(values):>8} {percentile(values, 0.5) * 1000:>8.1f} "
+                  f"{percentile(values, 0.95) * 1000:>8.1f} {shed:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Feedback submission latency and /statistics cost: CSV on the request path vs webapi/feedback_store.py.
+
+  csv    append a row (with the base64 image) to a CSV file and flush it per request,
+         statistics by reading the whole file back (the original design)
+  store  FeedbackStore.submit (bounded write-behind queue, SQLite WAL, images
+         deduplicated by hash), statistics from the incrementally maintained counts
+
+Each request carries one of --distinct screenshots, so most images are repeats.
+
+    python benchmarks/bench_feedback.py [--requests 5000] [--distinct 50]
+"""
+import argparse
+import base64
+import csv
+import io
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from feedback_store import FeedbackStore  # noqa: E402
+
+
+def make_images(count):
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(count):
+        image = np.full((80, 400, 3), 255, dtype=np.uint8)
+        image[20:60, rng.integers(0, 300):][:, :rng.integers(20, 100)] = 0
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, "PNG")
+        images.append("data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode())
+    return images
+
+
+def run_csv(path, requests):
+    latencies = []
+    with open(path, "a", newline="") as f:
+        writer = csv.writer(f)
+        for label, latex, image in requests:
+            start = time.perf_counter()
+            writer.writerow([time.time(), label, latex, image])
+            f.flush()
+            latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    with open(path, newline="") as f:
+        counts = Counter(row[1] for row in csv.reader(f))
+    return latencies, time.perf_counter() - start, sum(counts.values()), path.stat().st_size
+
+
+def run_store(path, requests):
+    store = FeedbackStore(path, max_pending=len(requests))
+    latencies = []
+    for label, latex, image in requests:
+        start = time.perf_counter()
+        store.submit(label, latex, image)
+        latencies.append(time.perf_counter() - start)
+    store.close()
+    store = FeedbackStore(path)
+    start = time.perf_counter()
+    stats = store.stats()
+    elapsed = time.perf_counter() - start
+    store.close()
+    size = sum(f.stat().st_size for f in path.parent.glob(path.name + "*"))
+    return latencies, elapsed, stats["total_count"], size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--distinct", type=int, default=50, help="distinct screenshots among the requests")
+    args = parser.parse_args()
+
+    images = make_images(args.distinct)
+    requests = [
+        ("Mistake" if i % 4 == 0 else "Perfect", f"\\frac{{a_{i}}}{{b}}", images[i % len(images)])
+        for i in range(args.requests)
+    ]
+
+    print(f"{args.requests} feedback requests, {args.distinct} distinct images")
+    print(f"{'backend':<7} {'p50 us':>8} {'p99 us':>8} {'stats ms':>9} {'rows':>6} {'disk MiB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, run in (("csv", run_csv), ("store", run_store)):
+            path = Path(directory) / ("feedback.csv" if name == "csv" else "feedback.db")
+            latencies, stats_seconds, rows, size = run(path, requests)
+            latencies.sort()
+            print(f"{name:<7} {statistics.median(latencies) * 1e6:>8.1f} "
+                  f"{latencies[int(0.99 * len(latencies))] * 1e6:>8.1f} {stats_seconds * 1000:>9.3f} "
+                  f"{rows:>6} {size / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Peak memory and time of image ingestion: the previous full decode vs webapi/ingest.py.
+
+For a large screenshot (default 7680x4320, as PNG and as JPEG) each path runs in a
+fresh Python process and reports the growth of its peak RSS while going from the
+request payload to the 448x448 canvas:
+
+  old-file    Image.open(BytesIO(contents)).convert("RGB")
+  old-base64  base64.b64decode + Image.open (+ convert in the preprocessor)
+  new-file    ingest.open_image (draft()/reduce() towards the target size)
+  new-base64  ingest.decode_base64 (chunked) + ingest.open_image
+
+The payload itself (bytes or base64 string) is created before the measurement
+starts. Requires Linux or macOS (resource.getrusage).
+
+    python benchmarks/bench_ingest.py [--width 7680] [--height 4320] [--repeat 3]
+"""
+import argparse
+import base64
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+PATHS = ["old-file", "old-base64", "new-file", "new-base64"]
+
+
+def make_screenshot(width, height, fmt):
+    """A white page with dark text-like strokes, so compression behaves like a real screenshot."""
+    rng = np.random.default_rng(0)
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    for _ in range(400):
+        x, y = rng.integers(0, width - 200), rng.integers(0, height - 40)
+        image[y:y + rng.integers(4, 40), x:x + rng.integers(20, 200)] = rng.integers(0, 80)
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def peak_rss():
+    # ru_maxrss of a child starts at the parent's peak on Linux; VmHWM belongs to this process only
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def child(path, payload_file):
+    from ingest import decode_base64, open_image
+    from preprocess import ImagePreprocessor
+
+    preprocessor = ImagePreprocessor()
+    contents = Path(payload_file).read_bytes()
+    encoded = base64.b64encode(contents).decode() if path.endswith("base64") else None
+    if encoded is not None:
+        del contents
+
+    before = peak_rss()
+    start = time.perf_counter()
+    if path == "old-file":
+        image = Image.open(io.BytesIO(contents)).convert("RGB")
+    elif path == "old-base64":
+        image = Image.open(io.BytesIO(base64.b64decode(encoded)))
+    elif path == "new-file":
+        image = open_image(contents, 0)
+    else:
+        image = open_image(decode_base64(encoded, 0), 0)
+    canvas = preprocessor.canvas(image)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"peak_mb": (peak_rss() - before) / 2**20, "ms": elapsed * 1000, "sum": int(canvas.sum())}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--width", type=int, default=7680)
+    parser.add_argument("--height", type=int, default=4320)
+    parser.add_argument("--repeat", type=int, default=3, help="processes per path; the minimum is reported")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    print(f"{args.width}x{args.height} screenshot, peak RSS growth from payload to canvas (min of {args.repeat})")
+    print(f"{'format':<6} {'path':<11} {'payload MiB':>11} {'peak MiB':>9} {'ms':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt in ("PNG", "JPEG"):
+            payload_file = Path(directory) / f"screenshot.{fmt.lower()}"
+            payload_file.write_bytes(make_screenshot(args.width, args.height, fmt))
+            size = payload_file.stat().st_size
+            for path in PATHS:
+                runs = []
+                for _ in range(args.repeat):
+                    output = subprocess.run(
+                        [sys.executable, __file__, "--child", path, str(payload_file)],
+                        check=True, capture_output=True, text=True,
+                    ).stdout
+                    runs.append(json.loads(output))
+                payload = size * 4 / 3 if path.endswith("base64") else size
+                print(f"{fmt:<6} {path:<11} {payload / 2**20:>11.1f} {min(r['peak_mb'] for r in runs):>9.1f} "
+                      f"{min(r['ms'] for r in runs):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Sweep ONNX Runtime session settings on this host and write the fastest as a config file.
+
+Each candidate builds fresh encoder/decoder sessions through
+webapi/ort_config.create_session (optimized-model cache off, so every candidate
+pays its own optimization) and times one request: encoder on a [batch, 3, 448,
+448] input plus a fixed number of greedy decoder steps through the IOBinding
+runner. The sweep is coordinate-wise: starting from the defaults, each setting
+(threads, optimization level, execution mode, memory arena, memory pattern) is
+varied in turn while the best values found so far are kept.
+
+The result is written as JSON for MIXTEX_ORT_CONFIG:
+
+    python benchmarks/bench_ort_sweep.py [--model-dir model] [--steps 64] [--batch 1]
+                                         [--repeat 5] [--output ort_config.json]
+    MIXTEX_ORT_CONFIG=ort_config.json python start.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+import numpy as np  # noqa: E402
+
+from decoder_runner import IOBindingRunner  # noqa: E402
+from ort_config import DEFAULT_SETTINGS, create_session  # noqa: E402
+
+START_IDS = [0, 0, 2]  # tokenizer("<s>").input_ids for the MixTeX RoBERTa tokenizer
+
+
+def thread_choices():
+    cores = os.cpu_count() or 1
+    return sorted({0, 1, max(1, cores // 2), cores})
+
+
+def candidates(key):
+    if key == "intra_op_num_threads":
+        return thread_choices()
+    if key == "graph_optimization_level":
+        return ["basic", "extended", "all"]
+    if key == "execution_mode":
+        return ["sequential", "parallel"]
+    return [True, False]
+
+
+def run_once(encoder, decoder, pixel_values, steps):
+    encoder_outputs = encoder.run(None, {"pixel_values": pixel_values})[0]
+    runner = IOBindingRunner(decoder, encoder_outputs, np.array([START_IDS] * pixel_values.shape[0], dtype=np.int64))
+    try:
+        for _ in range(steps):
+            logits = runner.run()
+            next_ids = np.argmax(logits[:, -1, :], axis=-1)
+            runner.advance(next_ids[:, None].astype(np.int64))
+    finally:
+        runner.close()
+
+
+def measure(model_dir, settings, pixel_values, steps, repeat):
+    settings = {**settings, "optimized_model_cache": False}
+    encoder = create_session(Path(model_dir) / "encoder_model.onnx", settings)
+    decoder = create_session(Path(model_dir) / "decoder_model_merged.onnx", settings)
+    run_once(encoder, decoder, pixel_values, steps)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_once(encoder, decoder, pixel_values, steps)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def describe(settings):
+    return ", ".join(f"{key}={settings[key]}" for key in DEFAULT_SETTINGS if key != "optimized_model_cache")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", default=str(ROOT / "model"))
+    parser.add_argument("--steps", type=int, default=64, help="decoder steps per request")
+    parser.add_argument("--batch", type=int, default=1, help="images per request")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per candidate (median is used)")
+    parser.add_argument("--output", default="ort_config.json", help="where to write the best settings")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    pixel_values = rng.uniform(-1, 1, (args.batch, 3, 448, 448)).astype(np.float32)
+
+    best = dict(DEFAULT_SETTINGS)
+    best_time = measure(args.model_dir, best, pixel_values, args.steps, args.repeat)
+    default_time = best_time
+    print(f"defaults: {best_time * 1000:8.1f} ms  ({describe(best)})")
+
+    for key in ["intra_op_num_threads", "graph_optimization_level", "execution_mode",
+                "enable_cpu_mem_arena", "enable_mem_pattern"]:
+        for value in candidates(key):
+            if value == best[key]:
+                continue
+            settings = {**best, key: value}
+            if key == "execution_mode" and value == "parallel":
+                settings["inter_op_num_threads"] = max(2, (os.cpu_count() or 1) // 2)
+            elapsed = measure(args.model_dir, settings, pixel_values, args.steps, args.repeat)
+            marker = ""
+            if elapsed < best_time:
+                best, best_time, marker = settings, elapsed, "  *"
+            print(f"{key + '=' + str(value):<40} {elapsed * 1000:8.1f} ms{marker}")
+
+    print(f"best:     {best_time * 1000:8.1f} ms  ({describe(best)})")
+    print(f"speedup over defaults: {default_time / best_time:.2f}x")
+
+    config = {key: value for key, value in best.items() if key != "optimized_model_cache"}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    print(f"wrote {args.output}; use it with MIXTEX_ORT_CONFIG={args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""LaTeX conversion: one pandoc process per call vs the persistent pandoc service.
+
+Compares pypandoc.convert_text (a new pandoc process per snippet) with
+webapi/pandoc_service.PandocService backed by `pandoc server`: distinct
+snippets one at a time, the same snippets again (LRU cache hits), and all
+snippets in one batch call. Also checks that a failing snippet in a batch only
+fails that snippet and that a killed server is restarted. Uses the stand-in
+pandoc from pandoc_standin.py unless --pandoc points at a real one.
+
+    python benchmarks/bench_pandoc.py [--pandoc /usr/bin/pandoc] [--snippets 50] [--to typst]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+from pandoc_service import PandocError, PandocService  # noqa: E402
+from pandoc_standin import make_executable  # noqa: E402
+
+SNIPPETS = [
+    r"\frac{a}{b} + \sqrt{x^{2} + y^{2}}",
+    r"\sum_{i=1}^{n} i = \frac{n(n+1)}{2}",
+    r"\int_{0}^{\infty} e^{-x} \, dx = 1",
+    r"\lim_{x \to 0} \frac{\sin x}{x} = 1",
+]
+
+
+def timed(label, count, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed * 1000 / count:>9.2f} ms/snippet")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pandoc", help="pandoc executable (default: the stand-in)")
+    parser.add_argument("--snippets", type=int, default=50)
+    parser.add_argument("--to", default="typst")
+    args = parser.parse_args()
+
+    pandoc = args.pandoc or make_executable(tempfile.mkdtemp(prefix="pandoc-standin-"))
+    os.environ["PYPANDOC_PANDOC"] = pandoc
+    from pypandoc import convert_text
+
+    texts = [f"\\( {SNIPPETS[i % len(SNIPPETS)]} + {i} \\)" for i in range(args.snippets)]
+    print(f"pandoc: {pandoc}, {args.snippets} snippets to {args.to}")
+
+    expected = timed("pypandoc, process per call", len(texts),
+                     lambda: [convert_text(text, to=args.to, format="latex") for text in texts])
+
+    service = PandocService(pandoc_path=pandoc)
+    try:
+        timed("service start", 1, lambda: service._ensure_started())
+        print(f"service mode: {service.mode}")
+        outputs = timed("service, distinct snippets", len(texts),
+                        lambda: [service.convert(text, args.to) for text in texts])
+        timed("service, cached snippets", len(texts), lambda: [service.convert(text, args.to) for text in texts])
+        fresh = [text + " " for text in texts]
+        batch = timed("service, one batch call", len(texts), lambda: service.convert_batch(fresh, args.to))
+        print(f"outputs match pypandoc: {[o.strip() for o in outputs] == [e.strip() for e in expected]}")
+        print(f"batch outputs ok: {not any(isinstance(o, PandocError) for o in batch)}")
+
+        if not args.pandoc:
+            mixed = service.convert_batch(["\\( x \\)", "\\( \\error \\)", "\\( y \\)"], args.to)
+            print(f"failing snippet isolated: {[isinstance(o, PandocError) for o in mixed] == [False, True, False]}")
+        if service._process is not None:
+            service._process.kill()
+            service._process.wait()
+            service.convert("\\( after restart \\)", args.to)
+            print(f"restarted after kill: {service.stats()['restarts'] == 1}")
+        print(f"stats: {service.stats()}")
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Image preprocessing: pad_image + ViTImageProcessor vs the fused ImagePreprocessor.
+
+Generates a set of images with varied sizes (smaller than, equal to and larger
+than 448x448, RGB and grayscale) and runs them through both paths:
+
+  before: image.convert("RGB") -> pad_image (PIL canvas, resize, paste)
+          -> ViTImageProcessor(return_tensors="np") -> np.concatenate
+  after:  ImagePreprocessor.canvas (uint8 canvas, one resize)
+          -> normalize_into_buffer (lookup-table normalize into a reused buffer)
+
+Checks that the padded canvases are byte-identical (they are the cache key) and
+that the float32 tensors agree with np.allclose, then reports images/sec. The
+same equivalence is asserted on fixed images by tests/test_preprocess.py.
+
+    python benchmarks/bench_preprocess.py [--model-dir model] [--images 64] [--batch 8]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+from transformers import ViTImageProcessor  # noqa: E402
+
+from preprocess import ImagePreprocessor, pad_image  # noqa: E402
+
+SIZES = [(120, 50), (700, 300), (448, 448), (200, 1000), (30, 30), (600, 600), (1600, 90), (447, 449)]
+
+
+def make_images(count, seed=0):
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        width, height = SIZES[i % len(SIZES)]
+        arr = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        image = Image.fromarray(arr)
+        if i % 5 == 4:
+            image = image.convert("L")
+        images.append(image)
+    return images
+
+
+def before(feature_extractor, images):
+    processed = [pad_image(image.convert("RGB"), (448, 448)) for image in images]
+    pixel_values = np.concatenate([feature_extractor(p, return_tensors="np").pixel_values for p in processed])
+    return processed, pixel_values
+
+
+def after(preprocessor, images):
+    canvases = [preprocessor.canvas(image) for image in images]
+    return canvases, preprocessor.normalize_into_buffer(canvases)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", default=str(ROOT / "model"))
+    parser.add_argument("--images", type=int, default=64, help="number of test images")
+    parser.add_argument("--batch", type=int, default=8, help="images per batch (the scheduler's batch size)")
+    args = parser.parse_args()
+
+    feature_extractor = ViTImageProcessor.from_pretrained(args.model_dir)
+    preprocessor = ImagePreprocessor.from_pretrained(args.model_dir)
+    images = make_images(args.images)
+    batches = [images[i : i + args.batch] for i in range(0, len(images), args.batch)]
+
+    max_diff = 0.0
+    canvases_equal = True
+    for batch in batches:
+        processed, expected = before(feature_extractor, batch)
+        canvases, actual = after(preprocessor, batch)
+        canvases_equal &= all(p.tobytes() == c.tobytes() for p, c in zip(processed, canvases))
+        if actual.shape != expected.shape or not np.allclose(actual, expected, rtol=1e-5, atol=1e-6):
+            print(f"MISMATCH in batch of {len(batch)}: shapes {actual.shape} vs {expected.shape}")
+            sys.exit(1)
+        max_diff = max(max_diff, float(np.abs(actual - expected).max()))
+    print(f"canvases byte-identical to pad_image: {canvases_equal}")
+    print(f"tensors allclose: True (max abs diff {max_diff:.2e})")
+    if not canvases_equal:
+        sys.exit(1)
+
+    for name, run in [
+        ("before", lambda batch: before(feature_extractor, batch)),
+        ("after", lambda batch: after(preprocessor, batch)),
+    ]:
+        start = time.perf_counter()
+        for batch in batches:
+            run(batch)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>6}: {len(images) / elapsed:8.1f} images/sec ({elapsed / len(images) * 1000:.2f} ms per image)")
+
+
+if __name__ == "__main__":
+    main()
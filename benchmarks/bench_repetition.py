@@ -0,0 +1,67 @@
+"""Microbenchmark for the decode-loop repetition detector.
+
+Times webapi/repetition.py's incremental RepetitionDetector against the
+original check_repetition over simulated 512-token decodes. That both make the
+same stop decisions is checked by tests/test_repetition.py.
+
+    python benchmarks/bench_repetition.py [--tokens 512]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "webapi"))
+
+from repetition import RepetitionDetector, check_repetition  # noqa: E402
+
+LATEX_TOKENS = [
+    "\\frac", "{", "}", "x", "^{", "2", "_{", "i", "\\alpha", " + ", " = ", "\\sum", "\\int",
+    "(", ")", "\\left", "\\right", " ", "\\\\", "&", "a", "b", "n", "1", "\\cdot", "\\sqrt",
+]
+
+
+def simulate_decode(tokens, step_check):
+    start = time.perf_counter()
+    for token in tokens:
+        if step_check(token):
+            break
+    return time.perf_counter() - start
+
+
+def benchmark(num_tokens, seed):
+    rng = random.Random(seed)
+    # a long non-repetitive formula, and one that degenerates into a loop at the end
+    clean = [rng.choice(LATEX_TOKENS) + str(i) for i in range(num_tokens)]
+    degenerate = clean[: num_tokens * 3 // 4] + ["x_{1} + "] * num_tokens
+
+    for name, tokens in [("clean", clean), ("degenerate", degenerate)]:
+        state = {"text": ""}
+
+        def old_check(token):
+            state["text"] += token
+            return check_repetition(state["text"], 21)
+
+        detector = RepetitionDetector(21)
+        old_time = simulate_decode(tokens, old_check)
+        new_time = simulate_decode(tokens, detector.feed)
+        print(
+            f"{name:>10}: {detector.length} chars checked | "
+            f"check_repetition {old_time * 1000:9.2f} ms | RepetitionDetector {new_time * 1000:7.2f} ms | "
+            f"speedup {old_time / new_time:7.1f}x"
+        )
+        assert detector.length == len(state["text"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=512, help="tokens per simulated decode")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    benchmark(args.tokens, args.seed)
+
+
+if __name__ == "__main__":
+    main()
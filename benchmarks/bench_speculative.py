@@ -0,0 +1,98 @@
+"""Speculative (prompt-lookup) decoding: tokens/sec and draft accept rate per draft length.
+
+Runs a formula corpus one image at a time (batch size 1, the case speculative
+decoding applies to) through webapi/generation.generate_batch with every
+--draft-tokens value and reports generated tokens per second, decoder calls per
+token, the share of drafted tokens that were accepted, the speedup over plain
+greedy decoding (draft length 0) and whether every output is identical to the
+greedy one. The cross-request n-gram table is cleared before each draft length
+and then fills up as the corpus runs, as it would on a server.
+
+Without --model-dir a fresh stand-in model is used (see standin_model.py); its
+outputs are not real formulas, so accept rates there say little about the real
+model. Without --images-dir the corpus is a set of rendered formula strings.
+
+    python benchmarks/bench_speculative.py [--model-dir model] [--images-dir formulas/]
+        [--draft-tokens 0,2,4,6,8] [--max-length 512] [--no-iobinding]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+from eval_variants import load_images  # noqa: E402
+from generation import generate_batch  # noqa: E402
+from metrics import DECODER_STEP_SECONDS, DRAFT_TOKENS, GENERATED_TOKENS  # noqa: E402
+from model_loader import build_model  # noqa: E402
+from speculative import ngram_table  # noqa: E402
+
+
+def counters():
+    drafted = DRAFT_TOKENS.snapshot()
+    return {
+        "tokens": sum(total for _, total, _ in GENERATED_TOKENS.snapshot().values()),
+        "calls": sum(count for _, _, count in DECODER_STEP_SECONDS.snapshot().values()),
+        "accepted": drafted.get(("accepted",), 0),
+        "rejected": drafted.get(("rejected",), 0),
+    }
+
+
+def run_corpus(model, corpus, draft_tokens, max_length, use_iobinding):
+    ngram_table.clear()
+    before = counters()
+    outputs = []
+    start = time.perf_counter()
+    for pixel_values in corpus:
+        outputs.extend(generate_batch(model, pixel_values, [max_length], use_iobinding, draft_tokens=draft_tokens))
+    elapsed = time.perf_counter() - start
+    after = counters()
+    return outputs, elapsed, {name: after[name] - before[name] for name in after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", help="model directory (default: a fresh stand-in model)")
+    parser.add_argument("--images-dir", help="folder of formula images (default: rendered sample formulas)")
+    parser.add_argument("--draft-tokens", default="0,2,4,6,8", help="comma-separated draft lengths; 0 is greedy")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--no-iobinding", action="store_true", help="use the session.run decoder runner")
+    args = parser.parse_args()
+
+    model_dir = args.model_dir
+    if model_dir is None:
+        from standin_model import build_standin_model
+
+        model_dir = str(build_standin_model(Path(tempfile.mkdtemp(prefix="mixtex-standin-"))))
+    model = build_model(model_dir)
+    images = load_images(args.images_dir)
+    corpus = [model.preprocessor([image]) for _, image in images]
+    use_iobinding = not args.no_iobinding
+    print(f"{len(corpus)} images, model {model_dir}, {'iobinding' if use_iobinding else 'session.run'} runner")
+
+    # warm-up, not measured
+    run_corpus(model, corpus[:2], 0, args.max_length, use_iobinding)
+
+    draft_lengths = [int(n) for n in args.draft_tokens.split(",") if n.strip()]
+    if 0 not in draft_lengths:
+        draft_lengths.insert(0, 0)
+    print(f"{'draft':>5} {'tokens/s':>9} {'calls/token':>11} {'accept':>7} {'speedup':>8} {'identical':>10}")
+    greedy_outputs, greedy_seconds = None, None
+    for draft_tokens in sorted(draft_lengths):
+        outputs, elapsed, stats = run_corpus(model, corpus, draft_tokens, args.max_length, use_iobinding)
+        if draft_tokens == 0:
+            greedy_outputs, greedy_seconds = outputs, elapsed
+        drafted = stats["accepted"] + stats["rejected"]
+        identical = sum(a == b for a, b in zip(outputs, greedy_outputs))
+        print(
+            f"{draft_tokens:>5} {stats['tokens'] / elapsed:>9.1f} {stats['calls'] / max(stats['tokens'], 1):>11.2f} "
+            f"{(stats['accepted'] / drafted if drafted else 0.0):>7.1%} {greedy_seconds / elapsed:>7.2f}x "
+            f"{identical:>5}/{len(outputs)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
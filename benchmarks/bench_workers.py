@@ -0,0 +1,90 @@
+"""Process-mode scaling: throughput and memory for 1..N inference worker processes.
+
+For each worker count, starts a webapi/workers.WorkerPool (shared-weight
+sessions, one batch scheduler per process), waits until every worker is ready,
+then submits the same set of images from many threads and reports images/sec
+plus per-worker RSS and USS (USS excludes the shared, memory-mapped weights, so
+the total USS shows how much each additional worker really costs).
+
+    python benchmarks/bench_workers.py [--model-dir model] [--workers 1,2,4] [--images 64]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from generation import InferenceItem  # noqa: E402
+from model_loader import build_model  # noqa: E402
+from ort_config import DEFAULT_SETTINGS  # noqa: E402
+from workers import WorkerPool  # noqa: E402
+
+
+def make_canvases(preprocessor, count):
+    rng = np.random.default_rng(0)
+    canvases = []
+    for i in range(count):
+        arr = np.clip(rng.normal(60 + 3 * i, 40, (80 + i % 5 * 20, 300, 3)), 0, 255).astype(np.uint8)
+        canvases.append(preprocessor.canvas(Image.fromarray(arr)))
+    return canvases
+
+
+def run(num_workers, args, canvases):
+    threads = max(1, (os.cpu_count() or 1) // num_workers)
+    settings = {**DEFAULT_SETTINGS, "intra_op_num_threads": threads}
+    pool = WorkerPool(num_workers, {
+        "model_path": args.model_dir,
+        "variant": "fp32",
+        "tokenizer_backend": "fast",
+        "ort_settings": {"encoder": settings, "decoder": settings},
+        "use_iobinding": True,
+        "batch_max_size": args.batch,
+        "batch_max_wait_ms": 10,
+    })
+    try:
+        while not all(worker["ready"] for worker in pool.stats()):
+            time.sleep(0.1)
+        submit = lambda canvas: pool.submit(InferenceItem(canvas, args.max_length, None, None)).result()  # noqa: E731
+        with ThreadPoolExecutor(num_workers * args.batch) as executor:
+            list(executor.map(submit, canvases[: num_workers * args.batch]))  # warm-up
+            start = time.perf_counter()
+            list(executor.map(submit, canvases))
+            elapsed = time.perf_counter() - start
+        stats = pool.stats()
+    finally:
+        pool.close()
+
+    rss = sum(worker.get("rss_bytes", 0) for worker in stats) / 2**20
+    uss = sum(worker.get("uss_bytes", 0) for worker in stats) / 2**20
+    print(f"{num_workers:>7} {len(canvases) / elapsed:>12.1f} {rss:>14.1f} {uss:>14.1f} {uss / num_workers:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", default=str(ROOT / "model"))
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=8, help="batch size per worker")
+    parser.add_argument("--max-length", type=int, default=512)
+    args = parser.parse_args()
+
+    # the front process only needs the preprocessor; this also exports the shared-weight
+    # files once instead of letting every worker race to create them
+    model = build_model(args.model_dir, load_sessions=False, shared_weights=True)
+    canvases = make_canvases(model.preprocessor, args.images)
+
+    print(f"{os.cpu_count()} CPUs, {args.images} images")
+    print(f"{'workers':>7} {'images/sec':>12} {'total RSS MiB':>14} {'total USS MiB':>14} {'USS/worker':>14}")
+    for num_workers in [int(n) for n in args.workers.split(",") if n]:
+        run(num_workers, args, canvases)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Native LaTeX-to-Typst/Markdown converter: coverage, agreement with pandoc and speed.
+
+Builds a corpus from typical model outputs (inline formulas in text, align*
+blocks, matrices, cases), one snippet per LaTeX command found in the tokenizer's
+vocab.json (--vocab) and optionally a file of real outputs (--corpus, one JSON
+string or raw snippet per line). For every snippet it reports whether
+webapi/latex_converter.py handles it natively or falls back to pandoc, lists
+vocab commands the converter does not support, and, when a real pandoc is
+available, compares the native output with pandoc's (ignoring whitespace) and
+the per-snippet time of both. Exits with status 1 when --min-agreement is not
+met.
+
+--all-commands adds a snippet for every command the converter supports, not
+just those in a vocab. --render compiles Typst outputs whose text differs with
+the typst Python package (pip install typst) and counts them as agreeing when
+both render to the same image; native outputs that do not compile are listed.
+
+    python benchmarks/eval_latex_converter.py [--vocab model/vocab.json] [--corpus outputs.jsonl]
+        [--all-commands] [--pandoc /usr/bin/pandoc] [--to typst,markdown] [--render] [--show 10]
+        [--min-agreement 0.9]
+"""
+import argparse
+import json
+import re
+import shutil
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+from latex_converter import (  # noqa: E402
+    ESCAPED,
+    FUNCTIONS,
+    SPACES,
+    SYMBOLS,
+    UnsupportedLatex,
+    WRAPPERS,
+    convert_latex,
+    supported_command,
+    vocab_commands,
+)
+from pandoc_service import PandocError, PandocService  # noqa: E402
+
+BUILTIN_CORPUS = [
+    r"\(\frac{a}{b} + \sqrt{x^{2} + y^{2}} = \alpha \beta\)",
+    r"\(\sum_{i=1}^{n} i = \frac{n(n+1)}{2}\)",
+    r"\(\int_{0}^{\infty} e^{-x} \, dx = 1\)",
+    r"\(\lim_{x \to 0} \frac{\sin x}{x} = 1\)",
+    r"设函数 \(f(x)=x^{2}+2x+1\)，求 \(f'(x)\) 的零点。",
+    r"已知 \(a_{n+1} = 2a_{n} + 1\)，且 \(a_{1} = 1\)，则 \(a_{n} = 2^{n} - 1\)。",
+    r"\begin{align*} E &= mc^{2} \\ F &= ma \end{align*}",
+    r"\begin{align*} (a+b)^{2} &= a^{2} + 2ab + b^{2} \\ &\geq 4ab \end{align*}",
+    r"\[\mathbf{A} = \begin{pmatrix} 1 & 2 \\ 3 & 4 \end{pmatrix}\]",
+    r"\[\det \begin{vmatrix} a & b \\ c & d \end{vmatrix} = ad - bc\]",
+    r"\(f(x) = \begin{cases} x^{2} & x \geq 0 \\ -x & \text{otherwise} \end{cases}\)",
+    r"\(\left( \frac{1}{2} \right)^{n} \to 0\)",
+    r"\(\{ x \in \mathbb{R} \mid x > 0 \}\)",
+    r"\(\hat{\theta} = \arg\max_{\theta} \log p(x \mid \theta)\)",
+    r"\(\vec{F} = m \vec{a}\) 与 \(\nabla \cdot \mathbf{E} = \frac{\rho}{\varepsilon_{0}}\)",
+    r"\(\sqrt[3]{8} = 2\) 且 \(\binom{n}{k} = \frac{n!}{k!(n-k)!}\)",
+    r"\(P(A \cup B) = P(A) + P(B) - P(A \cap B)\)",
+    r"\(\overline{z} = a - bi\)，\(|z| = \sqrt{a^{2} + b^{2}}\)",
+    r"\(x_{1}, x_{2}, \ldots, x_{n}\) 的平均值为 \(\bar{x}\)",
+    r"\(\operatorname{rank}(A) \leq \min(m, n)\)",
+    r"$\Delta = b^{2} - 4ac$，当 $\Delta < 0$ 时方程无实根",
+    r"增长了 50\% 以上，\(\tan \alpha = \frac{\sin \alpha}{\cos \alpha}\)",
+    r"\(\mathcal{L}(\theta) = -\sum_{i} y_{i} \log \hat{y}_{i}\)",
+    r"\(a \equiv b \pmod{m}\)",
+    r"\(\begin{array}{cc} a & b \end{array}\)",
+    r"\(\left. \frac{dy}{dx} \right|_{x=0} = 0\)",
+    r"\(\left( \frac{a}{b} \right. + c\)",
+    r"\(\left\{ \begin{array}{l} x = 1 \\ y = 2 \end{array} \right.\)",
+    r"\(\left. x^{2} \right|_{0}^{1} = 1\)",
+    r"\(\left\langle u, v \right\rangle = 0\)",
+    r"\(\left\| x \right\| \leq 1\)",
+]
+
+
+def command_snippet(name):
+    """A small formula that uses the command, for commands the converter supports."""
+    if name in WRAPPERS:
+        return rf"\( \{name}{{x}} + 1 \)"
+    if name in ("frac", "dfrac", "tfrac", "cfrac", "binom", "dbinom", "tbinom"):
+        return rf"\( \{name}{{a}}{{b}} \)"
+    if name == "sqrt":
+        return r"\( \sqrt[3]{x} + \sqrt{y} \)"
+    if name in ("text", "textrm", "mbox", "textnormal", "textbf", "textit"):
+        return rf"\( x \{name}{{if }} y \)"
+    if name == "operatorname":
+        return r"\( \operatorname{rank} A \)"
+    if name in ("left", "right"):
+        return r"\( \left( x \right) \)"
+    if name == "prime":
+        return r"\( f\prime(x) \)"
+    if name == "not":
+        return r"\( a \not= b \)"
+    if name in SYMBOLS or name in FUNCTIONS:
+        return rf"\( a \{name} b \)"
+    return None
+
+
+def load_corpus(path):
+    snippets = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError:
+            value = line
+        if isinstance(value, dict):
+            value = value.get("latex") or value.get("text") or ""
+        if isinstance(value, str) and value.strip():
+            snippets.append(value)
+    return snippets
+
+
+def normalize(text):
+    return re.sub(r"\s+", "", text)
+
+
+def typst_renderer():
+    """Return a function rendering a Typst document to PNG bytes (None when it does not compile)."""
+    try:
+        import typst
+    except ImportError:
+        raise SystemExit("--render requires the typst package (pip install typst)")
+
+    def render(document):
+        source = "#set page(width: auto, height: auto, margin: 2pt)\n" + document
+        try:
+            return typst.compile(source.encode("utf-8"), format="png", ppi=144)
+        except Exception:
+            return None
+
+    return render
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vocab", help="tokenizer vocab.json; adds one snippet per LaTeX command in it")
+    parser.add_argument("--corpus", help="file with one snippet per line (JSON string, {\"latex\": ...} or raw)")
+    parser.add_argument("--all-commands", action="store_true",
+                        help="add one snippet per command the converter supports")
+    parser.add_argument("--pandoc", default="pandoc", help="pandoc executable to compare with")
+    parser.add_argument("--to", default="typst,markdown", help="comma-separated target formats")
+    parser.add_argument("--render", action="store_true",
+                        help="compare differing Typst outputs by rendering them (needs the typst package)")
+    parser.add_argument("--show", type=int, default=10, help="differences to print per format")
+    parser.add_argument("--min-agreement", type=float, default=0.0,
+                        help="fail when fewer natively converted snippets match pandoc")
+    args = parser.parse_args()
+
+    corpus = list(BUILTIN_CORPUS)
+    if args.vocab:
+        commands = vocab_commands(args.vocab)
+        unsupported = sorted(name for name in commands if not supported_command(name))
+        print(f"vocab: {len(commands)} LaTeX commands, {len(commands) - len(unsupported)} supported natively")
+        if unsupported:
+            print("  not supported (pandoc fallback): " + " ".join("\\" + name for name in unsupported))
+        corpus += [snippet for snippet in map(command_snippet, sorted(commands)) if snippet]
+    if args.all_commands:
+        names = set(SYMBOLS) | FUNCTIONS | set(WRAPPERS) | {"frac", "sqrt", "text", "operatorname", "left", "not", "prime"}
+        corpus += [snippet for snippet in map(command_snippet, sorted(names)) if snippet]
+        corpus += [rf"\( a \{name} b \)" for name in sorted(set(SPACES) | set(ESCAPED)) if name != " "]
+    if args.corpus:
+        corpus += load_corpus(args.corpus)
+    corpus = list(dict.fromkeys(corpus))
+    render = typst_renderer() if args.render else None
+
+    pandoc = shutil.which(args.pandoc)
+    service = PandocService(pandoc_path=args.pandoc, cache_size=0) if pandoc else None
+    if service is None:
+        print(f"pandoc not found ({args.pandoc}): reporting coverage and native speed only")
+
+    failed = False
+    try:
+        for to in [name for name in args.to.split(",") if name]:
+            native = {}
+            for text in corpus:
+                try:
+                    native[text] = convert_latex(text, to)
+                except UnsupportedLatex as e:
+                    native[text] = e
+            handled = [text for text in corpus if not isinstance(native[text], UnsupportedLatex)]
+
+            start = time.perf_counter()
+            for _ in range(20):
+                for text in handled:
+                    convert_latex(text, to)
+            native_us = (time.perf_counter() - start) / max(len(handled) * 20, 1) * 1e6
+            print(f"\n{to}: {len(handled)}/{len(corpus)} snippets converted natively, {native_us:.1f} us/snippet")
+            for text in corpus:
+                if text not in handled:
+                    print(f"  fallback ({native[text]}): {text}")
+
+            if service is None:
+                continue
+            start = time.perf_counter()
+            reference = service.convert_batch(handled, to)
+            pandoc_ms = (time.perf_counter() - start) / max(len(handled), 1) * 1000
+            compared = [(text, out) for text, out in zip(handled, reference) if not isinstance(out, PandocError)]
+            differing = [(text, out) for text, out in compared if normalize(out) != normalize(native[text])]
+            print(f"  pandoc ({service.mode}): {pandoc_ms:.2f} ms/snippet, "
+                  f"native is {pandoc_ms * 1000 / native_us:.0f}x faster" if native_us else "")
+            print(f"  same text as pandoc (whitespace ignored): {len(compared) - len(differing)}/{len(compared)}")
+            if render is not None and to == "typst":
+                images = {text: (render(native[text]), render(out)) for text, out in differing}
+                broken = [(text, out) for text, out in differing if images[text][0] is None]
+                # pandoc output that does not compile (e.g. symbol names removed from current Typst) is no reference
+                reference_broken = [(text, out) for text, out in differing
+                                    if images[text][0] is not None and images[text][1] is None]
+                compared = [item for item in compared if item not in reference_broken]
+                differing = [(text, out) for text, out in differing
+                             if images[text][1] is not None and images[text][0] != images[text][1]]
+                print(f"  same rendering as pandoc: {len(compared) - len(differing) - len(broken)}/{len(compared)}, "
+                      f"native output does not compile: {len(broken)}, "
+                      f"pandoc output does not compile: {len(reference_broken)}")
+                for text, out in broken + reference_broken:
+                    print(f"  ! input:  {text}\n    native: {native[text].strip()}\n    pandoc: {out.strip()}")
+                differing += broken
+            agreement = 1 - len(differing) / len(compared) if compared else 1.0
+            print(f"  agreement with pandoc: {len(compared) - len(differing)}/{len(compared)} = {agreement:.1%}")
+            for text, out in differing[:args.show]:
+                print(f"  - input:  {text}\n    native: {native[text].strip()}\n    pandoc: {out.strip()}")
+            failed |= agreement < args.min_agreement
+    finally:
+        if service is not None:
+            service.close()
+    if failed:
+        print(f"agreement below {args.min_agreement:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
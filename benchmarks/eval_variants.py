@@ -0,0 +1,149 @@
+"""Accuracy/latency/memory comparison of model variants (fp32 vs int8 / int8-full).
+
+Runs a folder of formula images through each variant, one image at a time, and
+compares every variant against the FP32 outputs:
+
+  exact match      share of images whose generated LaTeX is identical to FP32
+  edit distance    mean character-level Levenshtein distance to the FP32 output,
+                   absolute and normalized by the FP32 output length
+  latency          p50/p95 per image (preprocessing + encoder + decode)
+  RSS              resident memory after loading the model and peak while running
+
+Each variant runs in its own subprocess so RSS numbers are not mixed. Missing
+quantized files are generated on first use (see webapi/quantize.py). Without
+--images-dir a small set of rendered formula strings is used.
+
+    python benchmarks/eval_variants.py [--model-dir model] [--images-dir formulas/]
+                                       [--variants fp32,int8,int8-full] [--max-length 512]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "webapi"))
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+
+SAMPLE_FORMULAS = [
+    r"\frac{a}{b} + \sqrt{x^2 + y^2}",
+    r"\sum_{i=1}^{n} i = \frac{n(n+1)}{2}",
+    r"E = mc^2, F = ma",
+    r"\int_0^\infty e^{-x} dx = 1",
+    r"\lim_{x \to 0} \frac{\sin x}{x} = 1",
+    r"f'(x) = 2x",
+]
+
+
+def load_images(images_dir):
+    if images_dir:
+        paths = sorted(p for p in Path(images_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+        return [(p.name, Image.open(p).convert("RGB")) for p in paths]
+    images = []
+    for i, formula in enumerate(SAMPLE_FORMULAS * 4):
+        image = Image.new("RGB", (40 + 9 * len(formula) + 10 * (i % 4), 40 + 8 * (i % 3)), "white")
+        ImageDraw.Draw(image).text((20, 12), formula, fill="black")
+        images.append((f"sample_{i:02d}", image))
+    return images
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def edit_distance(a, b):
+    """Character-level Levenshtein distance."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def run_variant(args):
+    """Worker mode: load one variant, run all images, print JSON results."""
+    import psutil
+
+    from generation import generate_batch
+    from model_loader import build_model
+
+    process = psutil.Process()
+    model = build_model(args.model_dir, variant=args.worker)
+    rss_loaded = process.memory_info().rss
+    rss_peak = rss_loaded
+
+    results = []
+    for name, image in load_images(args.images_dir):
+        start = time.perf_counter()
+        pixel_values = model.preprocessor.normalize([model.preprocessor.canvas(image)])
+        text = generate_batch(model, pixel_values, [args.max_length])[0]
+        results.append({"name": name, "text": text, "latency": time.perf_counter() - start})
+        rss_peak = max(rss_peak, process.memory_info().rss)
+
+    json.dump({"results": results, "rss_loaded": rss_loaded, "rss_peak": rss_peak}, sys.stdout, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model-dir", default=str(ROOT / "model"))
+    parser.add_argument("--images-dir", default=None, help="folder of formula images (default: rendered samples)")
+    parser.add_argument("--variants", default="fp32,int8,int8-full", help="comma-separated variants; fp32 is the reference")
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--output", default=None, help="optionally save per-image outputs as JSON")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_variant(args)
+        return
+
+    variants = [v for v in args.variants.split(",") if v]
+    if "fp32" not in variants:
+        variants.insert(0, "fp32")
+
+    runs = {}
+    for variant in variants:
+        command = [sys.executable, __file__, "--worker", variant, "--model-dir", args.model_dir,
+                   "--max-length", str(args.max_length)]
+        if args.images_dir:
+            command += ["--images-dir", args.images_dir]
+        completed = subprocess.run(command, capture_output=True, text=True, encoding="utf-8")
+        if completed.returncode != 0:
+            print(f"{variant}: failed\n{completed.stderr[-2000:]}")
+            sys.exit(1)
+        runs[variant] = json.loads(completed.stdout)
+
+    reference = [r["text"] for r in runs["fp32"]["results"]]
+    print(f"{len(reference)} images\n")
+    print(f"{'variant':<10} {'exact':>7} {'edit':>7} {'edit%':>7} {'p50 ms':>8} {'p95 ms':>8} {'RSS MiB':>8} {'peak MiB':>9}")
+    for variant, run in runs.items():
+        texts = [r["text"] for r in run["results"]]
+        latencies = [r["latency"] * 1000 for r in run["results"]]
+        distances = [edit_distance(t, ref) for t, ref in zip(texts, reference)]
+        normalized = [d / max(1, len(ref)) for d, ref in zip(distances, reference)]
+        exact = sum(t == ref for t, ref in zip(texts, reference)) / max(1, len(reference))
+        print(
+            f"{variant:<10} {exact:>7.1%} {statistics.mean(distances or [0]):>7.2f} "
+            f"{statistics.mean(normalized or [0]):>7.1%} {percentile(latencies, 50):>8.1f} "
+            f"{percentile(latencies, 95):>8.1f} {run['rss_loaded'] / 2**20:>8.1f} {run['rss_peak'] / 2**20:>9.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({variant: run["results"] for variant, run in runs.items()}, f, ensure_ascii=False, indent=2)
+        print(f"\nwrote per-image outputs to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""A stand-in pandoc executable for testing the conversion service without pandoc.
+
+Implements just enough of pandoc's command line for pypandoc (--version,
+--list-input-formats, --list-output-formats, --from/--to with input on stdin)
+and of `pandoc server` (GET /version, POST / and POST /batch with JSON params,
+plain-text or JSON responses, HTTP 500 on a failed conversion). The conversion
+itself is a toy: it prefixes the target format. Input containing \\error fails.
+
+    python benchmarks/pandoc_standin.py --from=latex --to=typst < input.tex
+    python benchmarks/pandoc_standin.py server --port 3030
+    make_executable(dir)  # write a `pandoc` wrapper script into dir for PATH / PYPANDOC_PANDOC
+"""
+import json
+import os
+import stat
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+VERSION = "3.1.11"
+FORMATS = ["latex", "markdown", "html", "typst", "plain", "docx"]
+
+
+class ConversionError(Exception):
+    pass
+
+
+def convert(text, source, target):
+    if "\\error" in text:
+        raise ConversionError(f"Error at (line 1, column 1): unexpected \\error in {source} input")
+    return f"[{target}] {text.strip()}\n"
+
+
+def make_executable(directory):
+    """Write an executable `pandoc` wrapper for this script into directory; returns its path."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if os.name == "nt":
+        path = directory / "pandoc.bat"
+        path.write_text(f'@"{sys.executable}" "{Path(__file__).resolve()}" %*\n')
+    else:
+        path = directory / "pandoc"
+        path.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{Path(__file__).resolve()}" "$@"\n')
+        path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return str(path)
+
+
+class ServerHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/version":
+            self._send(200, VERSION, "text/plain")
+        else:
+            self._send(404, "not found", "text/plain")
+
+    def do_POST(self):
+        params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        wants_json = "application/json" in self.headers.get("Accept", "")
+
+        def run(item):
+            output = convert(item["text"], item.get("from", "markdown"), item.get("to", "html"))
+            return {"output": output, "base64": False, "messages": []} if wants_json else output
+
+        try:
+            if self.path == "/batch":
+                self._send(200, json.dumps([run(item) for item in params]), "application/json")
+            elif self.path == "/":
+                result = run(params)
+                if wants_json:
+                    self._send(200, json.dumps(result), "application/json")
+                else:
+                    self._send(200, result, "text/plain")
+            else:
+                self._send(404, "not found", "text/plain")
+        except ConversionError as e:
+            self._send(500, str(e), "text/plain")
+
+
+def main(argv):
+    if argv and argv[0] == "server":
+        port = int(argv[argv.index("--port") + 1]) if "--port" in argv else 3030
+        ThreadingHTTPServer(("127.0.0.1", port), ServerHandler).serve_forever()
+        return 0
+    if "--version" in argv:
+        print(f"pandoc {VERSION}\nstand-in for testing")
+        return 0
+    if "--list-input-formats" in argv or "--list-output-formats" in argv:
+        print("\n".join(FORMATS))
+        return 0
+
+    options = {}
+    for index, arg in enumerate(argv):
+        for flag, name in (("--from", "from"), ("-f", "from"), ("--to", "to"), ("-t", "to")):
+            if arg.startswith(flag + "="):
+                options[name] = arg.split("=", 1)[1]
+            elif arg == flag and index + 1 < len(argv):
+                options[name] = argv[index + 1]
+    text = sys.stdin.buffer.read().decode("utf-8")
+    try:
+        sys.stdout.write(convert(text, options.get("from", "markdown"), options.get("to", "html")))
+    except ConversionError as e:
+        sys.stderr.write(str(e) + "\n")
+        return 64
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
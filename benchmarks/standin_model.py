@@ -0,0 +1,176 @@
+"""Build a tiny stand-in MixTeX model directory for benchmarks and local testing.
+
+The stand-in has the same file layout and ONNX interfaces as the released model
+(encoder_model.onnx, decoder_model_merged.onnx with past_key_values inputs,
+tokenizer.json, preprocessor_config.json), but only a few MiB of weights: the
+encoder pools the image, the decoder walks a fixed next-token table and emits
+EOS after 60-100 tokens depending on the image. Output text is meaningless; it
+exercises the serving path (preprocessing, batching, KV cache handling,
+detokenization) at realistic token counts without downloading the real model.
+
+    python benchmarks/standin_model.py [out_dir]
+
+Without out_dir the model is written to a fresh temporary directory, whose path
+is printed; the benchmarks that use the stand-in build their own the same way.
+"""
+import argparse
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+
+NUM_LAYERS = 6
+NUM_HEADS = 12
+HEAD_SIZE = 64
+HIDDEN = NUM_HEADS * HEAD_SIZE
+ENC_SEQ = 4
+
+CORPUS = [
+    r"\[ \frac{a}{b} + \sqrt{x^{2} + y^{2}} = \alpha \beta \]",
+    r"\( \sum_{i=1}^{n} i = \frac{n(n+1)}{2} \)",
+    r"\begin{align*} E &= mc^{2} \\ F &= ma \end{align*}",
+    r"\int_{0}^{\infty} e^{-x} dx = 1, \quad \lim_{x \to 0} \frac{\sin x}{x} = 1",
+    r"设 \( f(x) = x^{2} \)，则 \( f'(x) = 2x \)。",
+]
+
+
+def build_tokenizer(out_dir):
+    from tokenizers import ByteLevelBPETokenizer, processors
+
+    tok = ByteLevelBPETokenizer()
+    specials = ["<s>", "<pad>", "</s>", "<unk>", "<mask>"]
+    tok.train_from_iterator(CORPUS * 20, vocab_size=400, min_frequency=1, special_tokens=specials)
+    tok._tokenizer.post_processor = processors.RobertaProcessing(("</s>", 2), ("<s>", 0))
+    tok.save(str(out_dir / "tokenizer.json"))
+    tok.save_model(str(out_dir))
+    (out_dir / "tokenizer_config.json").write_text(json.dumps({
+        "tokenizer_class": "RobertaTokenizer", "bos_token": "<s>", "eos_token": "</s>",
+        "unk_token": "<unk>", "pad_token": "<pad>", "mask_token": "<mask>",
+        "model_max_length": 512,
+    }))
+    (out_dir / "special_tokens_map.json").write_text(json.dumps({
+        "bos_token": "<s>", "eos_token": "</s>", "unk_token": "<unk>",
+        "pad_token": "<pad>", "mask_token": "<mask>", "sep_token": "</s>", "cls_token": "<s>",
+    }))
+    (out_dir / "preprocessor_config.json").write_text(json.dumps({
+        "do_normalize": True, "do_rescale": True, "do_resize": True,
+        "image_mean": [0.5, 0.5, 0.5], "image_std": [0.5, 0.5, 0.5],
+        "image_processor_type": "ViTImageProcessor", "resample": 2,
+        "rescale_factor": 0.00392156862745098, "size": {"height": 448, "width": 448},
+    }))
+    return tok.get_vocab_size()
+
+
+def build_encoder(path, rng):
+    w = numpy_helper.from_array(1.0 + rng.standard_normal((3, ENC_SEQ * HIDDEN)).astype(np.float32) * 0.1, "w")
+    shape = numpy_helper.from_array(np.array([-1, ENC_SEQ, HIDDEN], dtype=np.int64), "shape")
+    axes = numpy_helper.from_array(np.array([2, 3], dtype=np.int64), "axes")
+    nodes = [
+        helper.make_node("ReduceMean", ["pixel_values", "axes"], ["pooled"], keepdims=0),
+        helper.make_node("MatMul", ["pooled", "w"], ["proj"]),
+        helper.make_node("Reshape", ["proj", "shape"], ["last_hidden_state"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "encoder",
+        [helper.make_tensor_value_info("pixel_values", TensorProto.FLOAT, ["batch", 3, 448, 448])],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", ENC_SEQ, HIDDEN])],
+        [w, shape, axes],
+    )
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 18)], ir_version=9), str(path))
+
+
+def build_decoder(path, vocab_size, rng, eos_id=2):
+    # next-token table: a pseudo-random walk over the non-special tokens
+    table = np.full((vocab_size, vocab_size), -10.0, dtype=np.float32)
+    for t in range(vocab_size):
+        nxt = 5 + (t * 7 + 3) % (vocab_size - 5)
+        table[t, nxt] = 10.0
+    eos_onehot = np.zeros((vocab_size,), dtype=np.float32)
+    eos_onehot[eos_id] = 1.0
+    emb = rng.standard_normal((vocab_size, HIDDEN)).astype(np.float32)
+    inits = [
+        numpy_helper.from_array(table, "table"),
+        numpy_helper.from_array(eos_onehot, "eos_onehot"),
+        numpy_helper.from_array(emb, "emb"),
+        numpy_helper.from_array(np.array([0, 0, NUM_HEADS, HEAD_SIZE], dtype=np.int64), "kv_shape"),
+        numpy_helper.from_array(np.array([2], dtype=np.int64), "two"),
+        numpy_helper.from_array(np.array([3], dtype=np.int64), "three"),
+        numpy_helper.from_array(np.array([1], dtype=np.int64), "one"),
+        numpy_helper.from_array(np.array([40.0], dtype=np.float32), "len_scale"),
+        numpy_helper.from_array(np.array([60.0], dtype=np.float32), "len_base"),
+        numpy_helper.from_array(np.array([100.0], dtype=np.float32), "eos_scale"),
+        numpy_helper.from_array(np.array([-1, 1, 1], dtype=np.int64), "b11"),
+        numpy_helper.from_array(np.array([1, -1, 1], dtype=np.int64), "1t1"),
+        numpy_helper.from_array(np.array([1, 2], dtype=np.int64), "axes12"),
+    ]
+    nodes = [
+        # new keys: [B,T,H*D] -> [B,T,H,D] -> [B,H,T,D]
+        helper.make_node("Gather", ["emb", "input_ids"], ["new_flat"]),
+        helper.make_node("Reshape", ["new_flat", "kv_shape"], ["new_4d"]),
+        helper.make_node("Transpose", ["new_4d"], ["new_kv"], perm=[0, 2, 1, 3]),
+        # positions P+1 .. P+T
+        helper.make_node("Shape", ["past_key_values.0.key"], ["past_shape"]),
+        helper.make_node("Slice", ["past_shape", "two", "three"], ["past_len"]),
+        helper.make_node("Shape", ["input_ids"], ["ids_shape"]),
+        helper.make_node("Slice", ["ids_shape", "one", "two"], ["seq_len"]),
+        helper.make_node("Add", ["past_len", "one"], ["start"]),
+        helper.make_node("Add", ["start", "seq_len"], ["limit"]),
+        helper.make_node("Squeeze", ["start"], ["start_s"]),
+        helper.make_node("Squeeze", ["limit"], ["limit_s"]),
+        helper.make_node("Squeeze", ["one"], ["one_s"]),
+        helper.make_node("Range", ["start_s", "limit_s", "one_s"], ["positions"]),
+        helper.make_node("Cast", ["positions"], ["positions_f"], to=TensorProto.FLOAT),
+        helper.make_node("Reshape", ["positions_f", "1t1"], ["pos_1t1"]),
+        # per-row target length from the encoder output
+        helper.make_node("ReduceMean", ["encoder_hidden_states", "axes12"], ["enc_mean"], keepdims=0),
+        helper.make_node("Sigmoid", ["enc_mean"], ["enc_sig"]),
+        helper.make_node("Mul", ["enc_sig", "len_scale"], ["len_var"]),
+        helper.make_node("Add", ["len_var", "len_base"], ["target_len"]),
+        helper.make_node("Reshape", ["target_len", "b11"], ["target_b11"]),
+        helper.make_node("Sub", ["pos_1t1", "target_b11"], ["over"]),
+        helper.make_node("Mul", ["over", "eos_scale"], ["eos_logit"]),
+        helper.make_node("Mul", ["eos_logit", "eos_onehot"], ["eos_bias"]),
+        helper.make_node("Gather", ["table", "input_ids"], ["base_logits"]),
+        helper.make_node("Add", ["base_logits", "eos_bias"], ["logits"]),
+    ]
+    inputs = [
+        helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "seq"]),
+        helper.make_tensor_value_info("encoder_hidden_states", TensorProto.FLOAT, ["batch", "enc_seq", HIDDEN]),
+        helper.make_tensor_value_info("use_cache_branch", TensorProto.BOOL, [1]),
+    ]
+    outputs = [helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", "seq", vocab_size])]
+    for i in range(NUM_LAYERS):
+        for t in ("key", "value"):
+            name = f"past_key_values.{i}.{t}"
+            inputs.append(helper.make_tensor_value_info(name, TensorProto.FLOAT, ["batch", NUM_HEADS, "past", HEAD_SIZE]))
+            nodes.append(helper.make_node("Concat", [name, "new_kv"], [f"present.{i}.{t}"], axis=2))
+            outputs.append(helper.make_tensor_value_info(f"present.{i}.{t}", TensorProto.FLOAT, ["batch", NUM_HEADS, "total", HEAD_SIZE]))
+    graph = helper.make_graph(nodes, "decoder", inputs, outputs, inits)
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 18)], ir_version=9), str(path))
+
+
+def build_standin_model(out_dir, seed=0):
+    """Write the stand-in model files into out_dir and return it as a Path."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    vocab_size = build_tokenizer(out_dir)
+    build_encoder(out_dir / "encoder_model.onnx", rng)
+    build_decoder(out_dir / "decoder_model_merged.onnx", vocab_size, rng)
+    return out_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("out_dir", nargs="?", help="output directory (default: a new temporary directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    out_dir = args.out_dir or tempfile.mkdtemp(prefix="mixtex-standin-")
+    print(build_standin_model(out_dir, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# webapi 的模块以平铺方式互相导入（与以 webapi 为工作目录运行服务时相同）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "webapi"))
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+from transformers import ViTImageProcessor
+
+from preprocess import ImagePreprocessor, pad_image
+
+# 小于、等于、大于 448x448，奇数尺寸以及极宽/极高的图片
+SIZES = [(120, 50), (30, 30), (448, 448), (447, 449), (700, 300), (600, 600), (200, 1000), (1600, 90)]
+MODES = ["RGB", "L", "RGBA", "P"]
+
+# 与模型目录中 preprocessor_config.json 相同的设置
+PREPROCESSOR_CONFIG = {
+    "do_normalize": True,
+    "do_rescale": True,
+    "do_resize": True,
+    "image_mean": [0.5, 0.5, 0.5],
+    "image_std": [0.5, 0.5, 0.5],
+    "resample": 2,
+    "rescale_factor": 1 / 255,
+    "size": {"height": 448, "width": 448},
+}
+
+
+def make_image(size, mode, seed=0):
+    width, height = size
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 256, (height, width, 4), dtype=np.uint8), "RGBA")
+    return image if mode == "RGBA" else image.convert(mode)
+
+
+def old_path(images, feature_extractor):
+    """原有实现：pad_image 得到PIL画布，再由 ViTImageProcessor 归一化"""
+    processed = [pad_image(image.convert("RGB")) for image in images]
+    pixel_values = np.concatenate([feature_extractor(p, return_tensors="np").pixel_values for p in processed])
+    return processed, pixel_values
+
+
+@pytest.fixture(scope="module")
+def feature_extractor():
+    return ViTImageProcessor(**PREPROCESSOR_CONFIG)
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("size", SIZES)
+def test_matches_pad_image_and_vit_processor(size, mode, feature_extractor):
+    image = make_image(size, mode)
+    (expected_canvas,), expected = old_path([image], feature_extractor)
+
+    preprocessor = ImagePreprocessor()
+    canvas = preprocessor.canvas(image)
+    assert canvas.tobytes() == expected_canvas.tobytes()
+
+    actual = preprocessor.normalize([canvas])
+    assert actual.shape == expected.shape == (1, 3, 448, 448)
+    np.testing.assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_batch_through_buffer(feature_extractor):
+    images = [make_image(size, MODES[i % len(MODES)], seed=i) for i, size in enumerate(SIZES)]
+    _, expected = old_path(images, feature_extractor)
+
+    preprocessor = ImagePreprocessor()
+    np.testing.assert_allclose(preprocessor(images), expected, rtol=1e-5, atol=1e-6)
+    canvases = [preprocessor.canvas(image) for image in images]
+    np.testing.assert_allclose(preprocessor.normalize_into_buffer(canvases), expected, rtol=1e-5, atol=1e-6)
+    # 较小的批次复用同一缓冲区
+    np.testing.assert_allclose(preprocessor.normalize_into_buffer(canvases[:3]), expected[:3], rtol=1e-5, atol=1e-6)
+
+
+def test_from_pretrained_reads_mean_and_std(tmp_path):
+    config = dict(PREPROCESSOR_CONFIG, image_mean=[0.485, 0.456, 0.406], image_std=[0.229, 0.224, 0.225])
+    (tmp_path / "preprocessor_config.json").write_text(json.dumps(config), encoding="utf-8")
+    images = [make_image(size, "RGB", seed=i) for i, size in enumerate(SIZES[:4])]
+    _, expected = old_path(images, ViTImageProcessor.from_pretrained(tmp_path))
+
+    preprocessor = ImagePreprocessor.from_pretrained(tmp_path)
+    np.testing.assert_allclose(preprocessor(images), expected, rtol=1e-5, atol=1e-6)
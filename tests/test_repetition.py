@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from repetition import RepetitionDetector, check_repetition
+
+LATEX_TOKENS = [
+    "\\frac", "{", "}", "x", "^{", "2", "_{", "i", "\\alpha", " + ", " = ", "\\sum", "\\int",
+    "(", ")", "\\left", "\\right", " ", "\\\\", "&", "a", "b", "n", "1", "\\cdot", "\\sqrt",
+]
+
+
+def decisions(tokens, repeats, capacity=4096):
+    """逐个token喂给两种实现，返回 [(check_repetition, RepetitionDetector)]，第一次判定重复后停止"""
+    detector = RepetitionDetector(repeats, capacity=capacity)
+    text = ""
+    steps = []
+    for token in tokens:
+        text += token
+        steps.append((check_repetition(text, repeats), detector.feed(token)))
+        if steps[-1][0]:
+            break
+    return steps
+
+
+def random_stream(rng, num_tokens, alphabet):
+    """随机token序列，不时重复自己最近的输出"""
+    tokens = []
+    for _ in range(num_tokens):
+        if tokens and rng.random() < 0.2:
+            k = rng.randint(1, min(6, len(tokens)))
+            tokens.extend(tokens[-k:] * rng.randint(1, 4))
+        else:
+            tokens.append(rng.choice(alphabet))
+    return tokens[:num_tokens]
+
+
+@pytest.mark.parametrize(
+    "tokens, repeats, stop_at",
+    [
+        (["a"] * 12, 12, 12),
+        (["a"] * 11, 12, None),
+        (["ab"] * 12, 12, 12),
+        (["a", "b"] * 11 + ["a"], 12, None),
+        (["x_{1} + "] * 21, 21, 21),
+        (["\\frac{a}{b}", " + "] + ["xy"] * 3, 3, 5),
+        ([str(i) + " + " for i in range(300)], 12, None),
+        (["\\alpha"] * 40, 2, 2),
+    ],
+)
+def test_fixed_sequences(tokens, repeats, stop_at):
+    steps = decisions(tokens, repeats)
+    assert [actual for _, actual in steps] == [expected for expected, _ in steps]
+    stops = [step for step, (expected, _) in enumerate(steps, 1) if expected]
+    assert stops == ([stop_at] if stop_at else [])
+
+
+@pytest.mark.parametrize("capacity", [1, 16, 4096])
+def test_grows_past_capacity(capacity):
+    tokens = [chr(0x4E00 + i) for i in range(500)] + ["ab"] * 12
+    steps = decisions(tokens, 12, capacity)
+    assert [actual for _, actual in steps] == [expected for expected, _ in steps]
+    assert steps[-1] == (True, True)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_streams_match_check_repetition(seed):
+    rng = random.Random(seed)
+    alphabets = [["a", "b"], ["a", "ab", "ba"], ["x", "y", "z", "xy"], LATEX_TOKENS]
+    for _ in range(25):
+        repeats = rng.choice([2, 3, 5, 12, 21])
+        capacity = rng.choice([1, 16, 4096])
+        tokens = random_stream(rng, rng.randint(1, 300), rng.choice(alphabets))
+        steps = decisions(tokens, repeats, capacity)
+        assert [actual for _, actual in steps] == [expected for expected, _ in steps], (repeats, tokens)
+
+
+def test_stays_detected():
+    detector = RepetitionDetector(2)
+    assert detector.feed("aa")
+    assert detector.feed("b")
@@ -1,21 +1,44 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, BackgroundTasks
+import time
+
+_import_start = time.perf_counter()
+
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, BackgroundTasks, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from PIL import Image
 import io
 import os
-import re
 import numpy as np
-from transformers import RobertaTokenizer, ViTImageProcessor
-import onnxruntime as ort
 import base64
 import logging
 import shutil
-import requests
+import json
+import asyncio
+import threading
 import zipfile
 from pathlib import Path
-from tqdm import tqdm
+from typing import List
+# transformers、requests、pypandoc 较重，在用到时才导入
 # from mitex_python import convert_latex_to_typst
-from pypandoc import convert_text
+
+from batching import BatchScheduler
+from inference_pool import ClientQueueFullError, InferencePool, QueueFullError
+from rate_limit import RateLimiter, client_id, parse_weights
+from feedback_store import FeedbackQueueFullError, FeedbackStore
+from result_cache import ResultCache, content_key
+from generation import InferenceItem, generate_items, warm_up
+from ort_config import load_ort_settings
+from model_loader import build_model
+from workers import ModelChangedError, WorkerPool
+from downloader import DownloadProgress, download_file, extract_subdir
+from model_store import activate_version, new_version_dir, prune_versions, resolve_model_dir
+from metrics import FORMAT_CONVERSIONS, REGISTRY, STAGE_SECONDS
+from pandoc_service import PandocService
+from latex_converter import UnsupportedLatex, convert_latex, format_latex
+from ingest import (
+    IMAGE_EXTENSIONS, ImageTooLargeError, check_size, decode_base64, file_size, open_image, read_stream,
+)
 
 # 配置日志
 # logging.basicConfig(level=logging.INFO)
@@ -26,8 +49,9 @@ log_dir.mkdir(exist_ok=True)
 log_file = log_dir / "mixtex_api.log"
 
 # Configure logging to both file and console
+# 日志级别：逐张图片的详细日志为 DEBUG 级别，设置 MIXTEX_LOG_LEVEL=DEBUG 时输出
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get("MIXTEX_LOG_LEVEL", "INFO").upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler(log_file),
@@ -36,12 +60,105 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+_import_seconds = time.perf_counter() - _import_start
+
 
 # 模型路径配置
 MODEL_PATHS = [os.path.abspath("../model")]
 
+# 模型下载地址与SHA-256（为空时使用GitHub最新发布及其摘要）、并发下载连接数
+MODEL_URL = os.environ.get("MIXTEX_MODEL_URL", "")
+MODEL_SHA256 = os.environ.get("MIXTEX_MODEL_SHA256", "")
+DOWNLOAD_WORKERS = int(os.environ.get("MIXTEX_DOWNLOAD_WORKERS", "4"))
+
+# 动态批处理配置：一批最多的请求数，以及凑批的最长等待时间（毫秒）
+BATCH_MAX_SIZE = int(os.environ.get("MIXTEX_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("MIXTEX_BATCH_MAX_WAIT_MS", "10"))
+
+# 解码器是否使用IOBinding与预分配的KV缓冲区（设为0则退回 session.run）
+DECODER_IOBINDING = os.environ.get("MIXTEX_DECODER_IOBINDING", "1") != "0"
+
+# 投机解码：批次只剩一行时每步起草最多这么多个token（从已生成的内容与之前的结果中按n-gram查找），
+# 一次解码器调用验证，输出与贪心解码相同；0 表示关闭
+DRAFT_TOKENS = int(os.environ.get("MIXTEX_DRAFT_TOKENS", "0"))
+
+# 服务模式：thread 在本进程内推理；process 把推理分发到 NUM_WORKERS 个共享权重的工作进程
+SERVING_MODE = os.environ.get("MIXTEX_SERVING_MODE", "thread")
+NUM_WORKERS = int(os.environ.get("MIXTEX_NUM_WORKERS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+
+# 推理工作池配置：并发工作线程数与排队上限，超出上限的请求直接返回503
+# process 模式下默认让每个工作进程都能凑满一批
+INFERENCE_WORKERS = int(
+    os.environ.get("MIXTEX_INFERENCE_WORKERS", str(NUM_WORKERS * BATCH_MAX_SIZE if SERVING_MODE == "process" else 8))
+)
+INFERENCE_QUEUE_SIZE = int(os.environ.get("MIXTEX_INFERENCE_QUEUE_SIZE", "32"))
+
+# 按客户端（MIXTEX_CLIENT_KEY_HEADER 中的API key，没有时为IP地址）限流与公平调度：
+# 令牌桶每秒补充 MIXTEX_RATE_LIMIT 个请求（0为不限流），最多积累 MIXTEX_RATE_BURST 个；
+# 排队时按客户端加权轮流分配推理槽位，单个客户端最多排队 MIXTEX_CLIENT_MAX_QUEUE 个请求。
+# MIXTEX_CLIENT_WEIGHTS 形如 "key:<api key>=4,ip:10.0.0.5=2"，权重同时放大速率与调度份额。
+# 只有在反向代理之后才应设置 MIXTEX_TRUST_FORWARDED=1（使用 X-Forwarded-For 中的地址）
+RATE_LIMIT = float(os.environ.get("MIXTEX_RATE_LIMIT", "0"))
+RATE_BURST = float(os.environ.get("MIXTEX_RATE_BURST", "10"))
+CLIENT_MAX_QUEUE = int(os.environ.get("MIXTEX_CLIENT_MAX_QUEUE", str(max(1, INFERENCE_QUEUE_SIZE // 2))))
+CLIENT_WEIGHTS = parse_weights(os.environ.get("MIXTEX_CLIENT_WEIGHTS", ""))
+CLIENT_KEY_HEADER = os.environ.get("MIXTEX_CLIENT_KEY_HEADER", "X-API-Key")
+TRUST_FORWARDED = os.environ.get("MIXTEX_TRUST_FORWARDED", "0").lower() in ("1", "true", "yes")
+
+# 结果缓存配置：内存上限（字节）、过期时间（秒，0为不过期），以及可选的磁盘缓存目录
+CACHE_MAX_BYTES = int(os.environ.get("MIXTEX_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_TTL = float(os.environ.get("MIXTEX_CACHE_TTL", str(24 * 3600)))
+CACHE_DIR = os.environ.get("MIXTEX_CACHE_DIR", "")
+CACHE_DISK_MAX_BYTES = int(os.environ.get("MIXTEX_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# 分词器实现：fast 直接用 tokenizers 读取 tokenizer.json；transformers 使用 RobertaTokenizer
+TOKENIZER_BACKEND = os.environ.get("MIXTEX_TOKENIZER", "fast")
+
+# ONNX Runtime 会话配置：线程数、图优化级别、内存arena等，来自配置文件与 MIXTEX_ORT_* 环境变量；
+# 优化后的图缓存在 MIXTEX_ORT_CACHE_DIR（默认为模型目录下的 .ort_cache）
+ORT_SETTINGS = load_ort_settings(os.environ.get("MIXTEX_ORT_CONFIG", ""))
+ORT_CACHE_DIR = os.environ.get("MIXTEX_ORT_CACHE_DIR", "")
+
+# 格式转换：常驻的 pandoc server（MIXTEX_PANDOC_URL 为外部服务地址，为空时首次使用时用
+# MIXTEX_PANDOC_PATH 启动），转换结果缓存 MIXTEX_PANDOC_CACHE_SIZE 条
+PANDOC_URL = os.environ.get("MIXTEX_PANDOC_URL", "")
+PANDOC_PATH = os.environ.get("MIXTEX_PANDOC_PATH", "pandoc")
+PANDOC_CACHE_SIZE = int(os.environ.get("MIXTEX_PANDOC_CACHE_SIZE", "1024"))
+# MIXTEX_NATIVE_CONVERTER=1 时转为 Typst / Markdown 先用内置转换器（只支持模型输出的公式与纯文字），
+# 不支持的写法再交给 pandoc；尚未在真实模型输出的语料上与 pandoc 对比，默认关闭
+NATIVE_CONVERTER = os.environ.get("MIXTEX_NATIVE_CONVERTER", "0").lower() in ("1", "true", "yes")
+
+# 模型变体：fp32、int8（量化解码器）或 int8-full（同时量化编码器），量化文件缺失时自动生成
+MODEL_VARIANT = os.environ.get("MIXTEX_MODEL_VARIANT", "fp32")
+
+# 预热：加载模型后在这些批大小上各运行一次合成输入（默认1、2、4…直到 BATCH_MAX_SIZE），
+# 完成前 /health 返回503；MIXTEX_WARMUP=0 时只用批大小1检查模型可用
+WARMUP = os.environ.get("MIXTEX_WARMUP", "1") != "0"
+WARMUP_BATCH_SIZES = [
+    int(n) for n in os.environ.get("MIXTEX_WARMUP_BATCH_SIZES", "").split(",") if n.strip()
+] or sorted({min(2 ** i, BATCH_MAX_SIZE) for i in range(BATCH_MAX_SIZE.bit_length() + 1)})
+
+# 批量识别接口：单个请求最多的图片数
+BATCH_REQUEST_MAX_IMAGES = int(os.environ.get("MIXTEX_BATCH_REQUEST_MAX_IMAGES", "64"))
+
+# 单张图片的限制：编码后的字节数（上传文件、原始请求体、base64解码后）与像素数，
+# 在完整解码前检查，超出时返回413
+MAX_IMAGE_BYTES = int(os.environ.get("MIXTEX_MAX_IMAGE_BYTES", str(32 * 1024 * 1024)))
+MAX_IMAGE_PIXELS = int(os.environ.get("MIXTEX_MAX_IMAGE_PIXELS", str(50_000_000)))
+
+# 反馈存储：SQLite数据库路径（为空时不保存反馈），以及等待后台写入的最大条数，
+# 队列满时 /feedback 返回503
+FEEDBACK_DB = os.environ.get(
+    "MIXTEX_FEEDBACK_DB", str(Path(__file__).resolve().parent.parent / "data" / "feedback.db")
+)
+FEEDBACK_QUEUE_SIZE = int(os.environ.get("MIXTEX_FEEDBACK_QUEUE_SIZE", "1024"))
+
+
 # 全局变量
 model = None
+download_progress = DownloadProgress()
+# 反馈存储在启动事件中创建，关闭事件中写完剩余记录后关闭
+feedback_store = None
 
 app = FastAPI(title="MixTeX OCR API", version="1.0.0")
 
@@ -56,8 +173,9 @@ app.add_middleware(
 
 
 def find_valid_model_path():
-    """查找有效的模型路径"""
-    for path in MODEL_PATHS:
+    """查找有效的模型路径（版本化布局下为 CURRENT 指向的版本目录）"""
+    for root in MODEL_PATHS:
+        path = resolve_model_dir(root)
         if os.path.exists(path):
             required_files = [
                 os.path.join(path, "encoder_model.onnx"),
@@ -72,7 +190,12 @@ def find_valid_model_path():
 
 
 def get_latest_release_url():
-    """Get the URL of the latest MixTeX model release"""
+    """Get the URL and SHA-256 (None if unknown) of the latest MixTeX model release"""
+    import requests
+
+    if MODEL_URL:
+        return MODEL_URL, MODEL_SHA256 or None
+
     fallback_url = "https://github.com/RQLuo/MixTeX-Latex-OCR/releases/tag/MixTex-B"
     
     try:
@@ -87,88 +210,64 @@ def get_latest_release_url():
         for asset in release_data['assets']:
             if asset['name'].lower() == 'mixtex-b.zip':
                 logger.info(f"Found latest model at: {asset['browser_download_url']}")
-                return asset['browser_download_url']
+                # GitHub reports the asset digest as "sha256:<hex>"
+                digest = asset.get('digest') or ""
+                sha256 = digest.split(":", 1)[1] if digest.startswith("sha256:") else None
+                return asset['browser_download_url'], MODEL_SHA256 or sha256
         
         logger.warning(f"MixTex-B.zip not found in latest release, using fallback URL")
-        return fallback_url
+        return fallback_url, MODEL_SHA256 or None
     except Exception as e:
         logger.warning(f"Error fetching release info: {str(e)}, using fallback URL")
-        return fallback_url
-
-
-def download_model_file(url, zip_path):
-    """Download model file with progress tracking"""
-    logger.info(f"Downloading model from: {url}")
-    response = requests.get(url, stream=True)
-    response.raise_for_status()
-    
-    total_size = int(response.headers.get('content-length', 0))
-    block_size = 1024  # 1 Kibibyte
-    
-    with open(zip_path, 'wb') as f, tqdm(
-            desc="Downloading MixTeX model",
-            total=total_size,
-            unit='iB',
-            unit_scale=True,
-            unit_divisor=1024,
-        ) as bar:
-        for data in response.iter_content(block_size):
-            size = f.write(data)
-            bar.update(size)
+        return fallback_url, MODEL_SHA256 or None
 
 
 def download_and_setup_model():
-    """Download MixTeX model from GitHub release, extract and set up"""
+    """Download MixTeX model from GitHub release into a new version directory and switch to it
+
+    The zip is fetched in parallel ranges (resuming an interrupted download) and
+    verified, then only its onnx/ directory is extracted into the version
+    directory. The new version is loaded and warmed up while the current model
+    keeps serving; CURRENT is only repointed after the switch succeeded,
+    otherwise the new directory is removed and the current model stays active.
+    """
     # Set paths
     base_dir = Path(__file__).resolve().parent.parent
-    model_dir = base_dir / "model"
+    model_root = base_dir / "model"
     temp_dir = base_dir / "temp"
-    unzip_dir = temp_dir / "MixTex-B"
-    unzip_model_dir = unzip_dir / "onnx"
     
     # Create directories if they don't exist
-    model_dir.mkdir(exist_ok=True)
+    model_root.mkdir(exist_ok=True)
     temp_dir.mkdir(exist_ok=True)
-    unzip_dir.mkdir(exist_ok=True)
     
-    # Download file path
+    # Download file path; a partial download is kept next to it as .part for resuming
     zip_path = temp_dir / "MixTex-B.zip"
+    version_dir = None
+    download_progress.reset("resolving")
     
     try:
         # Get the latest release URL
-        model_url = get_latest_release_url()
+        model_url, sha256 = get_latest_release_url()
+        if sha256 is None:
+            logger.warning("No SHA-256 known for the model archive, skipping verification")
         
         # Download the model
-        download_model_file(model_url, zip_path)
-        
-        # Extract the model
-        logger.info("Extracting model file...")
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(unzip_dir)
-        
-        # Move files to model directory
-        logger.info("Setting up model files...")
+        download_file(model_url, zip_path, sha256=sha256, workers=DOWNLOAD_WORKERS, progress=download_progress)
         
-        # Remove existing model directory if it exists
-        if model_dir.exists():
-            shutil.rmtree(model_dir)
+        # Extract only the onnx/ directory straight into a new version directory
+        download_progress.set_status("extracting")
+        version_dir = new_version_dir(model_root)
+        extract_subdir(zip_path, "onnx", version_dir)
+        os.remove(zip_path)
         
-        # Copy the entire extracted directory to the model directory
-        shutil.copytree(unzip_model_dir, model_dir)
-        logger.info(f"Copied entire model directory from {unzip_model_dir} to {model_dir}")
-        
-        # Clean up temporary files
-        logger.info("Cleaning up...")
-        if zip_path.exists():
-            os.remove(zip_path)
-        
-        try:
-            shutil.rmtree(unzip_dir)
-        except Exception as e:
-            logger.warning(f"Could not remove temporary files: {e}")
-        
-        # Reload the model
-        load_model()
+        # Load and warm up the new version, then make it current
+        download_progress.set_status("loading")
+        previous_dir = model_dir
+        if not load_model(str(version_dir)):
+            raise Exception("the new model failed to load, keeping the current model")
+        activate_version(model_root, version_dir)
+        prune_versions(model_root, keep=[version_dir, previous_dir])
+        download_progress.set_status("done")
         
         return {
             "status": "success", 
@@ -177,216 +276,308 @@ def download_and_setup_model():
         }
     except Exception as e:
         logger.error(f"Model download and setup failed: {str(e)}")
+        download_progress.set_status("error", str(e))
+        if version_dir is not None and version_dir.exists():
+            shutil.rmtree(version_dir, ignore_errors=True)
         return {
             "status": "error",
             "message": f"Failed to download and setup model: {str(e)}"
         }
 
-def load_model():
-    """加载ONNX模型"""
-    global model
-    try:
-        valid_path = find_valid_model_path()
-
-        if valid_path is None:
-            raise Exception(
-                "找不到有效的模型文件，请确保onnx文件夹包含完整的模型文件。"
-            )
-
-        logger.info(f"Loading model from: {valid_path}")
-
-        tokenizer = RobertaTokenizer.from_pretrained(valid_path)
-        feature_extractor = ViTImageProcessor.from_pretrained(valid_path)
-
-        # 打印feature_extractor的配置信息
-        logger.info(f"Feature extractor config: {feature_extractor}")
-        logger.info(f"Feature extractor size: {feature_extractor.size}")
-        logger.info(f"Feature extractor do_resize: {feature_extractor.do_resize}")
-        logger.info(f"Feature extractor do_normalize: {feature_extractor.do_normalize}")
+def log_startup_timing(timings):
+    """记录启动各阶段耗时（模块导入只统计一次）"""
+    global _import_seconds
+    if _import_seconds is not None:
+        timings = {"import": _import_seconds, **timings}
+        _import_seconds = None
+    breakdown = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+    logger.info(f"Startup timing ({TOKENIZER_BACKEND} tokenizer): {breakdown}")
 
-        encoder_session = ort.InferenceSession(f"{valid_path}/encoder_model.onnx", providers=["CPUExecutionProvider"])
-        decoder_session = ort.InferenceSession(
-            f"{valid_path}/decoder_model_merged.onnx", 
-            providers=["CPUExecutionProvider"]
-        )
-
-        model = (tokenizer, feature_extractor, encoder_session, decoder_session)
-        logger.info("Model loaded successfully!")
-        return True
 
-    except Exception as e:
-        logger.error(f"Model loading failed: {e}")
-        return False
+pandoc_service = PandocService(PANDOC_PATH, PANDOC_URL or None, PANDOC_CACHE_SIZE)
 
 
-def pad_image(img, out_size=(448, 448)):
-    """调整图片大小并填充"""
-    x_img, y_img = out_size
-    logger.info(f"Target image size: {out_size}")
-    logger.info(f"Input image size: {img.size}")
+def convert_text(source, to, format):
+    """通过 pandoc_service 转换格式（失败时抛出 PandocError），记录转换耗时"""
+    start = time.perf_counter()
+    try:
+        return pandoc_service.convert(source, to=to, format=format)
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="pandoc")
 
-    background = Image.new("RGB", (x_img, y_img), (255, 255, 255))
-    width, height = img.size
 
-    if width < x_img and height < y_img:
-        x = (x_img - width) // 2
-        y = (y_img - height) // 2
-        background.paste(img, (x, y))
-        logger.info(f"Image padded to center: ({x}, {y})")
-    else:
-        scale = min(x_img / width, y_img / height)
-        new_width = int(width * scale)
-        new_height = int(height * scale)
-        img_resized = img.resize((new_width, new_height), Image.LANCZOS)
-        x = (x_img - new_width) // 2
-        y = (y_img - new_height) // 2
-        background.paste(img_resized, (x, y))
+def convert_native(source, to):
+    """用内置转换器转换，不支持时返回 None"""
+    if not NATIVE_CONVERTER:
+        return None
+    try:
+        converted = convert_latex(source, to)
+    except UnsupportedLatex as e:
+        logger.debug(f"Native {to} conversion not supported ({e}), using pandoc")
+        return None
+    FORMAT_CONVERSIONS.inc(backend="native")
+    return converted
+
+
+def convert_format_text(source, to, format="latex"):
+    """格式转换：内置转换器优先，否则通过 pandoc（失败时抛出 PandocError）"""
+    converted = convert_native(source, to)
+    if converted is not None:
+        return converted
+    FORMAT_CONVERSIONS.inc(backend="pandoc")
+    return convert_text(source, to=to, format=format)
+
+
+def worker_config(path, version):
+    """process 模式下传给工作进程的配置（version 为前端按同一目录计算的模型版本，用于分配请求）
+
+    未显式设置线程数时，把CPU核平均分给各工作进程，避免线程超额订阅。
+    """
+    threads = max(1, (os.cpu_count() or 1) // NUM_WORKERS)
+    ort_settings = {
+        name: {**settings, "intra_op_num_threads": settings["intra_op_num_threads"] or threads}
+        for name, settings in ORT_SETTINGS.items()
+    }
+    return {
+        "model_path": path,
+        "model_version": version,
+        "variant": MODEL_VARIANT,
+        "tokenizer_backend": TOKENIZER_BACKEND,
+        "ort_settings": ort_settings,
+        "use_iobinding": DECODER_IOBINDING,
+        "draft_tokens": DRAFT_TOKENS,
+        "batch_max_size": BATCH_MAX_SIZE,
+        "batch_max_wait_ms": BATCH_MAX_WAIT_MS,
+        "warmup_batch_sizes": WARMUP_BATCH_SIZES if WARMUP else [1],
+    }
+
+
+# 同一时间只进行一次模型加载/切换
+model_swap_lock = threading.Lock()
+
+# 同一时间只进行一次模型下载（临时文件与下载进度是共享的）；只在下载接口中以非阻塞方式获取
+model_download_lock = threading.Lock()
+
+# 当前模型所在的目录
+model_dir = None
+
+# 当前模型是否已完成预热（/health 据此返回 ready）
+model_warm = threading.Event()
+
+
+def warm_up_in_background(new_model):
+    """启动后在后台完成各批大小的预热，期间照常处理请求"""
+    try:
+        start = time.perf_counter()
+        warm_up(new_model, WARMUP_BATCH_SIZES, use_iobinding=DECODER_IOBINDING)
         logger.info(
-            f"Image resized and padded: scale={scale:.3f}, new_size=({new_width}, {new_height}), position=({x}, {y})"
+            f"Warm-up for batch sizes {WARMUP_BATCH_SIZES} finished in {time.perf_counter() - start:.1f} s"
         )
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+    if model is new_model:
+        model_warm.set()
+
+
+def load_model(path=None, defer_warm_up=False):
+    """加载ONNX模型并切换为当前模型
+
+    新模型先完整构建并预热，成功后才替换全局 model（一次赋值，原子完成）；
+    已在运行的批次持有旧模型的引用，在旧版本上完成。构建或预热失败时保留
+    当前模型不变。process 模式下本进程只加载预处理器与分词器并准备共享权重
+    文件，ONNX会话由工作进程各自创建；重新加载时新一组工作进程全部预热就绪后
+    才替换旧进程组。path 为空时使用 find_valid_model_path()。
+    defer_warm_up 为 True 时（启动时）只用批大小1检查模型，其余批大小在后台预热。
+    """
+    global model, model_dir, worker_pool
+    with model_swap_lock:
+        try:
+            valid_path = path or find_valid_model_path()
 
-    logger.info(f"Final processed image size: {background.size}")
-    return background
-
+            if valid_path is None:
+                raise Exception(
+                    "找不到有效的模型文件，请确保onnx文件夹包含完整的模型文件。"
+                )
 
-def check_repetition(s, repeats=12):
-    """检查字符串重复"""
-    for pattern_length in range(1, len(s) // repeats + 1):
-        for start in range(len(s) - repeats * pattern_length + 1):
-            pattern = s[start : start + pattern_length]
-            if s[start : start + repeats * pattern_length] == pattern * repeats:
-                return True
-    return False
+            logger.info(f"Loading model from: {valid_path}")
+
+            timings = {}
+            new_model = build_model(
+                valid_path,
+                variant=MODEL_VARIANT,
+                tokenizer_backend=TOKENIZER_BACKEND,
+                ort_settings=ORT_SETTINGS,
+                ort_cache_dir=ORT_CACHE_DIR or None,
+                timings=timings,
+                load_sessions=SERVING_MODE != "process",
+                shared_weights=SERVING_MODE == "process",
+            )
 
+            start = time.perf_counter()
+            if SERVING_MODE == "process":
+                if worker_pool is None:
+                    # 首次启动：工作进程在后台加载并预热，请求在就绪前排队
+                    worker_pool = WorkerPool(NUM_WORKERS, worker_config(valid_path, new_model.version))
+                else:
+                    worker_pool.replace(worker_config(valid_path, new_model.version))
+                    timings["warm-up"] = time.perf_counter() - start
+            else:
+                batch_sizes = [1] if defer_warm_up or not WARMUP else WARMUP_BATCH_SIZES
+                warm_up(new_model, batch_sizes, use_iobinding=DECODER_IOBINDING)
+                timings["warm-up"] = time.perf_counter() - start
+            log_startup_timing(timings)
+
+            model = new_model
+            model_dir = valid_path
+            if defer_warm_up and WARMUP and SERVING_MODE != "process":
+                model_warm.clear()
+                threading.Thread(
+                    target=warm_up_in_background, args=(new_model,), name="warm-up", daemon=True
+                ).start()
+            else:
+                model_warm.set()
+            logger.info(f"Model loaded successfully! (variant {MODEL_VARIANT}, version {model.version})")
+            return True
 
-def convert_align_to_equations(text):
-    """转换align环境为单行公式"""
-    text = re.sub(r"\\begin\{align\*\}|\\end\{align\*\}", "", text).replace("&", "")
-    equations = text.strip().split("\\\\")
-    converted = []
-    for eq in equations:
-        eq = eq.strip().replace("\\[", "").replace("\\]", "").replace("\n", "")
-        if eq:
-            converted.append(f"$$ {eq} $$")
-    return "\n".join(converted)
+        except Exception as e:
+            if model is not None:
+                logger.error(f"Model loading failed, keeping version {model.version}: {e}")
+            else:
+                logger.error(f"Model loading failed: {e}")
+            return False
 
 
 def base64_to_image(base64_string):
-    """将base64字符串转换为PIL Image"""
+    """将base64字符串转换为PIL Image（分块解码，超过大小限制时抛出 ImageTooLargeError）"""
     try:
         if not isinstance(base64_string, str):
             return None
 
-        if base64_string.startswith("data:image"):
-            base64_string = base64_string.split(",")[1]
-
-        image_data = base64.b64decode(base64_string)
-        image = Image.open(io.BytesIO(image_data))
-        return image
+        return open_image(decode_base64(base64_string, MAX_IMAGE_BYTES), MAX_IMAGE_PIXELS)
+    except ImageTooLargeError:
+        raise
     except Exception as e:
         logger.error(f"Base64 to image conversion failed: {e}")
         return None
 
 
-def mixtex_inference(image, max_length=512, use_dollars=False, convert_align=False, use_typst=False):
-    """执行LaTeX推理"""
-    if model is None:
-        return "模型未加载", False
+def bytes_to_image(source, size=None):
+    """上传文件的内容（bytes 或文件对象）转换为PIL Image，超过大小限制时抛出 ImageTooLargeError"""
+    check_size(len(source) if size is None else size, MAX_IMAGE_BYTES)
+    return open_image(source, MAX_IMAGE_PIXELS)
 
-    tokenizer, feature_extractor, encoder_session, decoder_session = model
 
-    try:
-        # 处理图片 - 使用448x448尺寸
-        processed_image = pad_image(image.convert("RGB"), (448, 448))
-        logger.info(f"Processed image size: {processed_image.size}")
-
-        # 使用feature_extractor处理图片
-        inputs = feature_extractor(processed_image, return_tensors="np")
-        pixel_values = inputs.pixel_values
-        logger.info(f"Feature extractor output shape: {pixel_values.shape}")
-
-        # 编码器推理
-        encoder_outputs = encoder_session.run(None, {"pixel_values": pixel_values})[0]
-        logger.info(f"Encoder output shape: {encoder_outputs.shape}")
-
-        # 模型推理参数
-        num_layers = 6
-        hidden_size = 768
-        num_attention_heads = 12
-        batch_size = 1
-        head_size = hidden_size // num_attention_heads
-
-        # 解码器初始化
-        decoder_inputs = {
-            "input_ids": tokenizer("<s>", return_tensors="np").input_ids.astype(
-                np.int64
-            ),
-            "encoder_hidden_states": encoder_outputs,
-            "use_cache_branch": np.array([True], dtype=bool),
-            **{
-                f"past_key_values.{i}.{t}": np.zeros(
-                    (batch_size, num_attention_heads, 0, head_size), dtype=np.float32
-                )
-                for i in range(num_layers)
-                for t in ["key", "value"]
-            },
-        }
+def run_inference_batch(items):
+    """批处理回调：合并同一时间窗口内的请求，一次编码并批量解码
 
-        generated_text = ""
+    每个请求用排队时绑定的模型（即计算缓存键的模型）执行；模型切换前后的请求
+    落在同一批时按模型分组分别生成。
+    """
+    results = [None] * len(items)
+    groups = {}
+    for index, item in enumerate(items):
+        item_model = item.model or model
+        if item_model is None:
+            raise RuntimeError("模型未加载")
+        groups.setdefault(id(item_model), (item_model, []))[1].append(index)
+    for item_model, indices in groups.values():
+        texts = generate_items(item_model, [items[index] for index in indices], DECODER_IOBINDING, DRAFT_TOKENS)
+        for index, text in zip(indices, texts):
+            results[index] = text
+    return results
 
-        # 生成循环
-        for step in range(max_length):
-            decoder_outputs = decoder_session.run(None, decoder_inputs)
-            next_token_id = np.argmax(decoder_outputs[0][:, -1, :], axis=-1)
-            token_text = tokenizer.decode(next_token_id, skip_special_tokens=True)
-            generated_text += token_text
 
-            # 检查重复
-            if check_repetition(generated_text, 21):
-                logger.info("检测到重复，停止生成")
-                break
+batch_scheduler = BatchScheduler(run_inference_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
 
-            # 检查结束
-            if next_token_id == tokenizer.eos_token_id:
-                logger.info("生成完成")
-                break
+# process 模式下的工作进程池，在 load_model 中创建
+worker_pool = None
 
-            # 更新解码器输入
-            decoder_inputs.update(
-                {
-                    "input_ids": next_token_id[:, None],
-                    **{
-                        f"past_key_values.{i}.{t}": decoder_outputs[i * 2 + 1 + j]
-                        for i in range(num_layers)
-                        for j, t in enumerate(["key", "value"])
-                    },
-                }
-            )
 
-        # 后处理
-        result = (
-            generated_text.replace("\\[", "\\begin{align*}")
-            .replace("\\]", "\\end{align*}")
-            .replace("%", "\\%")
-        )
+def submit_inference(item):
+    """把请求交给批处理调度器（thread 模式）或工作进程池（process 模式），返回 Future"""
+    if worker_pool is not None:
+        return worker_pool.submit(item)
+    return batch_scheduler.submit(item)
+
 
-        if convert_align:
-            result = convert_align_to_equations(result)
+result_cache = ResultCache(CACHE_MAX_BYTES, CACHE_TTL, CACHE_DIR or None, CACHE_DISK_MAX_BYTES)
 
-        if use_dollars:
-            result = result.replace("\\(", "$").replace("\\)", "$")
-            
-        if use_typst:
-            try:
-                # result = convert_latex_to_typst(result)
-                # Use pandoc instead for text and equation mixed
-                result = convert_text(result, to="typst", format="tex")
-                logger.info(result)
-            except Exception as e:
-                logger.error(f"Typst conversion failed: {e}")
-                return f"Typst conversion failed: {str(e)}", False
 
-        return result, True
+def infer_raw_text(image, max_length=512, on_text=None, cancel_event=None):
+    """推理单张图片，返回模型生成的原始文本
+
+    以归一化后的448x448图片内容和模型版本为键查询结果缓存，未命中时才提交到批处理调度器。
+    请求绑定计算键的模型，结果总是由该模型生成；process 模式下该版本的工作进程已被
+    替换时改用当前模型重新计算。
+    on_text 不为空时为流式请求：生成过程中逐段回调，命中缓存则一次性回调全文。
+    """
+    try:
+        return _infer_raw_text(model, image, max_length, on_text, cancel_event)
+    except ModelChangedError as e:
+        logger.info(f"{e}, retrying with the current model")
+        return _infer_raw_text(model, image, max_length, on_text, cancel_event)
+
+
+def _infer_raw_text(current_model, image, max_length, on_text, cancel_event):
+    # 处理图片 - 缩放填充到448x448的uint8画布，归一化在批处理时进行
+    start = time.perf_counter()
+    canvas = current_model.preprocessor.canvas(image)
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage="preprocess")
+    logger.debug(f"Input image size: {image.size}")
+
+    def compute():
+        item = InferenceItem(canvas, max_length, on_text, cancel_event, current_model)
+        return submit_inference(item).result()
+
+    key = content_key(current_model.version, max_length, canvas.tobytes())
+    if on_text is None:
+        return result_cache.get_or_compute(key, compute)
+
+    text = result_cache.get(key)
+    if text is not None:
+        on_text(text)
+        return text
+
+    text = compute()
+    # 被取消的请求只生成了一部分，不写入缓存
+    if cancel_event is None or not cancel_event.is_set():
+        result_cache.put(key, text)
+    return text
+
+
+def postprocess_latex(generated_text, use_dollars=False, convert_align=False, use_typst=False):
+    """对生成的原始文本做格式后处理，记录耗时（包括 use_typst 时的pandoc转换）"""
+    start = time.perf_counter()
+    try:
+        return _postprocess_latex(generated_text, use_dollars, convert_align, use_typst)
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="postprocess")
+
+
+def _postprocess_latex(generated_text, use_dollars, convert_align, use_typst):
+    result = format_latex(generated_text, use_dollars, convert_align)
+
+    if use_typst:
+        try:
+            # result = convert_latex_to_typst(result)
+            # Use pandoc instead for text and equation mixed
+            result = convert_format_text(result, to="typst", format="latex")
+            logger.debug(result)
+        except Exception as e:
+            logger.error(f"Typst conversion failed: {e}")
+            return f"Typst conversion failed: {str(e)}", False
+
+    return result, True
+
+
+def mixtex_inference(image, max_length=512, use_dollars=False, convert_align=False, use_typst=False):
+    """执行LaTeX推理"""
+    if model is None:
+        return "模型未加载", False
+
+    try:
+        generated_text = infer_raw_text(image, max_length)
+        return postprocess_latex(generated_text, use_dollars, convert_align, use_typst)
 
     except Exception as e:
         logger.error(f"推理过程中出错: {str(e)}")
@@ -395,11 +586,29 @@ def mixtex_inference(image, max_length=512, use_dollars=False, convert_align=Fal
 
 @app.on_event("startup")
 async def startup_event():
-    """启动时加载模型"""
-    if not load_model():
+    """启动时打开反馈存储并加载模型，各批大小的预热在后台完成"""
+    global feedback_store
+    if FEEDBACK_DB and feedback_store is None:
+        try:
+            feedback_store = FeedbackStore(FEEDBACK_DB, FEEDBACK_QUEUE_SIZE, max_image_bytes=MAX_IMAGE_BYTES)
+        except Exception as e:
+            logger.error(f"Failed to open feedback store {FEEDBACK_DB}: {e}")
+    if not load_model(defer_warm_up=True):
         logger.error("Failed to load model during startup")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """停止工作进程与 pandoc server，关闭反馈存储"""
+    global feedback_store
+    if worker_pool is not None:
+        await run_in_threadpool(worker_pool.close)
+    await run_in_threadpool(pandoc_service.close)
+    if feedback_store is not None:
+        store, feedback_store = feedback_store, None
+        await run_in_threadpool(store.close)
+
+
 
 @app.get("/")
 async def root():
@@ -408,31 +617,140 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """健康检查接口"""
-    return {"status": "healthy", "model_loaded": model is not None}
+    """健康检查接口：模型加载并预热完成后返回 ready，之前返回503，负载均衡器不会把流量发到冷实例"""
+    if model is None:
+        status = "model_not_loaded"
+    elif not model_warm.is_set() or (worker_pool is not None and not worker_pool.ready()):
+        status = "warming_up"
+    else:
+        status = "ready"
+    body = {"status": status, "model_loaded": model is not None}
+    if status != "ready":
+        return JSONResponse(status_code=503, content=body)
+    return body
 
 @app.post("/download_model")
 async def download_model():
     """Download and setup the model files from GitHub release"""
+    if model_swap_lock.locked():
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+    if not model_download_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A model download is already in progress")
     try:
-        result = download_and_setup_model()
+        # 下载与加载在线程池中进行，期间当前模型继续处理请求；
+        # 请求被取消时 run_in_threadpool 仍会等待线程结束，锁覆盖整个下载过程
+        result = await run_in_threadpool(download_and_setup_model)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        model_download_lock.release()
+
+@app.get("/download_progress")
+async def get_download_progress():
+    """模型下载进度"""
+    return download_progress.snapshot()
+
+inference_pool = InferencePool(INFERENCE_WORKERS, INFERENCE_QUEUE_SIZE, CLIENT_MAX_QUEUE)
+rate_limiter = RateLimiter(RATE_LIMIT, RATE_BURST)
+
+RATE_LIMITED = REGISTRY.counter(
+    "mixtex_rate_limited_total",
+    "Requests rejected with 429: rate (token bucket empty) or client_queue (too many queued requests)",
+    ["reason"],
+)
+
+
+def request_client(request):
+    """请求的客户端标识：API key 的哈希，没有key时为客户端IP"""
+    address = request.client.host if request.client else None
+    if TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for", "").split(",")[0].strip()
+        address = forwarded or address
+    return client_id(request.headers.get(CLIENT_KEY_HEADER), address)
+
+
+def client_weight(client):
+    return CLIENT_WEIGHTS.get(client, 1.0)
+
+
+def check_rate_limit(client, cost=1):
+    """消耗客户端的令牌，不足时返回429 + Retry-After"""
+    retry_after = rate_limiter.acquire(client, cost, client_weight(client))
+    if retry_after:
+        RATE_LIMITED.inc(reason="rate")
+        logger.warning(f"Rate limit exceeded for {client}")
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded, please retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+async def rate_limited_client(request: Request):
+    """依赖项：识别客户端并按一次请求检查限流，返回客户端标识"""
+    client = request_client(request)
+    check_rate_limit(client)
+    return client
+
+
+def client_queue_full(e):
+    RATE_LIMITED.inc(reason="client_queue")
+    return HTTPException(
+        status_code=429,
+        detail="Too many queued requests for this client, please retry later",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def run_prediction(
+    load_image, use_dollars=False, convert_align=False, use_typst=False, source="unknown",
+    on_text=None, cancel_event=None,
+):
+    """在推理工作线程中执行：解码图片、推理与后处理"""
+    start = time.perf_counter()
+    try:
+        image = load_image()
+        if image is not None:
+            # 加载器可能只读取了文件头（Image.open），这里完成解码，使解码耗时单独计入
+            image.load()
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        logger.error(f"Image decoding failed: {e}")
+        image = None
+    if image is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {source} image data")
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage="decode")
+
+    try:
+        generated_text = infer_raw_text(image, on_text=on_text, cancel_event=cancel_event)
+    except Exception as e:
+        logger.error(f"推理过程中出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"推理过程中出错: {str(e)}")
+
+    return postprocess_latex(
+        generated_text, use_dollars=use_dollars, convert_align=convert_align, use_typst=use_typst
+    )
+
 
 # Common prediction function to handle all three endpoints
-async def process_prediction(image, use_dollars=False, convert_align=False, use_typst=False, source="unknown"):
-    """Common function for processing predictions from different sources"""
+async def process_prediction(
+    load_image, use_dollars=False, convert_align=False, use_typst=False, source="unknown", client=""
+):
+    """Common function for processing predictions from different sources
+
+    load_image is called on an inference worker thread, so image decoding,
+    inference and post-processing never block the event loop. Requests are
+    scheduled fairly across clients.
+    """
     if not model:
         raise HTTPException(status_code=500, detail="Model not loaded")
 
     try:
-        if image is None:
-            raise HTTPException(status_code=400, detail=f"Invalid {source} image data")
-
-        # Run inference
-        result, success = mixtex_inference(
-            image, use_dollars=use_dollars, convert_align=convert_align, use_typst=use_typst
+        result, success = await inference_pool.run(
+            run_prediction, load_image, use_dollars, convert_align, use_typst, source,
+            client=client, weight=client_weight(client),
         )
 
         if success:
@@ -440,6 +758,16 @@ async def process_prediction(image, use_dollars=False, convert_align=False, use_
         else:
             raise HTTPException(status_code=500, detail=result)
 
+    except ClientQueueFullError as e:
+        logger.warning(f"{source} prediction rejected: too many queued requests for {client}")
+        raise client_queue_full(e)
+    except QueueFullError as e:
+        logger.warning(f"{source} prediction rejected: inference queue is full")
+        raise HTTPException(
+            status_code=503,
+            detail="Inference queue is full, please retry later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     except HTTPException:
         # Re-raise HTTP exceptions without wrapping
         raise
@@ -448,48 +776,382 @@ async def process_prediction(image, use_dollars=False, convert_align=False, use_
         raise HTTPException(status_code=500, detail=f"{source} prediction failed: {str(e)}")
 
 
+@app.get("/cache_stats")
+async def cache_stats():
+    """结果缓存状态：命中/未命中次数与容量；pandoc 为格式转换缓存与后端状态"""
+    return {"success": True, **result_cache.stats(), "pandoc": pandoc_service.stats()}
+
+
+@app.get("/queue_stats")
+async def queue_stats():
+    """推理队列状态：排队深度、等待时间与拒绝次数；process 模式下包含各工作进程的状态"""
+    stats = {"success": True, "serving_mode": SERVING_MODE, **inference_pool.stats()}
+    if worker_pool is not None:
+        stats["workers"] = worker_pool.stats()
+    return stats
+
+
+@app.get("/client_stats")
+async def client_stats():
+    """各客户端的用量：推理队列中的运行/排队/完成/拒绝数、累计推理耗时与限流次数"""
+    clients = {client: dict(usage) for client, usage in inference_pool.client_stats().items()}
+    for client, usage in rate_limiter.client_stats().items():
+        clients.setdefault(client, {}).update(usage)
+    return {"success": True, "rate_limit": RATE_LIMIT, "rate_burst": RATE_BURST, "clients": clients}
+
+
+QUEUE_DEPTH = REGISTRY.gauge("mixtex_queue_depth", "Requests waiting for an inference slot")
+REQUESTS_RUNNING = REGISTRY.gauge("mixtex_requests_running", "Requests holding an inference slot")
+MODEL_INFO = REGISTRY.gauge("mixtex_model_info", "Loaded model version (value is always 1)", ["version", "variant"])
+CLIENT_REQUESTS = REGISTRY.gauge(
+    "mixtex_client_requests",
+    "Requests per tracked client by state: running, queued, completed, rejected (queue full) "
+    "and rate_limited (token bucket empty)",
+    ["client", "state"],
+)
+CLIENT_INFERENCE_SECONDS = REGISTRY.gauge(
+    "mixtex_client_inference_seconds", "Inference slot time used per tracked client", ["client"]
+)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的指标；process 模式下包含各工作进程的推理指标（worker 标签）"""
+    stats = inference_pool.stats()
+    QUEUE_DEPTH.set(stats["queue_depth"])
+    REQUESTS_RUNNING.set(stats["running"])
+    MODEL_INFO.clear()
+    if model is not None:
+        MODEL_INFO.set(1, version=model.version, variant=MODEL_VARIANT)
+    # 只导出池与限流器中仍在跟踪的客户端（两者都只保留最近活跃的客户端），序列数有上限
+    CLIENT_REQUESTS.clear()
+    CLIENT_INFERENCE_SECONDS.clear()
+    for client, usage in inference_pool.client_stats().items():
+        for state in ("running", "queued", "completed", "rejected"):
+            CLIENT_REQUESTS.set(usage[state], client=client, state=state)
+        CLIENT_INFERENCE_SECONDS.set(usage["service_seconds"], client=client)
+    for client, usage in rate_limiter.client_stats().items():
+        CLIENT_REQUESTS.set(usage["rate_limited"], client=client, state="rate_limited")
+    extra = worker_pool.metrics_snapshots() if worker_pool is not None else []
+    return PlainTextResponse(REGISTRY.render(extra), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/predict")
 async def predict(
     file: UploadFile = File(...),
     use_dollars: bool = Form(False),
     convert_align: bool = Form(False),
     use_typst: bool = Form(False),
+    client: str = Depends(rate_limited_client),
 ):
     """图片转数学公式接口"""
     # 检查文件类型
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
 
-    # 读取图片
-    contents = await file.read()
-    img = Image.open(io.BytesIO(contents)).convert("RGB")
-    
+    # 上传文件已由 Starlette 缓存在（超过1MB时写入磁盘的）临时文件中，直接从中解码，
+    # 不再整体读入内存；解码放到推理工作线程中进行
+    size = file_size(file.file)
+
     return await process_prediction(
-        image=img,
+        load_image=lambda: bytes_to_image(file.file, size),
         use_dollars=use_dollars,
         convert_align=convert_align,
         use_typst=use_typst,
-        source="文件上传"
+        source="文件上传",
+        client=client,
+    )
+
+
+def sse_event(event, data):
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_prediction(load_image, use_dollars, convert_align, use_typst, source, client=""):
+    """流式推理：token 事件推送新生成的原始LaTeX片段，result 事件推送后处理后的最终结果
+
+    客户端断开时生成器被取消，cancel_event 使该请求在下一步解码即退出批次。
+    """
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    cancel_event = threading.Event()
+
+    def on_text(text):
+        loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+    task = asyncio.ensure_future(
+        inference_pool.run(
+            run_prediction, load_image, use_dollars, convert_align, use_typst, source,
+            on_text, cancel_event, client=client, weight=client_weight(client),
+        )
+    )
+    try:
+        while True:
+            getter = asyncio.ensure_future(chunks.get())
+            done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            yield sse_event("token", {"text": getter.result()})
+
+        while not chunks.empty():
+            yield sse_event("token", {"text": chunks.get_nowait()})
+
+        try:
+            result, success = task.result()
+        except ClientQueueFullError as e:
+            RATE_LIMITED.inc(reason="client_queue")
+            yield sse_event("error", {
+                "detail": "Too many queued requests for this client, please retry later", "retry_after": e.retry_after,
+            })
+        except QueueFullError as e:
+            yield sse_event("error", {"detail": "Inference queue is full, please retry later", "retry_after": e.retry_after})
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+        except Exception as e:
+            logger.error(f"{source} stream prediction error: {e}")
+            yield sse_event("error", {"detail": f"{source} prediction failed: {str(e)}"})
+        else:
+            if success:
+                yield sse_event("result", {"success": True, "latex": result, "message": f"{source} 识别成功"})
+            else:
+                yield sse_event("error", {"detail": result})
+    finally:
+        cancel_event.set()
+        if not task.done():
+            task.cancel()
+
+
+@app.post("/predict_stream")
+async def predict_stream(
+    file: UploadFile = File(None),
+    image_data: str = Form(None),
+    use_dollars: bool = Form(False),
+    convert_align: bool = Form(False),
+    use_typst: bool = Form(False),
+    client: str = Depends(rate_limited_client),
+):
+    """流式图片转数学公式接口（SSE），接受上传文件或base64图片"""
+    if not model:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+
+    if file is not None:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        # 流式响应开始时上传文件已关闭，需先读出内容
+        try:
+            check_size(file_size(file.file), MAX_IMAGE_BYTES)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        contents = await file.read()
+        load_image = lambda: bytes_to_image(contents)
+        source = "文件上传"
+    elif image_data is not None:
+        load_image = lambda: base64_to_image(image_data)
+        source = "Base64图片"
+    else:
+        raise HTTPException(status_code=400, detail="Either file or image_data is required")
+
+    if inference_pool.is_full():
+        raise HTTPException(
+            status_code=503,
+            detail="Inference queue is full, please retry later",
+            headers={"Retry-After": str(inference_pool.retry_after())},
+        )
+
+    return StreamingResponse(
+        stream_prediction(load_image, use_dollars, convert_align, use_typst, source, client),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+def is_zip_upload(file):
+    """判断上传文件是否为zip压缩包"""
+    return file.content_type in ("application/zip", "application/x-zip-compressed") or (
+        file.filename or ""
+    ).lower().endswith(".zip")
+
+
+def zip_image_loaders(contents, archive_name):
+    """列出zip中的图片，返回 (名称, load_image) 列表；解压在推理工作线程中进行"""
+    try:
+        with zipfile.ZipFile(io.BytesIO(contents)) as zf:
+            names = sorted(
+                info.filename for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+            )
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail=f"Invalid zip file: {archive_name}")
+
+    def loader(name):
+        def load_image():
+            with zipfile.ZipFile(io.BytesIO(contents)) as zf:
+                # 按目录中记录的解压后大小检查，避免解压炸弹
+                check_size(zf.getinfo(name).file_size, MAX_IMAGE_BYTES)
+                return bytes_to_image(zf.read(name))
+        return load_image
+
+    return [(f"{archive_name}/{name}", loader(name)) for name in names]
+
+
+def batch_image_loaders(uploads, images):
+    """把上传文件列表（可含zip）与base64数组展开为 (名称, load_image) 列表"""
+    loaders = []
+    for upload_name, contents, content_type, is_zip in uploads:
+        if is_zip:
+            loaders.extend(zip_image_loaders(contents, upload_name))
+        elif content_type.startswith("image/"):
+            loaders.append((upload_name, lambda contents=contents: bytes_to_image(contents)))
+        else:
+            loaders.append((upload_name, None))
+
+    if images:
+        try:
+            image_list = json.loads(images)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="images must be a JSON array of base64 strings")
+        if not isinstance(image_list, list) or not all(isinstance(item, str) for item in image_list):
+            raise HTTPException(status_code=400, detail="images must be a JSON array of base64 strings")
+        for i, image_data in enumerate(image_list):
+            loaders.append((f"images[{i}]", lambda image_data=image_data: base64_to_image(image_data)))
+
+    return loaders
+
+
+async def predict_batch_item(index, name, load_image, use_dollars, convert_align, use_typst, semaphore, client=""):
+    """识别批量请求中的一张图片，错误记录在该项的结果中而不是中断整个请求"""
+    item = {"index": index, "name": name}
+    if load_image is None:
+        return {**item, "success": False, "status_code": 400, "error": "File must be an image or a zip archive"}
+
+    async with semaphore:
+        try:
+            result, success = await inference_pool.run(
+                run_prediction, load_image, use_dollars, convert_align, use_typst, "批量",
+                client=client, weight=client_weight(client),
+            )
+        except ClientQueueFullError:
+            RATE_LIMITED.inc(reason="client_queue")
+            return {
+                **item, "success": False, "status_code": 429,
+                "error": "Too many queued requests for this client, please retry later",
+            }
+        except QueueFullError:
+            return {**item, "success": False, "status_code": 503, "error": "Inference queue is full, please retry later"}
+        except HTTPException as e:
+            return {**item, "success": False, "status_code": e.status_code, "error": e.detail}
+        except Exception as e:
+            logger.error(f"Batch item {name} error: {e}")
+            return {**item, "success": False, "status_code": 500, "error": f"prediction failed: {str(e)}"}
+
+    if success:
+        return {**item, "success": True, "latex": result}
+    return {**item, "success": False, "status_code": 500, "error": result}
+
+
+async def stream_batch(tasks):
+    """按完成顺序逐行输出每张图片的结果（NDJSON），最后一行为汇总"""
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            succeeded += item["success"]
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+        yield json.dumps({"done": True, "total": len(tasks), "succeeded": succeeded}) + "\n"
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+@app.post("/predict_batch")
+async def predict_batch(
+    request: Request,
+    files: List[UploadFile] = File(None),
+    images: str = Form(None),
+    use_dollars: bool = Form(False),
+    convert_align: bool = Form(False),
+    use_typst: bool = Form(False),
+    stream: bool = Form(False),
+):
+    """批量图片转数学公式接口
+
+    接受多个上传文件（图片或zip压缩包）和/或 images（base64字符串的JSON数组）。
+    图片并发提交给推理队列，由批处理调度器合并为真正的批次推理。默认按输入顺序
+    返回每张图片的结果；stream=true 时以NDJSON按完成顺序逐行返回。
+    限流按图片数消耗令牌。
+    """
+    if not model:
+        raise HTTPException(status_code=500, detail="Model not loaded")
+
+    uploads = []
+    for file in files or []:
+        contents = await file.read()
+        uploads.append((file.filename or f"files[{len(uploads)}]", contents, file.content_type or "", is_zip_upload(file)))
+
+    loaders = batch_image_loaders(uploads, images)
+    if not loaders:
+        raise HTTPException(status_code=400, detail="Either files or images is required")
+    if len(loaders) > BATCH_REQUEST_MAX_IMAGES:
+        raise HTTPException(
+            status_code=413, detail=f"Too many images: {len(loaders)} > {BATCH_REQUEST_MAX_IMAGES}"
+        )
+    client = request_client(request)
+    check_rate_limit(client, cost=len(loaders))
+
+    if inference_pool.is_full():
+        raise HTTPException(
+            status_code=503,
+            detail="Inference queue is full, please retry later",
+            headers={"Retry-After": str(inference_pool.retry_after())},
+        )
+
+    # 每个批量请求同时在推理队列中的图片数不超过一个批次，避免单个请求占满队列
+    semaphore = asyncio.Semaphore(BATCH_MAX_SIZE)
+    tasks = [
+        asyncio.ensure_future(
+            predict_batch_item(index, name, load_image, use_dollars, convert_align, use_typst, semaphore, client)
+        )
+        for index, (name, load_image) in enumerate(loaders)
+    ]
+
+    if stream:
+        return StreamingResponse(
+            stream_batch(tasks),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    succeeded = sum(item["success"] for item in results)
+    logger.info(f"批量识别完成: {succeeded}/{len(results)}")
+    return {"success": True, "total": len(results), "succeeded": succeeded, "results": results}
+
+
 @app.post("/predict_base64")
 async def predict_base64(
     image_data: str = Form(...),
     use_dollars: bool = Form(False),
     convert_align: bool = Form(False),
     use_typst: bool = Form(False),
+    client: str = Depends(rate_limited_client),
 ):
     """基于base64的图片转数学公式接口"""
-    # 转换base64为图片
-    img = base64_to_image(image_data)
-    
+    # 转换base64为图片（在推理工作线程中进行）
     return await process_prediction(
-        image=img,
+        load_image=lambda: base64_to_image(image_data),
         use_dollars=use_dollars,
         convert_align=convert_align,
         use_typst=use_typst,
-        source="Base64图片"
+        source="Base64图片",
+        client=client,
     )
 
 @app.post("/convert_format")
@@ -497,18 +1159,20 @@ async def convert_format(
     latex_text: str = Form(...),
     target_format: str = Form(...)
 ):
-    """Convert LaTeX to different formats using pypandoc"""
+    """Convert LaTeX to different formats using pandoc"""
     try:
         target_format = target_format.lower()
-        logger.info(f"Converting LaTeX to {target_format}")
+        logger.debug(f"Converting LaTeX to {target_format}")
         
         if target_format == "latex":
             # No conversion needed
             return {"success": True, "converted_text": latex_text}
         
         try:
-            # Use pypandoc to convert directly
-            converted = convert_text(latex_text, to=target_format, format="latex")
+            # Native converter for formulas, otherwise the persistent pandoc service (cached)
+            converted = await run_in_threadpool(
+                convert_format_text, latex_text, to=target_format, format="latex"
+            )
             return {"success": True, "converted_text": converted}
         except Exception as e:
             logger.error(f"Format conversion error: {e}")
@@ -527,35 +1191,123 @@ async def convert_format(
             detail=f"Format conversion failed: {str(e)}"
         )
 
+@app.post("/convert_format_batch")
+async def convert_format_batch(
+    latex_texts: str = Form(...),
+    target_format: str = Form(...)
+):
+    """批量格式转换：latex_texts 为LaTeX字符串的JSON数组，按顺序返回每个片段的结果"""
+    try:
+        texts = json.loads(latex_texts)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="latex_texts must be a JSON array of strings")
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise HTTPException(status_code=400, detail="latex_texts must be a JSON array of strings")
+    if len(texts) > BATCH_REQUEST_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Too many snippets: {len(texts)} > {BATCH_REQUEST_MAX_IMAGES}")
+
+    target_format = target_format.lower()
+    if target_format == "latex":
+        outputs = texts
+    else:
+        outputs = [convert_native(text, target_format) for text in texts]
+        fallback = [index for index, output in enumerate(outputs) if output is None]
+        if fallback:
+            start = time.perf_counter()
+            converted = await run_in_threadpool(
+                pandoc_service.convert_batch, [texts[index] for index in fallback], target_format, "latex"
+            )
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage="pandoc")
+            FORMAT_CONVERSIONS.inc(len(fallback), backend="pandoc")
+            for index, output in zip(fallback, converted):
+                outputs[index] = output
+
+    results = [
+        {"success": False, "error": f"Conversion to {target_format} failed: {output}"}
+        if isinstance(output, Exception)
+        else {"success": True, "converted_text": output}
+        for output in outputs
+    ]
+    return {"success": True, "results": results}
+
 @app.post("/predict_clipboard")
 async def predict_clipboard(
     image_data: str = Form(...),
     use_dollars: bool = Form(False),
     convert_align: bool = Form(False),
     use_typst: bool = Form(False),
+    client: str = Depends(rate_limited_client),
 ):
     """处理剪贴板图片粘贴的接口"""
-    # 转换base64为图片
-    img = base64_to_image(image_data)
-    
+    # 转换base64为图片（在推理工作线程中进行）
     return await process_prediction(
-        image=img,
+        load_image=lambda: base64_to_image(image_data),
         use_dollars=use_dollars,
         convert_align=convert_align,
         use_typst=use_typst,
-        source="剪贴板"
+        source="剪贴板",
+        client=client,
     )
 
 
+@app.post("/predict_raw")
+async def predict_raw(
+    request: Request,
+    use_dollars: bool = False,
+    convert_align: bool = False,
+    use_typst: bool = False,
+    client: str = Depends(rate_limited_client),
+):
+    """原始二进制图片转数学公式接口
+
+    请求体直接为图片内容（Content-Type 为 image/* 或 application/octet-stream），
+    选项放在查询字符串中。剪贴板客户端不需要base64编码，请求体小约25%，服务端也
+    不需要保存base64字符串与解码结果两份数据。
+    """
+    content_type = request.headers.get("content-type", "")
+    if not (content_type.startswith("image/") or content_type.startswith("application/octet-stream")):
+        raise HTTPException(status_code=415, detail="Body must be image/* or application/octet-stream")
+    try:
+        check_size(int(request.headers.get("content-length") or 0), MAX_IMAGE_BYTES)
+        body = await read_stream(request.stream(), MAX_IMAGE_BYTES)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+
+    try:
+        return await process_prediction(
+            load_image=lambda: open_image(body, MAX_IMAGE_PIXELS),
+            use_dollars=use_dollars,
+            convert_align=convert_align,
+            use_typst=use_typst,
+            source="原始图片",
+            client=client,
+        )
+    finally:
+        body.close()
+
+
 @app.post("/feedback")
 async def submit_feedback(
     latex_text: str = Form(...), feedback: str = Form(...), image_data: str = Form(None)
 ):
-    """提交反馈接口"""
+    """提交反馈接口：放入写入队列后立即返回，写入数据库与图片解码在后台线程中进行"""
+    if feedback_store is None:
+        return {"success": True, "message": "反馈未保存（未配置反馈存储）"}
+    if image_data:
+        try:
+            # 只按长度预估大小，解码留给写入线程
+            check_size(len(image_data) * 3 // 4, MAX_IMAGE_BYTES)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
     try:
-        # 简化反馈处理，不再保存到文件
+        feedback_store.submit(feedback, latex_text, image_data, model.version if model else None)
         return {"success": True, "message": "反馈已记录"}
-
+    except FeedbackQueueFullError as e:
+        logger.warning(f"Feedback rejected: {e}")
+        raise HTTPException(status_code=503, detail="Feedback queue is full, please retry later", headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Feedback submission error: {e}")
         raise HTTPException(
@@ -565,29 +1317,25 @@ async def submit_feedback(
 
 @app.get("/statistics")
 async def get_statistics():
-    """获取数据统计"""
-    try:
-        # 简化统计，不再依赖CSV文件
-        return {
-            "success": True,
-            "total_count": 0,
-            "feedback_counts": {},
-            "message": "统计功能已简化",
-        }
-    except Exception as e:
-        logger.error(f"Statistics error: {e}")
-        raise HTTPException(status_code=500, detail=f"Statistics failed: {str(e)}")
+    """获取数据统计：来自增量维护的计数，不扫描反馈表；尚未写入的反馈计入 pending"""
+    if feedback_store is None:
+        return {"success": True, "total_count": 0, "feedback_counts": {}, "message": "未配置反馈存储"}
+    return {"success": True, **feedback_store.stats()}
 
 
 @app.post("/reload_model")
 async def reload_model():
-    """重新加载模型"""
+    """重新加载模型（新模型预热完成后切换，期间当前模型继续处理请求）"""
+    if model_swap_lock.locked():
+        raise HTTPException(status_code=409, detail="模型正在重新加载")
     try:
-        success = load_model()
+        success = await run_in_threadpool(load_model)
         if success:
             return {"success": True, "message": "模型重新加载成功"}
         else:
-            raise HTTPException(status_code=500, detail="模型重新加载失败")
+            raise HTTPException(status_code=500, detail="模型重新加载失败，继续使用当前模型")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Model reload error: {e}")
         raise HTTPException(status_code=500, detail=f"Model reload failed: {str(e)}")
@@ -0,0 +1,82 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler:
+    """跨请求动态批处理调度器
+
+    在 max_wait_ms 的时间窗口内收集最多 max_batch_size 个请求，合并后交给
+    run_batch 一次执行，再把每一行的结果分发给各自调用方的 Future。
+    run_batch 接收请求列表，返回等长的结果列表；抛出的异常会传给整批的调用方。
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=10.0, name="batch-scheduler"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """提交单个请求，返回 concurrent.futures.Future"""
+        if self._closed:
+            raise RuntimeError("Batch scheduler is closed")
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def close(self):
+        """停止调度线程（已排队的请求仍会执行完）"""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        """从第一个请求开始，在时间窗口内凑满一批"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # 关闭信号放回队列，本批处理完后退出
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            # 跳过调用方已取消的请求
+            batch = [
+                (item, future)
+                for item, future in self._collect(first)
+                if future.set_running_or_notify_cancel()
+            ]
+            if not batch:
+                continue
+
+            logger.debug(f"Running batch of size {len(batch)}")
+            try:
+                results = self.run_batch([item for item, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
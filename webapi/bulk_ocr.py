@@ -0,0 +1,301 @@
+"""离线批量识别：目录、图片列表与PDF
+
+    python bulk_ocr.py INPUT... --output results.jsonl [--model-dir ../model] [--batch-size 8]
+
+INPUT 可以是目录（递归查找图片）、图片文件、每行一个路径的列表文件（.txt / .lst），
+或PDF（需要安装 PyMuPDF，每页渲染为一张图片，来源记为 file.pdf#page=N）。
+直接加载本地模型目录，不经过HTTP服务，也不访问网络。
+
+图片在线程池中预先解码与缩放填充（与服务端相同的 open_image + canvas），主线程按
+--batch-size 凑批后一次编码、批量解码。每批结果以JSON行追加到输出文件并落盘，
+中断后用同样的命令重新运行会跳过已成功的来源；失败的来源会重试，同一来源以最后
+一行为准。运行中定期输出进度，结束时输出吞吐量汇总。
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from generation import InferenceItem, generate_items
+from ingest import IMAGE_EXTENSIONS, open_image
+from latex_converter import UnsupportedLatex, convert_latex, format_latex
+from model_loader import build_model
+from ort_config import load_ort_settings
+from pandoc_service import PandocService
+
+logger = logging.getLogger(__name__)
+
+# 列表文件的扩展名
+LIST_EXTENSIONS = (".txt", ".lst")
+
+
+def _pdf_pages(path, dpi):
+    try:
+        import fitz
+    except ImportError:
+        raise SystemExit(f"{path}: reading PDFs requires PyMuPDF (pip install pymupdf)")
+
+    def loader(page_number):
+        def load_image():
+            with fitz.open(path) as document:
+                pixmap = document[page_number].get_pixmap(dpi=dpi, alpha=False)
+                return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        return load_image
+
+    with fitz.open(path) as document:
+        page_count = document.page_count
+    return [(f"{path}#page={number + 1}", loader(number)) for number in range(page_count)]
+
+
+def collect_sources(inputs, dpi=200):
+    """把输入展开为 (来源, load_image) 列表；load_image 为 None 时由 open_image 直接读取来源路径"""
+    sources = []
+    for name in inputs:
+        path = Path(name)
+        suffix = path.suffix.lower()
+        if path.is_dir():
+            sources.extend(
+                (str(file), None) for file in sorted(path.rglob("*"))
+                if file.is_file() and file.suffix.lower() in IMAGE_EXTENSIONS
+            )
+        elif suffix in LIST_EXTENSIONS:
+            lines = path.read_text(encoding="utf-8").splitlines()
+            sources.extend(collect_sources([line.strip() for line in lines if line.strip()], dpi))
+        elif suffix == ".pdf":
+            sources.extend(_pdf_pages(path, dpi))
+        elif path.is_file():
+            sources.append((str(path), None))
+        else:
+            raise SystemExit(f"Input not found: {name}")
+    return sources
+
+
+def load_checkpoint(output):
+    """读取已有的输出文件，返回已成功的来源集合
+
+    被中断时最后一行可能不完整，截断到最后一个完整的行，之后的结果接着追加。
+    """
+    done = set()
+    if not output.exists():
+        return done
+    valid_bytes = 0
+    with open(output, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            valid_bytes += len(line)
+            if record.get("success"):
+                done.add(record["source"])
+            else:
+                done.discard(record["source"])
+    if valid_bytes < output.stat().st_size:
+        logger.warning(f"Truncating incomplete record at the end of {output}")
+        with open(output, "r+b") as f:
+            f.truncate(valid_bytes)
+    return done
+
+
+class Progress:
+    """定期输出进度与最终的吞吐量汇总"""
+
+    def __init__(self, total, interval):
+        self.total = total
+        self.interval = interval
+        self.started = time.perf_counter()
+        self._last_report = self.started
+        self.succeeded = 0
+        self.failed = 0
+        self.preprocess_seconds = 0.0
+        self.inference_seconds = 0.0
+
+    @property
+    def processed(self):
+        return self.succeeded + self.failed
+
+    def update(self, succeeded, failed):
+        self.succeeded += succeeded
+        self.failed += failed
+        now = time.perf_counter()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            rate = self.processed / (now - self.started)
+            remaining = (self.total - self.processed) / rate if rate else float("inf")
+            logger.info(
+                f"{self.processed}/{self.total} images, {rate:.2f} images/s, "
+                f"{self.failed} failed, ETA {remaining:.0f}s"
+            )
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "images": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "images_per_second": round(self.processed / elapsed, 3) if elapsed else 0.0,
+            # 预处理在线程池中与推理重叠，两者之和可以超过总耗时
+            "preprocess_seconds": round(self.preprocess_seconds, 3),
+            "inference_seconds": round(self.inference_seconds, 3),
+        }
+
+
+def prepare(model, source, load_image, max_pixels):
+    """在预取线程中执行：解码图片并缩放填充到 uint8 画布，返回 (画布, 错误, 耗时)"""
+    start = time.perf_counter()
+    try:
+        image = load_image() if load_image is not None else open_image(source, max_pixels)
+        canvas = model.preprocessor.canvas(image.convert("RGB") if image.mode != "RGB" else image)
+        return canvas, None, time.perf_counter() - start
+    except Exception as e:
+        return None, f"Image decoding failed: {e}", time.perf_counter() - start
+
+
+def format_output(text, args, pandoc):
+    """与接口相同的后处理；--to 为 typst / markdown 时用 pandoc 转换（--native-converter 时先用内置转换器）"""
+    result = format_latex(text, args.use_dollars, args.convert_align)
+    if args.to == "latex":
+        return result
+    if args.native_converter:
+        try:
+            return convert_latex(result, args.to)
+        except UnsupportedLatex:
+            pass
+    return pandoc.convert(result, to=args.to, format="latex")
+
+
+def run(args):
+    sources = collect_sources(args.inputs, args.dpi)
+    output = Path(args.output)
+    done = load_checkpoint(output) if args.resume else set()
+    pending = [(source, load_image) for source, load_image in sources if source not in done]
+    logger.info(f"{len(sources)} images, {len(sources) - len(pending)} already done, {len(pending)} to process")
+    if not pending:
+        return {"images": 0, "skipped": len(sources)}
+
+    timings = {}
+    model = build_model(
+        args.model_dir,
+        variant=args.variant,
+        tokenizer_backend=args.tokenizer,
+        ort_settings=load_ort_settings(args.ort_config),
+        timings=timings,
+    )
+    logger.info(f"Loaded model version {model.version} ({args.variant}) in {sum(timings.values()):.2f}s")
+
+    pandoc = PandocService(args.pandoc_path) if args.to != "latex" else None
+
+    progress = Progress(len(pending), args.report_interval)
+    # 预取窗口：预处理最多领先推理 prefetch 批
+    window = args.batch_size * max(1, args.prefetch)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    mode = "a" if args.resume else "w"
+    with ThreadPoolExecutor(args.workers, thread_name_prefix="prefetch") as executor, \
+            open(output, mode, encoding="utf-8") as out:
+        queue = deque()
+        remaining = iter(pending)
+
+        def fill():
+            for source, load_image in remaining:
+                queue.append((source, executor.submit(prepare, model, source, load_image, args.max_pixels)))
+                if len(queue) >= window:
+                    return
+
+        fill()
+        while queue:
+            batch = [queue.popleft() for _ in range(min(args.batch_size, len(queue)))]
+            fill()
+
+            records = {}
+            ready = []
+            for source, future in batch:
+                canvas, error, seconds = future.result()
+                progress.preprocess_seconds += seconds
+                if error is not None:
+                    records[source] = {"source": source, "success": False, "error": error}
+                else:
+                    ready.append((source, canvas))
+
+            if ready:
+                start = time.perf_counter()
+                items = [InferenceItem(canvas, args.max_length, None, None) for _, canvas in ready]
+                try:
+                    texts = generate_items(model, items, not args.no_iobinding, args.draft_tokens)
+                except Exception as e:
+                    logger.error(f"Batch inference failed: {e}")
+                    texts = [e] * len(ready)
+                progress.inference_seconds += time.perf_counter() - start
+                for (source, _), text in zip(ready, texts):
+                    if isinstance(text, Exception):
+                        records[source] = {"source": source, "success": False, "error": f"Inference failed: {text}"}
+                        continue
+                    try:
+                        records[source] = {"source": source, "success": True, "latex": format_output(text, args, pandoc)}
+                    except Exception as e:
+                        records[source] = {"source": source, "success": False, "error": f"Conversion failed: {e}"}
+
+            # 按输入顺序写出整批结果，再落盘作为检查点
+            for source, _ in batch:
+                out.write(json.dumps(records[source], ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+            succeeded = sum(record["success"] for record in records.values())
+            progress.update(succeeded, len(records) - succeeded)
+
+    if pandoc is not None:
+        pandoc.close()
+    return {**progress.summary(), "skipped": len(sources) - len(pending)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline bulk OCR of image directories, image lists and PDFs")
+    parser.add_argument("inputs", nargs="+", help="directories, image files, list files (.txt/.lst) or PDFs")
+    parser.add_argument("--output", "-o", required=True, help="JSONL results, one line per image")
+    parser.add_argument("--model-dir", default=os.path.abspath("../model"))
+    parser.add_argument("--variant", default=os.environ.get("MIXTEX_MODEL_VARIANT", "fp32"),
+                        choices=["fp32", "int8", "int8-full"])
+    parser.add_argument("--tokenizer", default=os.environ.get("MIXTEX_TOKENIZER", "fast"),
+                        choices=["fast", "transformers"])
+    parser.add_argument("--ort-config", default=os.environ.get("MIXTEX_ORT_CONFIG", ""),
+                        help="ONNX Runtime session config file (MIXTEX_ORT_* variables also apply)")
+    parser.add_argument("--batch-size", type=int, default=8, help="images per encoder call")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="threads decoding and preprocessing images")
+    parser.add_argument("--prefetch", type=int, default=4, help="batches preprocessed ahead of inference")
+    parser.add_argument("--max-length", type=int, default=512, help="max tokens generated per image")
+    parser.add_argument("--max-pixels", type=int, default=int(os.environ.get("MIXTEX_MAX_IMAGE_PIXELS", "50000000")))
+    parser.add_argument("--draft-tokens", type=int, default=0,
+                        help="speculative decoding draft length (only used once a batch is down to one row)")
+    parser.add_argument("--no-iobinding", action="store_true", help="use the plain decoder runner")
+    parser.add_argument("--to", default="latex", choices=["latex", "typst", "markdown"])
+    parser.add_argument("--use-dollars", action="store_true")
+    parser.add_argument("--convert-align", action="store_true")
+    parser.add_argument("--native-converter", action="store_true",
+                        default=os.environ.get("MIXTEX_NATIVE_CONVERTER", "0").lower() in ("1", "true", "yes"),
+                        help="try the built-in LaTeX converter before pandoc for --to (MIXTEX_NATIVE_CONVERTER)")
+    parser.add_argument("--pandoc-path", default=os.environ.get("MIXTEX_PANDOC_PATH", "pandoc"),
+                        help="pandoc used for --to typst/markdown")
+    parser.add_argument("--dpi", type=int, default=200, help="PDF rendering resolution")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="overwrite the output instead of skipping images it already contains")
+    parser.add_argument("--report-interval", type=float, default=10, help="seconds between progress lines")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    # 只使用本地模型目录（transformers 分词器也不查询 Hugging Face Hub）
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    print(json.dumps(run(args), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import threading
+
+import numpy as np
+
+# 模型推理参数
+NUM_LAYERS = 6
+HIDDEN_SIZE = 768
+NUM_ATTENTION_HEADS = 12
+HEAD_SIZE = HIDDEN_SIZE // NUM_ATTENTION_HEADS
+
+PAST_NAMES = [f"past_key_values.{i}.{t}" for i in range(NUM_LAYERS) for t in ["key", "value"]]
+PRESENT_NAMES = [f"present.{i}.{t}" for i in range(NUM_LAYERS) for t in ["key", "value"]]
+
+# KV缓冲区的初始容量（每个张量的位置数），不够时按2倍扩容
+INITIAL_KV_POSITIONS = 64
+
+
+def empty_past_key_values(batch_size):
+    """构造空的KV缓存"""
+    return {
+        name: np.zeros((batch_size, NUM_ATTENTION_HEADS, 0, HEAD_SIZE), dtype=np.float32)
+        for name in PAST_NAMES
+    }
+
+
+class SessionRunner:
+    """直接调用 session.run 的解码器执行器
+
+    每步由ORT分配新的输出，再转换为numpy数组作为下一步的输入。
+    """
+
+    def __init__(self, session, encoder_hidden_states, input_ids):
+        self.session = session
+        self.inputs = {
+            "input_ids": input_ids,
+            "encoder_hidden_states": encoder_hidden_states,
+            "use_cache_branch": np.array([True], dtype=bool),
+            **empty_past_key_values(input_ids.shape[0]),
+        }
+        self.past_length = 0
+        self._outputs = None
+
+    def run(self):
+        """执行一步解码，返回 logits [B, T, V]"""
+        self._outputs = self.session.run(None, self.inputs)
+        return self._outputs[0]
+
+    def advance(self, input_ids, keep=None, discard=0):
+        """以本步输出的KV缓存作为下一步输入；keep 为保留的行（None表示全部保留），
+        discard 为丢弃的本步输入末尾的位置数（未被接受的草稿token）"""
+        self.past_length += self.inputs["input_ids"].shape[1] - discard
+        past_key_values = dict(zip(PAST_NAMES, self._outputs[1:]))
+        if discard:
+            past_key_values = {name: value[:, :, :self.past_length] for name, value in past_key_values.items()}
+        if keep is not None:
+            past_key_values = {name: value[keep] for name, value in past_key_values.items()}
+            self.inputs["encoder_hidden_states"] = self.inputs["encoder_hidden_states"][keep]
+        self.inputs.update({"input_ids": input_ids, **past_key_values})
+
+    def close(self):
+        self._outputs = None
+
+
+class KVBuffers:
+    """预分配的双缓冲KV存储
+
+    storage[k, i] 是第 i 个KV张量在第 k 组缓冲中的扁平存储。每步从一组读取
+    past_key_values，把 present 写入另一组，然后交换，主机侧不再分配或拷贝KV数据。
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.storage = np.empty((2, len(PAST_NAMES), capacity), dtype=np.float32)
+
+    def view(self, parity, index, shape):
+        size = shape[0] * shape[1] * shape[2] * shape[3]
+        return self.storage[parity, index, :size].reshape(shape)
+
+
+class KVBufferPool:
+    """跨请求复用KV缓冲区，只保留一组空闲缓冲（容量最大的那组）"""
+
+    def __init__(self):
+        self._idle = None
+        self._lock = threading.Lock()
+        self.allocations = 0
+
+    def acquire(self, capacity):
+        with self._lock:
+            buffers, self._idle = self._idle, None
+        if buffers is None or buffers.capacity < capacity:
+            buffers = KVBuffers(capacity)
+            self.allocations += 1
+        return buffers
+
+    def release(self, buffers):
+        with self._lock:
+            if self._idle is None or self._idle.capacity < buffers.capacity:
+                self._idle = buffers
+
+
+kv_buffer_pool = KVBufferPool()
+
+
+class IOBindingRunner:
+    """基于 IOBinding 的解码器执行器
+
+    KV缓存位于预分配的双缓冲区中，通过指针直接绑定为输入/输出；logits写入
+    预分配的缓冲区；编码器输出只绑定一次。只有批次中有行结束时，才把剩余行
+    压缩到另一组缓冲中。
+    """
+
+    def __init__(self, session, encoder_hidden_states, input_ids, pool=kv_buffer_pool):
+        self.session = session
+        self.pool = pool
+        self.binding = session.io_binding()
+        self.batch_size = input_ids.shape[0]
+        self.past_length = 0
+        self.parity = 0
+        self.buffers = pool.acquire(self._elements(self.batch_size, INITIAL_KV_POSITIONS))
+        self._logits = None
+        self._vocab_size = None
+
+        self.use_cache_branch = np.array([True], dtype=bool)
+        self.binding.bind_cpu_input("use_cache_branch", self.use_cache_branch)
+        self._bind_encoder(np.ascontiguousarray(encoder_hidden_states))
+        self._bind_input_ids(input_ids)
+
+    @staticmethod
+    def _elements(batch_size, positions):
+        return batch_size * NUM_ATTENTION_HEADS * positions * HEAD_SIZE
+
+    def _bind_encoder(self, encoder_hidden_states):
+        self.encoder_hidden_states = encoder_hidden_states
+        self.binding.bind_cpu_input("encoder_hidden_states", encoder_hidden_states)
+
+    def _bind_input_ids(self, input_ids):
+        self.input_ids = np.ascontiguousarray(input_ids, dtype=np.int64)
+        self.binding.bind_cpu_input("input_ids", self.input_ids)
+
+    def _bind_buffer(self, bind, name, array):
+        bind(name, "cpu", 0, np.float32, list(array.shape), array.ctypes.data)
+
+    def _ensure_capacity(self, positions):
+        """KV缓冲区不够时扩容（容量翻倍），并把当前的 past 拷贝到新缓冲区"""
+        needed = self._elements(self.batch_size, positions)
+        if needed <= self.buffers.capacity:
+            return
+        capacity = max(needed, self.buffers.capacity * 2)
+        buffers = self.pool.acquire(capacity)
+        size = self._elements(self.batch_size, self.past_length)
+        buffers.storage[self.parity, :, :size] = self.buffers.storage[self.parity, :, :size]
+        self.pool.release(self.buffers)
+        self.buffers = buffers
+
+    def _past_shape(self, length):
+        return (self.batch_size, NUM_ATTENTION_HEADS, length, HEAD_SIZE)
+
+    def run(self):
+        """执行一步解码，返回 logits [B, T, V]（预分配缓冲区的视图，下一步前有效）"""
+        seq_length = self.input_ids.shape[1]
+        self._ensure_capacity(self.past_length + seq_length)
+
+        # logits 最先绑定，使其位于 get_outputs() 的第一个
+        logits = self._logits_view(seq_length)
+        if logits is None:
+            # 第一次运行时词表大小未知，由ORT分配logits
+            self.binding.bind_output("logits", "cpu")
+        else:
+            self._bind_buffer(self.binding.bind_output, "logits", logits)
+
+        past_shape = self._past_shape(self.past_length)
+        present_shape = self._past_shape(self.past_length + seq_length)
+        for index, (past_name, present_name) in enumerate(zip(PAST_NAMES, PRESENT_NAMES)):
+            self._bind_buffer(
+                self.binding.bind_input, past_name, self.buffers.view(self.parity, index, past_shape)
+            )
+            self._bind_buffer(
+                self.binding.bind_output, present_name, self.buffers.view(1 - self.parity, index, present_shape)
+            )
+
+        self.session.run_with_iobinding(self.binding)
+
+        if logits is None:
+            logits = self.binding.get_outputs()[0].numpy()
+            self._vocab_size = logits.shape[-1]
+        return logits
+
+    def _logits_view(self, seq_length):
+        if self._vocab_size is None:
+            return None
+        vocab_size = self._vocab_size
+        size = self.batch_size * seq_length * vocab_size
+        if self._logits is None or self._logits.shape[0] < size:
+            self._logits = np.empty(max(size, self.batch_size * vocab_size), dtype=np.float32)
+        return self._logits[:size].reshape(self.batch_size, seq_length, vocab_size)
+
+    def advance(self, input_ids, keep=None, discard=0):
+        """交换KV缓冲并设置下一步输入；keep 为保留的行（None表示全部保留），
+        discard 为丢弃的本步输入末尾的位置数（未被接受的草稿token）"""
+        old_shape = self._past_shape(self.past_length + self.input_ids.shape[1])
+        self.past_length += self.input_ids.shape[1] - discard
+        self.parity = 1 - self.parity
+
+        if keep is not None or discard:
+            # 把保留的行与位置压缩写入另一组缓冲区，再交换
+            if keep is not None:
+                self.batch_size = len(keep)
+            new_shape = self._past_shape(self.past_length)
+            for index in range(len(PAST_NAMES)):
+                present = self.buffers.view(self.parity, index, old_shape)[:, :, : self.past_length]
+                target = self.buffers.view(1 - self.parity, index, new_shape)
+                if keep is not None:
+                    np.take(present, keep, axis=0, out=target)
+                else:
+                    target[...] = present
+            self.parity = 1 - self.parity
+            if keep is not None:
+                self._bind_encoder(self.encoder_hidden_states[keep])
+
+        self._bind_input_ids(input_ids)
+
+    def close(self):
+        """归还KV缓冲区"""
+        if self.buffers is not None:
+            self.pool.release(self.buffers)
+            self.buffers = None
+
+
+def create_decoder_runner(session, encoder_hidden_states, input_ids, use_iobinding=True):
+    """创建解码器执行器"""
+    if use_iobinding:
+        return IOBindingRunner(session, encoder_hidden_states, input_ids)
+    return SessionRunner(session, encoder_hidden_states, input_ids)
@@ -0,0 +1,55 @@
+import codecs
+
+
+def bytes_to_unicode():
+    """字节级BPE（GPT-2/RoBERTa）使用的字节到可见Unicode字符的映射"""
+    bs = (
+        list(range(ord("!"), ord("~") + 1))
+        + list(range(ord("¡"), ord("¬") + 1))
+        + list(range(ord("®"), ord("ÿ") + 1))
+    )
+    cs = bs[:]
+    n = 0
+    for b in range(2**8):
+        if b not in bs:
+            bs.append(b)
+            cs.append(2**8 + n)
+            n += 1
+    return dict(zip(bs, map(chr, cs)))
+
+
+def build_token_bytes(vocab, special_ids=()):
+    """由词表（token -> id）构造 id -> 原始字节 的查找表，特殊token映射为空字节串"""
+    byte_decoder = {c: b for b, c in bytes_to_unicode().items()}
+    special_ids = set(special_ids)
+    table = [b""] * (max(vocab.values()) + 1)
+    for token, token_id in vocab.items():
+        if token_id in special_ids:
+            continue
+        if all(c in byte_decoder for c in token):
+            table[token_id] = bytes(byte_decoder[c] for c in token)
+        else:
+            # 非字节级编码的附加token，按原文处理
+            table[token_id] = token.encode("utf-8")
+    return table
+
+
+class StreamingDetokenizer:
+    """增量反分词器
+
+    每步只把新token的字节送入增量UTF-8解码器，返回新增的完整字符；
+    跨多个token的多字节字符会在凑齐后一次输出，而不是被解码成替换字符。
+    最终结果仍应由 tokenizer.decode 对完整的id序列解码一次得到。
+    """
+
+    def __init__(self, token_bytes):
+        self.token_bytes = token_bytes
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def push(self, token_id):
+        """追加一个token，返回新增的文本（可能为空）"""
+        return self._decoder.decode(self.token_bytes[token_id])
+
+    def flush(self):
+        """结束解码，返回残留的不完整字节对应的文本"""
+        return self._decoder.decode(b"", final=True)
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path, PurePosixPath
+
+logger = logging.getLogger(__name__)
+
+# 每个分段请求的大小、并发连接数与读缓冲
+CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_WORKERS = 4
+BUFFER_SIZE = 1024 * 1024
+
+# 连接超时与两次读取之间的最长间隔（秒），响应体停滞时也会超时
+TIMEOUT = (10, 60)
+
+# 每个分段的最多尝试次数
+MAX_ATTEMPTS = 3
+
+# 进度日志的最小间隔（秒）
+LOG_INTERVAL = 5
+
+
+class DownloadError(Exception):
+    """下载或校验失败"""
+
+
+class DownloadProgress:
+    """线程安全的下载进度，供 /download_progress 查询"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset("idle")
+
+    def reset(self, status, url=None):
+        with self._lock:
+            self.status = status
+            self.url = url
+            self.total_bytes = 0
+            self.downloaded_bytes = 0
+            self.resumed_bytes = 0
+            self.error = None
+            self.started_at = time.time()
+            self.finished_at = None
+
+    def set_status(self, status, error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+            if status in ("done", "error"):
+                self.finished_at = time.time()
+
+    def start(self, total_bytes, resumed_bytes=0):
+        with self._lock:
+            self.total_bytes = total_bytes
+            self.downloaded_bytes = resumed_bytes
+            self.resumed_bytes = resumed_bytes
+
+    def advance(self, size):
+        with self._lock:
+            self.downloaded_bytes += size
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            fetched = self.downloaded_bytes - self.resumed_bytes
+            return {
+                "status": self.status,
+                "url": self.url,
+                "total_bytes": self.total_bytes,
+                "downloaded_bytes": self.downloaded_bytes,
+                "resumed_bytes": self.resumed_bytes,
+                "percent": round(100 * self.downloaded_bytes / self.total_bytes, 1) if self.total_bytes else None,
+                "bytes_per_second": round(fetched / elapsed) if elapsed > 0 else 0,
+                "elapsed_seconds": round(elapsed, 1),
+                "error": self.error,
+            }
+
+
+def _probe(session, url):
+    """返回 (最终URL, 大小, 是否支持Range, ETag)"""
+    response = session.head(url, allow_redirects=True, timeout=TIMEOUT)
+    response.raise_for_status()
+    size = int(response.headers.get("Content-Length", 0))
+    accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    return response.url, size, accepts_ranges, response.headers.get("ETag")
+
+
+class _ResumeState:
+    """分段下载的断点记录（每个分段已写入的字节数），与 .part 文件放在一起"""
+
+    def __init__(self, path, identity):
+        self.path = path
+        self.identity = identity
+        self.written = {}
+        self._lock = threading.Lock()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("identity") == identity:
+                self.written = {int(index): size for index, size in data.get("written", {}).items()}
+        except (OSError, ValueError):
+            pass
+
+    def update(self, index, size):
+        with self._lock:
+            self.written[index] = size
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text(json.dumps({"identity": self.identity, "written": self.written}), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+
+def _fetch_range(session, url, part_path, index, start, end, state, progress):
+    """下载 [start, end] 字节写入 part_path 的对应位置，从该分段已写入的位置继续，失败时重试"""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        offset = start + state.written.get(index, 0)
+        if offset > end:
+            return
+        try:
+            headers = {"Range": f"bytes={offset}-{end}"}
+            with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                if response.status_code != 206:
+                    raise DownloadError(f"Server ignored range request (HTTP {response.status_code})")
+                with open(part_path, "r+b") as f:
+                    f.seek(offset)
+                    for data in response.iter_content(BUFFER_SIZE):
+                        f.write(data)
+                        f.flush()
+                        offset += len(data)
+                        state.update(index, offset - start)
+                        progress.advance(len(data))
+            if offset != end + 1:
+                raise DownloadError(f"Incomplete range {start}-{end}: stopped at {offset}")
+            return
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            logger.warning(f"Range {start}-{end} failed ({e}), retrying ({attempt}/{MAX_ATTEMPTS})")
+
+
+def _download_ranges(session, url, part_path, size, identity, chunk_size, workers, progress):
+    """按分段并发下载，各分段的进度记录在 .part.json 中，重新调用时从断点继续"""
+    state = _ResumeState(part_path.with_name(part_path.name + ".json"), identity)
+    if not state.written or not part_path.exists() or part_path.stat().st_size != size:
+        state.written = {}
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+
+    ranges = [(i, start, min(start + chunk_size, size) - 1) for i, start in enumerate(range(0, size, chunk_size))]
+    pending = [r for r in ranges if state.written.get(r[0], 0) < r[2] - r[1] + 1]
+    resumed = sum(state.written.values())
+    progress.start(size, resumed)
+    if resumed:
+        logger.info(f"Resuming download: {resumed / 2**20:.1f} of {size / 2**20:.1f} MiB already present")
+
+    def fetch(chunk):
+        _fetch_range(session, url, part_path, *chunk, state, progress)
+
+    with ThreadPoolExecutor(max(1, min(workers, len(pending)))) as executor:
+        futures = [executor.submit(fetch, chunk) for chunk in pending]
+        _wait_with_logging(futures, progress)
+    state.path.unlink()
+
+
+def _download_stream(session, url, part_path, progress):
+    """服务器不支持分段时顺序下载，已有的 .part 文件通过 Range 续传（服务器拒绝时重新下载）"""
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            offset = 0
+        length = int(response.headers.get("Content-Length", 0))
+        progress.start(offset + length if length else 0, offset)
+        last_log = time.monotonic()
+        with open(part_path, "ab" if offset else "wb") as f:
+            for data in response.iter_content(BUFFER_SIZE):
+                f.write(data)
+                progress.advance(len(data))
+                if time.monotonic() - last_log >= LOG_INTERVAL:
+                    _log_progress(progress)
+                    last_log = time.monotonic()
+
+
+def _wait_with_logging(futures, progress):
+    """等待所有分段完成并定期记录进度；任一分段失败时取消尚未开始的分段并抛出其异常"""
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=LOG_INTERVAL, return_when=FIRST_EXCEPTION)
+        for future in done:
+            if future.exception() is not None:
+                for other in pending:
+                    other.cancel()
+                raise future.exception()
+        if pending:
+            _log_progress(progress)
+
+
+def _log_progress(progress):
+    snapshot = progress.snapshot()
+    percent = f"{snapshot['percent']}%" if snapshot["percent"] is not None else "?"
+    logger.info(
+        f"Downloading model: {snapshot['downloaded_bytes'] / 2**20:.1f} MiB ({percent}), "
+        f"{snapshot['bytes_per_second'] / 2**20:.1f} MiB/s"
+    )
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BUFFER_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def download_file(url, dest, sha256=None, chunk_size=CHUNK_SIZE, workers=DOWNLOAD_WORKERS, progress=None):
+    """下载 url 到 dest
+
+    支持 Range 的服务器按 chunk_size 分段、workers 个连接并发下载；数据先写入
+    dest.part，中断后再次调用会从已完成的部分继续。给出 sha256 时校验完整文件，
+    不一致则删除已下载的数据并抛出 DownloadError。成功后 dest.part 原子地重命名为 dest。
+    """
+    import requests
+
+    dest = Path(dest)
+    part_path = dest.with_name(dest.name + ".part")
+    progress = progress or DownloadProgress()
+    progress.reset("downloading", url)
+
+    with requests.Session() as session:
+        final_url, size, accepts_ranges, etag = _probe(session, url)
+        logger.info(f"Downloading {final_url} ({size / 2**20:.1f} MiB, ranges {'yes' if accepts_ranges else 'no'})")
+        if accepts_ranges and size > 0:
+            identity = {"url": url, "size": size, "etag": etag, "chunk_size": chunk_size}
+            _download_ranges(session, final_url, part_path, size, identity, chunk_size, workers, progress)
+        else:
+            _download_stream(session, final_url, part_path, progress)
+
+    if sha256:
+        progress.set_status("verifying")
+        actual = file_sha256(part_path)
+        if actual != sha256.lower():
+            part_path.unlink()
+            raise DownloadError(f"SHA-256 mismatch for {dest.name}: expected {sha256}, got {actual}")
+        logger.info(f"Verified SHA-256 of {dest.name}")
+    os.replace(part_path, dest)
+    return dest
+
+
+def extract_subdir(zip_path, subdir, dest_dir):
+    """只解压 zip 中名为 subdir 的目录（可位于任意层级）下的文件到 dest_dir
+
+    文件先写入 dest_dir.staging，全部完成后重命名为 dest_dir。
+    """
+    dest_dir = Path(dest_dir)
+    staging_dir = dest_dir.with_name(dest_dir.name + ".staging")
+    if staging_dir.exists():
+        shutil.rmtree(staging_dir)
+    extracted = 0
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.infolist():
+                parts = PurePosixPath(member.filename).parts
+                if member.is_dir() or subdir not in parts[:-1]:
+                    continue
+                relative = parts[parts.index(subdir) + 1:]
+                if ".." in relative:
+                    raise DownloadError(f"Unsafe path in archive: {member.filename}")
+                target = staging_dir.joinpath(*relative)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with archive.open(member) as source, open(target, "wb") as output:
+                    shutil.copyfileobj(source, output, BUFFER_SIZE)
+                extracted += 1
+        if not extracted:
+            raise DownloadError(f"No '{subdir}/' directory found in {Path(zip_path).name}")
+        os.replace(staging_dir, dest_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    logger.info(f"Extracted {extracted} files from {subdir}/ to {dest_dir}")
+    return dest_dir
@@ -0,0 +1,78 @@
+import json
+import logging
+from pathlib import Path
+
+from tokenizers import Tokenizer
+
+logger = logging.getLogger(__name__)
+
+
+def clean_up_tokenization(text):
+    """与 transformers 的 clean_up_tokenization 相同的空格清理"""
+    return (
+        text.replace(" .", ".")
+        .replace(" ?", "?")
+        .replace(" !", "!")
+        .replace(" ,", ",")
+        .replace(" ' ", "'")
+        .replace(" n't", "n't")
+        .replace(" 'm", "'m")
+        .replace(" 's", "'s")
+        .replace(" 've", "'ve")
+        .replace(" 're", "'re")
+    )
+
+
+class FastTokenizer:
+    """直接从 tokenizer.json 加载的 Rust tokenizers 分词器
+
+    只实现推理用到的接口（encode、decode、get_vocab、eos_token_id、
+    all_special_ids），行为与 RobertaTokenizer 一致，但不需要导入 transformers。
+    特殊token与空格清理选项从 tokenizer_config.json / special_tokens_map.json 读取。
+    """
+
+    def __init__(self, tokenizer, special_tokens, clean_up_tokenization_spaces=True):
+        self._tokenizer = tokenizer
+        self.clean_up_tokenization_spaces = clean_up_tokenization_spaces
+
+        self.bos_token_id = tokenizer.token_to_id(special_tokens.get("bos_token", "<s>"))
+        self.eos_token_id = tokenizer.token_to_id(special_tokens.get("eos_token", "</s>"))
+        self.pad_token_id = tokenizer.token_to_id(special_tokens.get("pad_token", "<pad>"))
+        special_ids = {tokenizer.token_to_id(token) for token in special_tokens.values()}
+        special_ids.discard(None)
+        self.all_special_ids = sorted(special_ids)
+
+    @classmethod
+    def from_pretrained(cls, model_dir):
+        model_dir = Path(model_dir)
+        tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+
+        config = {}
+        for name in ["tokenizer_config.json", "special_tokens_map.json"]:
+            path = model_dir / name
+            if path.exists():
+                with open(path, "r", encoding="utf-8") as f:
+                    config.update(json.load(f))
+
+        special_tokens = {}
+        for key in ["bos_token", "eos_token", "unk_token", "sep_token", "pad_token", "cls_token", "mask_token"]:
+            token = config.get(key)
+            if isinstance(token, dict):
+                token = token.get("content")
+            if token:
+                special_tokens[key] = token
+
+        return cls(tokenizer, special_tokens, config.get("clean_up_tokenization_spaces", True))
+
+    def encode(self, text):
+        """编码文本（包含 <s> / </s>），返回 id 列表"""
+        return self._tokenizer.encode(text).ids
+
+    def decode(self, ids, skip_special_tokens=False):
+        text = self._tokenizer.decode(ids, skip_special_tokens=skip_special_tokens)
+        if self.clean_up_tokenization_spaces:
+            text = clean_up_tokenization(text)
+        return text
+
+    def get_vocab(self):
+        return self._tokenizer.get_vocab(with_added_tokens=True)
@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from ingest import ImageTooLargeError, decode_base64
+
+logger = logging.getLogger(__name__)
+
+# 反馈标签的最大长度（聚合表按标签计数，截断避免任意长的键）
+MAX_LABEL_LENGTH = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    label TEXT NOT NULL,
+    latex TEXT NOT NULL,
+    image_hash TEXT,
+    model_version TEXT
+);
+CREATE TABLE IF NOT EXISTS images (
+    hash TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS feedback_counts (
+    label TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS store_counts (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class FeedbackQueueFullError(Exception):
+    """写入队列已满，反馈被拒绝"""
+
+
+class FeedbackStore:
+    """只追加的反馈存储（SQLite，WAL模式）与后台批量写入
+
+    submit() 只把记录放入有界队列，立即返回；后台线程每次取出最多 batch_size 条，
+    在一个事务中写入。base64图片在写入线程中解码，按内容的SHA-256去重后只保存一份。
+    按标签的计数与总数在同一事务中增量更新到聚合表，启动时读入内存，
+    stats() 只读内存中的计数，从不扫描反馈表。
+    """
+
+    def __init__(self, path, max_pending=1024, batch_size=256, max_image_bytes=32 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_image_bytes = max_image_bytes
+        self.batch_size = max(1, int(batch_size))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL模式下 NORMAL 仍保证数据库一致，只可能丢失断电前最后的事务
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+        self._lock = threading.Lock()
+        self._counts = dict(self._conn.execute("SELECT label, count FROM feedback_counts"))
+        totals = dict(self._conn.execute("SELECT name, value FROM store_counts"))
+        self._total = totals.get("feedback", 0)
+        self._images = totals.get("images", 0)
+        self.dropped = 0
+        self.failed = 0
+
+        self._queue = queue.Queue(max(1, int(max_pending)))
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+        self._writer.start()
+
+    def submit(self, label, latex, image_data=None, model_version=None):
+        """放入写入队列；队列已满时抛出 FeedbackQueueFullError"""
+        if self._closed:
+            raise FeedbackQueueFullError("Feedback store is closed")
+        record = (time.time(), label.strip()[:MAX_LABEL_LENGTH], latex, image_data, model_version)
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            raise FeedbackQueueFullError("Feedback queue is full")
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                return
+            batch = [record]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    stop = True
+                    break
+                batch.append(record)
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} feedback records: {e}")
+                with self._lock:
+                    self.failed += len(batch)
+            if stop:
+                return
+
+    def _decode_image(self, image_data):
+        if not image_data:
+            return None
+        try:
+            return decode_base64(image_data, self.max_image_bytes).getvalue()
+        except (ImageTooLargeError, ValueError) as e:
+            logger.warning(f"Feedback image not saved: {e}")
+            return None
+
+    def _write(self, batch):
+        rows = []
+        images = {}
+        counts = {}
+        for created, label, latex, image_data, model_version in batch:
+            data = self._decode_image(image_data)
+            image_hash = None
+            if data is not None:
+                image_hash = hashlib.sha256(data).hexdigest()
+                images.setdefault(image_hash, (image_hash, data, len(data), created))
+            rows.append((created, label, latex, image_hash, model_version))
+            counts[label] = counts.get(label, 0) + 1
+
+        with self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO images VALUES (?, ?, ?, ?)", list(images.values()))
+            new_images = self._conn.total_changes - before
+            self._conn.executemany(
+                "INSERT INTO feedback (created, label, latex, image_hash, model_version) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.executemany(
+                "INSERT INTO feedback_counts VALUES (?, ?) "
+                "ON CONFLICT(label) DO UPDATE SET count = count + excluded.count",
+                list(counts.items()),
+            )
+            self._conn.executemany(
+                "INSERT INTO store_counts VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                [("feedback", len(rows)), ("images", new_images)],
+            )
+
+        # 事务提交后再更新内存中的计数，与数据库保持一致
+        with self._lock:
+            for label, count in counts.items():
+                self._counts[label] = self._counts.get(label, 0) + count
+            self._total += len(rows)
+            self._images += new_images
+
+    def stats(self):
+        """已写入的反馈总数、按标签的计数、去重后的图片数，以及等待写入与被丢弃的条数"""
+        with self._lock:
+            return {
+                "total_count": self._total,
+                "feedback_counts": dict(self._counts),
+                "image_count": self._images,
+                "pending": self._queue.qsize(),
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def close(self, timeout=10):
+        """写完队列中剩余的记录后关闭数据库"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            logger.warning("Feedback writer did not finish in time, pending records are lost")
+            return
+        self._conn.close()
@@ -0,0 +1,223 @@
+import logging
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from decoder_runner import create_decoder_runner
+from detokenize import StreamingDetokenizer
+from metrics import DECODER_STEP_SECONDS, DRAFT_TOKENS, GENERATED_TOKENS, GENERATION_STOPS, STAGE_SECONDS
+from repetition import RepetitionDetector
+from speculative import PromptLookupDrafter, ngram_table
+
+logger = logging.getLogger(__name__)
+
+REPETITION_REPEATS = 21
+
+# 预热时每行最多生成的步数
+WARMUP_MAX_LENGTH = 8
+
+# 提交给批处理调度器的单个请求：canvas 为 uint8 [448, 448, 3] 画布；on_text / cancel_event 仅流式请求使用；
+# model 为计算结果缓存键时所用的模型，结果必须由它生成（为空时使用调度时的当前模型）
+InferenceItem = namedtuple(
+    "InferenceItem", ["canvas", "max_length", "on_text", "cancel_event", "model"], defaults=(None,)
+)
+
+
+def generate_batch(
+    model, pixel_values, max_lengths, use_iobinding=True, on_text=None, cancel_events=None, record_metrics=True,
+    draft_tokens=0,
+):
+    """批量编码并贪心解码
+
+    pixel_values: [N, 3, 448, 448]，max_lengths: 每行的最大生成步数。
+    每行维护自己的KV缓存（批次维度上的切片），遇到EOS或重复即从批次中移除，
+    其余行继续解码。生成过程只记录token id（增量反分词仅用于重复检测），
+    结束后每行调用一次 tokenizer.decode。返回与输入顺序一致的生成文本列表。
+
+    on_text: 可选的每行回调列表，每步以新增的文本片段调用（用于流式输出）；
+    cancel_events: 可选的每行 threading.Event 列表，被设置的行在下一步即从批次中移除。
+    record_metrics: 是否记录编码/解码耗时、生成长度与停止原因（预热时关闭）。
+    draft_tokens: 大于0时启用投机解码：批次只剩一行时，每步用 PromptLookupDrafter
+    起草最多这么多个token，与上一个token一起在一次解码器调用中验证，接受与贪心
+    结果一致的最长前缀，再加上模型在第一个不一致位置给出的token。输出与逐步贪心
+    解码相同，被拒绝的草稿在KV缓存中丢弃。
+    """
+    tokenizer = model.tokenizer
+    encoder_session = model.encoder_session
+    decoder_session = model.decoder_session
+    batch_size = pixel_values.shape[0]
+
+    # 编码器推理（整批一次）
+    start = time.perf_counter()
+    encoder_outputs = encoder_session.run(None, {"pixel_values": pixel_values})[0]
+    if record_metrics:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="encoder")
+    logger.debug(f"Encoder output shape: {encoder_outputs.shape}")
+
+    start_ids = np.array([tokenizer.encode("<s>")], dtype=np.int64)
+    runner = create_decoder_runner(
+        decoder_session, encoder_outputs, np.repeat(start_ids, batch_size, axis=0), use_iobinding
+    )
+
+    # 预分配的token id缓冲区与每行已生成的长度
+    token_ids = np.empty((batch_size, max(max_lengths)), dtype=np.int64)
+    lengths = [0] * batch_size
+    detokenizers = [StreamingDetokenizer(model.token_bytes) for _ in range(batch_size)]
+    detectors = [RepetitionDetector(REPETITION_REPEATS) for _ in range(batch_size)]
+    # active[r] 为当前批次第 r 行对应的原始请求下标
+    active = list(range(batch_size))
+    # 每行的停止原因
+    stops = {}
+    # 投机解码：只剩一行时使用的草稿生成器，与本步输入中上一个token之后的草稿
+    drafter = None
+    draft = []
+
+    def emit(index, token_id):
+        """记录一行新生成的token，返回停止原因（继续生成时为 None）"""
+        token_ids[index, lengths[index]] = token_id
+        lengths[index] += 1
+
+        token_text = detokenizers[index].push(token_id)
+        if token_text and on_text and on_text[index] is not None:
+            on_text[index](token_text)
+
+        # 检查重复（增量检测，只处理新追加的字符）
+        if detectors[index].feed(token_text):
+            logger.debug("检测到重复，停止生成")
+            return "repetition"
+
+        # 检查结束
+        if token_id == tokenizer.eos_token_id:
+            logger.debug("生成完成")
+            return "eos"
+
+        if lengths[index] >= max_lengths[index]:
+            return "max_length"
+        return None
+
+    # 生成循环
+    try:
+        while True:
+            start = time.perf_counter()
+            logits = runner.run()
+            if draft:
+                # 第 j 个位置的预测应等于第 j 个草稿token，接受一致的最长前缀与第一个不一致位置的预测
+                predicted = np.argmax(logits[0], axis=-1)
+                accepted = 0
+                while accepted < len(draft) and predicted[accepted] == draft[accepted]:
+                    accepted += 1
+                new_tokens = [[int(token) for token in predicted[: accepted + 1]]]
+                discard = len(draft) - accepted
+                if record_metrics:
+                    DRAFT_TOKENS.inc(accepted, result="accepted")
+                    DRAFT_TOKENS.inc(discard, result="rejected")
+            else:
+                new_tokens = [[int(token)] for token in np.argmax(logits[:, -1, :], axis=-1)]
+                discard = 0
+            if record_metrics:
+                DECODER_STEP_SECONDS.observe(time.perf_counter() - start)
+
+            keep = []
+            for row, index in enumerate(active):
+                # 调用方已取消（如流式请求的客户端断开）
+                if cancel_events and cancel_events[index] is not None and cancel_events[index].is_set():
+                    logger.debug("请求已取消，停止生成")
+                    stops[index] = "cancelled"
+                    continue
+
+                for token_id in new_tokens[row]:
+                    reason = emit(index, token_id)
+                    if reason is not None:
+                        stops[index] = reason
+                        break
+                else:
+                    keep.append(row)
+
+            if not keep:
+                break
+
+            last_tokens = [new_tokens[row][-1] for row in keep]
+            draft = []
+            if draft_tokens > 0 and len(keep) == 1:
+                index = active[keep[0]]
+                if drafter is None:
+                    drafter = PromptLookupDrafter()
+                    drafter.extend(token_ids[index, : lengths[index]].tolist())
+                else:
+                    drafter.extend(new_tokens[keep[0]])
+                # 草稿不超过剩余的生成步数
+                draft = drafter.draft(min(draft_tokens, max_lengths[index] - lengths[index] - 1))
+            next_input_ids = np.array([last_tokens[:1] + draft] if draft else [[token] for token in last_tokens],
+                                      dtype=np.int64)
+
+            # 移除已结束的行，剩余行的KV缓存与编码器输出按批次维度切片
+            if len(keep) < len(active):
+                active = [active[row] for row in keep]
+                runner.advance(next_input_ids, keep, discard)
+            else:
+                runner.advance(next_input_ids, discard=discard)
+    finally:
+        runner.close()
+
+    if draft_tokens > 0:
+        for index in range(batch_size):
+            if stops.get(index) != "cancelled":
+                ngram_table.update(token_ids[index, : lengths[index]].tolist())
+
+    if record_metrics:
+        for index in range(batch_size):
+            GENERATED_TOKENS.observe(lengths[index])
+            GENERATION_STOPS.inc(reason=stops.get(index, "max_length"))
+
+    return [
+        tokenizer.decode(token_ids[index, : lengths[index]].tolist(), skip_special_tokens=True)
+        for index in range(batch_size)
+    ]
+
+
+def generate_items(model, items, use_iobinding=True, draft_tokens=0):
+    """批处理回调的实现：归一化一批 InferenceItem 并批量生成，返回与 items 等长的文本列表
+
+    凑批期间已被取消的请求不再进入解码，结果为空字符串。
+    """
+    results = [""] * len(items)
+    live = [
+        index for index, item in enumerate(items)
+        if item.cancel_event is None or not item.cancel_event.is_set()
+    ]
+    if not live:
+        return results
+
+    live_items = [items[index] for index in live]
+    # 在调度线程中归一化到复用的输入缓冲区
+    start = time.perf_counter()
+    pixel_values = model.preprocessor.normalize_into_buffer([item.canvas for item in live_items])
+    STAGE_SECONDS.observe(time.perf_counter() - start, stage="normalize")
+    texts = generate_batch(
+        model,
+        pixel_values,
+        [item.max_length for item in live_items],
+        use_iobinding,
+        on_text=[item.on_text for item in live_items],
+        cancel_events=[item.cancel_event for item in live_items],
+        draft_tokens=draft_tokens,
+    )
+    for index, text in zip(live, texts):
+        results[index] = text
+    return results
+
+
+def warm_up(model, batch_sizes=(1,), use_iobinding=True, max_length=WARMUP_MAX_LENGTH):
+    """用合成画布在每个批大小上跑一次编码和少量解码步
+
+    确认新会话可用，并让ONNX Runtime提前完成首次运行的初始化与内存池增长，
+    避免首批真实请求承担这部分延迟。从最大的批开始，内存池只需增长一次。
+    """
+    x_img, y_img = model.preprocessor.size
+    # 噪声画布不会让解码器在第一步就输出EOS，解码循环能真正跑起来
+    rng = np.random.default_rng(0)
+    canvas = rng.integers(0, 256, (y_img, x_img, 3), dtype=np.uint8)
+    for batch_size in sorted(set(batch_sizes), reverse=True):
+        pixel_values = model.preprocessor.normalize([canvas] * batch_size)
+        generate_batch(model, pixel_values, [max_length] * batch_size, use_iobinding, record_metrics=False)
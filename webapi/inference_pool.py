@@ -0,0 +1,192 @@
+import asyncio
+import collections
+import functools
+import heapq
+import itertools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """推理队列已满，请求被拒绝"""
+
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class ClientQueueFullError(QueueFullError):
+    """该客户端排队的请求数已达上限（其他客户端仍可排队），由接口层转换为 429"""
+
+    def __init__(self, client, retry_after):
+        Exception.__init__(self, f"Too many queued requests for client {client}")
+        self.client = client
+        self.retry_after = retry_after
+
+
+class InferencePool:
+    """有界推理工作池
+
+    阻塞的推理任务在线程池中执行，事件循环只负责排队与分发。最多 max_workers
+    个任务同时运行，另有最多 max_queue 个任务排队等待；队列满时立即抛出
+    QueueFullError，由接口层转换为 503 + Retry-After。
+    所有计数只在事件循环线程中修改，无需加锁。
+
+    等待队列按客户端加权公平调度（虚拟时间的加权公平队列）：客户端每个排队请求的
+    标签为 max(当前虚拟时间, 该客户端上一个标签) + 1 / weight，空出槽位时交给标签
+    最小的请求。持续大量提交的客户端只会排在自己之前的请求后面，其他客户端的请求
+    按权重穿插执行。单个客户端排队的请求数超过 max_queue_per_client 时抛出
+    ClientQueueFullError。
+    """
+
+    def __init__(self, max_workers=8, max_queue=32, max_queue_per_client=None, max_tracked_clients=1024):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.max_queue_per_client = self.max_queue if max_queue_per_client is None else max(1, int(max_queue_per_client))
+        self.max_tracked_clients = max_tracked_clients
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="inference")
+        self._running = 0
+        # 堆：(标签, 序号, waiter, client)
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        # 客户端上一个排队请求的标签（不大于虚拟时间的会被清理）
+        self._last_tags = {}
+        # 客户端用量：client -> {running, queued, completed, rejected, service_seconds}
+        self._clients = collections.OrderedDict()
+
+        self.started = 0
+        self.completed = 0
+        self.rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_service = 0.0
+
+    @property
+    def queue_depth(self):
+        return len(self._waiting)
+
+    def is_full(self):
+        """所有工作线程都在忙且等待队列已满"""
+        return self._running >= self.max_workers and len(self._waiting) >= self.max_queue
+
+    def retry_after(self):
+        """根据平均处理时间估算排空当前队列所需的秒数"""
+        if not self.completed:
+            return 1
+        avg_service = self._total_service / self.completed
+        backlog = self._running + len(self._waiting)
+        return max(1, math.ceil(avg_service * backlog / self.max_workers))
+
+    def _client(self, client):
+        usage = self._clients.get(client)
+        if usage is None:
+            usage = self._clients[client] = {
+                "running": 0, "queued": 0, "completed": 0, "rejected": 0, "service_seconds": 0.0,
+            }
+            # 只淘汰空闲的客户端
+            for name in list(self._clients):
+                if len(self._clients) <= self.max_tracked_clients:
+                    break
+                idle = self._clients[name]
+                if name != client and not idle["running"] and not idle["queued"]:
+                    del self._clients[name]
+        else:
+            self._clients.move_to_end(client)
+        return usage
+
+    async def run(self, fn, *args, client="", weight=1.0, **kwargs):
+        """在工作线程中执行 fn，必要时排队等待空闲槽位；client / weight 用于公平调度与用量统计"""
+        loop = asyncio.get_running_loop()
+        enqueued = time.monotonic()
+        usage = self._client(client)
+
+        if self._running < self.max_workers:
+            self._running += 1
+        elif len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            usage["rejected"] += 1
+            raise QueueFullError(self.retry_after())
+        elif usage["queued"] >= self.max_queue_per_client:
+            self.rejected += 1
+            usage["rejected"] += 1
+            raise ClientQueueFullError(client, self.retry_after())
+        else:
+            waiter = loop.create_future()
+            tag = max(self._virtual_time, self._last_tags.get(client, 0.0)) + 1.0 / weight
+            self._last_tags[client] = tag
+            heapq.heappush(self._waiting, (tag, next(self._sequence), waiter, client))
+            usage["queued"] += 1
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # 槽位已经移交给本任务，转交给下一个等待者
+                    self._release()
+                else:
+                    self._waiting = [entry for entry in self._waiting if entry[2] is not waiter]
+                    heapq.heapify(self._waiting)
+                    usage["queued"] -= 1
+                raise
+
+        started = time.monotonic()
+        wait = started - enqueued
+        self.started += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        usage["running"] += 1
+        # 槽位在工作线程真正结束时才释放，调用方被取消也不会超额占用线程
+        future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finish, started, client))
+        return await asyncio.wrap_future(future)
+
+    def _finish(self, started, client):
+        service = time.monotonic() - started
+        self.completed += 1
+        self._total_service += service
+        usage = self._client(client)
+        usage["running"] -= 1
+        usage["completed"] += 1
+        usage["service_seconds"] += service
+        self._release()
+
+    def _release(self):
+        """释放一个槽位：优先直接移交给标签最小的等待者"""
+        while self._waiting:
+            tag, _, waiter, client = heapq.heappop(self._waiting)
+            if not waiter.done():
+                self._virtual_time = tag
+                self._clients[client]["queued"] -= 1
+                waiter.set_result(None)
+                self._prune_tags()
+                return
+        self._running -= 1
+
+    def _prune_tags(self):
+        # 不超过虚拟时间的标签对之后的排序没有影响
+        if len(self._last_tags) > len(self._waiting) + 64:
+            self._last_tags = {
+                client: tag for client, tag in self._last_tags.items() if tag > self._virtual_time
+            }
+
+    def client_stats(self):
+        """各客户端的用量快照：运行中、排队中、完成与拒绝的请求数，累计推理耗时"""
+        return {
+            client: {**usage, "service_seconds": round(usage["service_seconds"], 3)}
+            for client, usage in self._clients.items()
+        }
+
+    def stats(self):
+        """队列状态快照"""
+        return {
+            "workers": self.max_workers,
+            "running": self._running,
+            "queue_depth": len(self._waiting),
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "clients": len(self._clients),
+            "avg_wait_ms": round(self._total_wait / self.started * 1000, 3) if self.started else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 3),
+        }
@@ -0,0 +1,682 @@
+import json
+import re
+
+# 模型输出的LaTeX子集到 Typst / Markdown 的进程内转换，输出与 pandoc（texmath）的写法一致；
+# texmath 与LaTeX原意不符的少数命令（\Longrightarrow、vmatrix 等）按LaTeX转换。
+# 遇到不支持的写法时抛出 UnsupportedLatex，由调用方交给 pandoc 处理。
+
+
+class UnsupportedLatex(ValueError):
+    """转换器不支持的LaTeX写法"""
+
+
+# 直接映射为一个 Typst 符号/名称的命令；Typst 0.14 改名（0.15 删除旧名）的符号直接输出对应的字符，
+# 新旧版本都能编译
+SYMBOLS = {
+    # 希腊字母
+    "alpha": "alpha", "beta": "beta", "gamma": "gamma", "delta": "delta", "epsilon": "epsilon.alt",
+    "varepsilon": "epsilon", "zeta": "zeta", "eta": "eta", "theta": "theta", "vartheta": "theta.alt",
+    "iota": "iota", "kappa": "kappa", "lambda": "lambda", "mu": "mu", "nu": "nu", "xi": "xi",
+    "pi": "pi", "varpi": "pi.alt", "rho": "rho", "varrho": "rho.alt", "sigma": "sigma",
+    "varsigma": "sigma.alt", "tau": "tau", "upsilon": "upsilon", "phi": "phi.alt", "varphi": "phi",
+    "chi": "chi", "psi": "psi", "omega": "omega",
+    "Gamma": "Gamma", "Delta": "Delta", "Theta": "Theta", "Lambda": "Lambda", "Xi": "Xi", "Pi": "Pi",
+    "Sigma": "Sigma", "Upsilon": "Upsilon", "Phi": "Phi", "Psi": "Psi", "Omega": "Omega",
+    # 二元运算
+    "pm": "plus.minus", "mp": "minus.plus", "times": "times", "div": "div", "cdot": "dot.op",
+    "ast": "ast", "star": "star", "circ": "compose", "bullet": "bullet", "oplus": "xor",
+    "ominus": "⊖", "otimes": "⊗", "odot": "⊙", "cup": "union",
+    "cap": "∩", "setminus": "without", "wedge": "and", "land": "and", "vee": "or", "lor": "or",
+    # 关系
+    "leq": "lt.eq", "le": "lt.eq", "geq": "gt.eq", "ge": "gt.eq", "neq": "eq.not", "ne": "eq.not",
+    "approx": "approx", "equiv": "equiv", "sim": "tilde.op", "simeq": "tilde.eq", "cong": "tilde.equiv",
+    "propto": "prop", "ll": "lt.double", "gg": "gt.double", "in": "in", "notin": "in.not",
+    "ni": "in.rev", "subset": "subset", "supset": "supset", "subseteq": "subset.eq",
+    "supseteq": "supset.eq", "perp": "perp", "parallel": "parallel", "mid": "divides",
+    "models": "tack.r.double", "vdash": "tack.r", "leqslant": "lt.eq.slant", "geqslant": "gt.eq.slant",
+    # 箭头
+    "to": "arrow.r", "rightarrow": "arrow.r", "leftarrow": "arrow.l", "gets": "arrow.l",
+    "leftrightarrow": "arrow.l.r", "Rightarrow": "arrow.r.double", "Leftarrow": "arrow.l.double",
+    "Leftrightarrow": "arrow.l.r.double", "iff": "arrow.l.r.double.long", "implies": "arrow.r.double.long",
+    "longrightarrow": "arrow.r.long", "longleftarrow": "arrow.l.long", "Longrightarrow": "arrow.r.double.long",
+    "mapsto": "arrow.r.bar", "uparrow": "arrow.t", "downarrow": "arrow.b", "nearrow": "arrow.tr",
+    "searrow": "arrow.br", "rightleftharpoons": "harpoons.rtlb",
+    # 其他符号
+    "infty": "infinity", "partial": "partial", "nabla": "nabla", "forall": "forall", "exists": "exists",
+    "emptyset": "emptyset", "varnothing": "emptyset", "angle": "angle", "triangle": "triangle.stroked.t",
+    "hbar": "ℏ", "ell": "ell", "Re": "Re", "Im": "Im", "aleph": "aleph",
+    "neg": "not", "lnot": "not", "therefore": "therefore", "because": "because", "degree": "degree",
+    "cdots": "dots.h.c", "ldots": "dots.h", "dots": "dots.h", "vdots": "dots.v", "ddots": "dots.down",
+    "langle": "⟨", "rangle": "⟩", "lfloor": "floor.l", "rfloor": "floor.r",
+    "lceil": "ceil.l", "rceil": "ceil.r", "vert": "bar.v", "Vert": "bar.v.double",
+    # 大型运算符
+    "sum": "sum", "prod": "product", "coprod": "product.co", "int": "integral", "iint": "integral.double",
+    "iiint": "integral.triple", "oint": "integral.cont", "bigcup": "union.big", "bigcap": "⋂",
+    "bigoplus": "xor.big", "bigotimes": "⨂",
+}
+
+# Typst 内置的函数名运算符
+FUNCTIONS = {
+    "arccos", "arcsin", "arctan", "arg", "cos", "cosh", "cot", "coth", "csc", "deg", "det", "dim", "exp",
+    "gcd", "hom", "inf", "ker", "lg", "lim", "liminf", "limsup", "ln", "log", "max", "min", "Pr", "sec",
+    "sin", "sinh", "sup", "tan", "tanh",
+}
+
+# 单参数命令：字体与重音
+WRAPPERS = {
+    "mathbf": "bold", "boldsymbol": "bold", "bm": "bold", "mathit": "italic", "mathrm": "upright",
+    "mathbb": "bb", "mathcal": "cal", "mathfrak": "frak", "mathsf": "sans", "mathtt": "mono",
+    "hat": "hat", "widehat": "hat", "bar": "macron", "overline": "overline", "underline": "underline",
+    "vec": "arrow", "overrightarrow": "arrow", "tilde": "tilde", "widetilde": "tilde", "dot": "dot",
+    "ddot": "dot.double", "check": "caron", "breve": "breve", "acute": "acute", "grave": "grave",
+    "overbrace": "overbrace", "underbrace": "underbrace",
+}
+
+# 间距命令
+SPACES = {",": "thin", ":": "med", ">": "med", ";": "thick", " ": "space", "quad": "quad", "qquad": "wide"}
+
+# 无输出的命令
+IGNORED = {
+    "displaystyle", "textstyle", "scriptstyle", "limits", "nolimits", "nonumber", "notag", "!",
+    "big", "Big", "bigg", "Bigg", "bigl", "bigr", "Bigl", "Bigr", "biggl", "biggr", "Biggl", "Biggr",
+}
+
+# 转义字符
+ESCAPED = {"{": "\\{", "}": "\\}", "%": "%", "#": "\\#", "&": "\\&", "_": "\\_", "$": "\\$", "|": "bar.v.double"}
+
+# 需要在 Typst 数学模式中转义的单个字符
+TYPST_CHAR_ESCAPES = {"/": "\\/", "#": "\\#", "$": "\\$", "@": "\\@", '"': '\\"', "\\": "\\\\"}
+
+MATRIX_DELIMITERS = {
+    "matrix": "#none", "pmatrix": '"("', "bmatrix": '"["', "Bmatrix": '"{"', "vmatrix": '"|"', "Vmatrix": '"||"',
+}
+
+# 行与列对齐的环境（公式块）
+ALIGNED_ENVIRONMENTS = {"aligned", "align", "align*", "gathered", "gather", "gather*", "split", "equation", "equation*"}
+
+DELIMITERS = {
+    "(": "(", ")": ")", "[": "[", "]": "]", "|": "|", ".": "", "\\{": "{", "\\}": "}", "\\|": "||",
+    "\\langle": "⟨", "\\rangle": "⟩", "\\lfloor": "floor.l", "\\rfloor": "floor.r",
+    "\\lceil": "ceil.l", "\\rceil": "ceil.r", "\\vert": "|", "\\Vert": "||",
+}
+
+# 另一侧为 \left. / \right. 时单独输出的定界符：不再用 lr() 配对，括号需要转义
+LONE_DELIMITERS = {
+    "(": "\\(", ")": "\\)", "[": "\\[", "]": "\\]", "{": "\\{", "}": "\\}", "|": "\\|", "||": "bar.v.double",
+}
+
+_SIMPLE_SCRIPT = re.compile(r"[A-Za-z]+|\d+")
+
+
+class _Atom:
+    """一个数学原子及其上下标"""
+
+    __slots__ = ("text", "simple", "sub", "sup", "primes")
+
+    def __init__(self, text, simple=False):
+        self.text = text
+        self.simple = simple
+        self.sub = None
+        self.sup = None
+        self.primes = 0
+
+    def render(self):
+        out = self.text + "'" * self.primes
+        if self.sub is not None:
+            out += "_" + self.sub
+        if self.sup is not None:
+            out += "^" + self.sup
+        return out
+
+
+class _MathParser:
+    """LaTeX数学到 Typst 的递归下降转换"""
+
+    def __init__(self, source):
+        self.source = source
+        self.pos = 0
+
+    # 扫描
+
+    def _peek(self):
+        return self.source[self.pos] if self.pos < len(self.source) else ""
+
+    def _skip_spaces(self):
+        while self.pos < len(self.source) and self.source[self.pos].isspace():
+            self.pos += 1
+
+    def _read_command(self):
+        """读取 \\ 之后的命令名（字母序列或单个字符），pos 指向反斜杠"""
+        self.pos += 1
+        start = self.pos
+        while self.pos < len(self.source) and self.source[self.pos].isalpha():
+            self.pos += 1
+        if self.pos == start:
+            if self.pos >= len(self.source):
+                raise UnsupportedLatex("trailing backslash")
+            self.pos += 1
+        return self.source[start:self.pos]
+
+    def _read_braced_raw(self):
+        """读取 {...} 的原始内容（用于 \\text 等）"""
+        self._skip_spaces()
+        if self._peek() != "{":
+            raise UnsupportedLatex("expected {")
+        depth, start = 0, self.pos + 1
+        while self.pos < len(self.source):
+            char = self.source[self.pos]
+            if char == "\\":
+                self.pos += 2
+                continue
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    self.pos += 1
+                    return self.source[start:self.pos - 1]
+            self.pos += 1
+        raise UnsupportedLatex("unbalanced braces")
+
+    def _read_optional(self):
+        """读取可选参数 [...]，没有时返回 None"""
+        self._skip_spaces()
+        if self._peek() != "[":
+            return None
+        end = self.source.find("]", self.pos)
+        if end < 0:
+            raise UnsupportedLatex("unbalanced [")
+        content = self.source[self.pos + 1:end]
+        self.pos = end + 1
+        return _MathParser(content).parse()
+
+    def _at_command(self, name):
+        """pos 处是否为命令 \\name（而不是以它开头的更长的命令，例如 \\rightarrow）"""
+        end = self.pos + len(name) + 1
+        return self.source.startswith("\\" + name, self.pos) and not self.source[end:end + 1].isalpha()
+
+    def _read_environment_name(self):
+        name = self._read_braced_raw().strip()
+        if not re.fullmatch(r"[A-Za-z]+\*?", name):
+            raise UnsupportedLatex(f"bad environment name {name!r}")
+        return name
+
+    # 语法
+
+    def parse(self, rows=False):
+        """转换整个输入；rows 为 True 时允许 \\\\ 分行与 & 对齐"""
+        result = self._parse_sequence(rows=rows)
+        if self.pos < len(self.source):
+            raise UnsupportedLatex(f"unexpected {self.source[self.pos:self.pos + 10]!r}")
+        return result
+
+    def _parse_group(self):
+        """{...} 内的表达式"""
+        self.pos += 1
+        atoms = self._parse_atoms(stop="}")
+        if self._peek() != "}":
+            raise UnsupportedLatex("unbalanced braces")
+        self.pos += 1
+        return atoms
+
+    def _parse_argument(self):
+        """一个命令参数：{...} 或单个记号，返回原子列表"""
+        self._skip_spaces()
+        char = self._peek()
+        if not char:
+            raise UnsupportedLatex("missing argument")
+        if char == "{":
+            return self._parse_group()
+        if char in "}^_&":
+            raise UnsupportedLatex(f"unexpected {char!r} as argument")
+        if char.isdigit():
+            self.pos += 1
+            return [_Atom(char, simple=True)]
+        return self._parse_atom_list()
+
+    def _parse_atom_list(self):
+        """读取单个记号（可能展开为多个原子，例如 \\text）"""
+        atoms = []
+        self._parse_token(atoms, stop=None)
+        return atoms
+
+    def _parse_sequence(self, rows=False, stop=None):
+        """带行（\\\\）与对齐（&）的表达式，返回 Typst 文本"""
+        lines, atoms = [], []
+        while True:
+            atoms.extend(self._parse_atoms(stop=stop, rows=rows))
+            if rows and self.source.startswith("\\\\", self.pos):
+                self.pos += 2
+                self._read_optional_row_spacing()
+                lines.append(_render(atoms))
+                atoms = []
+                continue
+            break
+        lines.append(_render(atoms))
+        while len(lines) > 1 and not lines[-1]:
+            lines.pop()
+        return " \\ ".join(line for line in lines)
+
+    def _read_optional_row_spacing(self):
+        # \\[2pt] 之类的行距不影响内容
+        self._skip_spaces()
+        if self._peek() == "[":
+            end = self.source.find("]", self.pos)
+            if end > 0:
+                self.pos = end + 1
+
+    def _parse_atoms(self, stop=None, rows=False):
+        atoms = []
+        while self.pos < len(self.source):
+            char = self.source[self.pos]
+            if char == stop or (stop is None and char == "}"):
+                break
+            if rows and self.source.startswith("\\\\", self.pos):
+                break
+            if self._at_command("end") or self._at_command("right"):
+                break
+            if char == "&":
+                if not rows:
+                    raise UnsupportedLatex("& outside of an aligned environment")
+                self.pos += 1
+                atoms.append(_Atom("&"))
+                continue
+            self._parse_token(atoms, stop)
+        return atoms
+
+    def _parse_token(self, atoms, stop):
+        char = self.source[self.pos]
+        if char.isspace():
+            self._skip_spaces()
+            return
+        if char in "^_":
+            self._attach(atoms, char)
+            return
+        if char == "'":
+            self.pos += 1
+            if not atoms:
+                raise UnsupportedLatex("prime without base")
+            atoms[-1].primes += 1
+            return
+        if char == "{":
+            group = self._parse_group()
+            if len(group) == 1:
+                atoms.append(group[0])
+            elif group:
+                # 普通花括号分组只影响上下标的作用范围
+                atoms.extend(group)
+            return
+        if char.isdigit():
+            match = re.match(r"\d+(?:\.\d+)?", self.source[self.pos:])
+            self.pos += match.end()
+            atoms.append(_Atom(match.group(), simple=True))
+            return
+        if char.isalpha():
+            self.pos += 1
+            atoms.append(_Atom(char, simple=char.isascii()))
+            return
+        if char == "~":
+            self.pos += 1
+            atoms.append(_Atom("space.nobreak"))
+            return
+        if char == "\\":
+            self._parse_command(atoms)
+            return
+        if char in "}%":
+            raise UnsupportedLatex(f"unexpected {char!r}")
+        self.pos += 1
+        atoms.append(_Atom(TYPST_CHAR_ESCAPES.get(char, char)))
+
+    def _attach(self, atoms, kind):
+        self.pos += 1
+        if not atoms or atoms[-1].text == "&":
+            raise UnsupportedLatex("script without base")
+        base = atoms[-1]
+        script = _script(self._parse_argument())
+        if kind == "_":
+            if base.sub is not None:
+                raise UnsupportedLatex("double subscript")
+            base.sub = script
+        else:
+            if base.sup is not None:
+                raise UnsupportedLatex("double superscript")
+            base.sup = script
+
+    def _parse_command(self, atoms):
+        name = self._read_command()
+        if name in IGNORED:
+            return
+        if name in SPACES:
+            atoms.append(_Atom(SPACES[name]))
+            return
+        if name in ESCAPED:
+            atoms.append(_Atom(ESCAPED[name]))
+            return
+        if name in SYMBOLS:
+            atoms.append(_Atom(SYMBOLS[name], simple="." not in SYMBOLS[name]))
+            return
+        if name in FUNCTIONS:
+            atoms.append(_Atom(name, simple=True))
+            return
+        if name in WRAPPERS:
+            wrapped = f"{WRAPPERS[name]}({_arguments(self._parse_argument())})"
+            # \mathbf 是直立的粗体，Typst 的 bold() 对单个字母保持斜体
+            atoms.append(_Atom(f"upright({wrapped})" if name == "mathbf" else wrapped))
+            return
+        if name == "prime":
+            if atoms and atoms[-1].text != "&" and atoms[-1].sub is None and atoms[-1].sup is None:
+                atoms[-1].primes += 1
+            else:
+                atoms.append(_Atom("prime"))
+            return
+        if name in ("frac", "dfrac", "tfrac", "cfrac", "binom", "dbinom", "tbinom"):
+            numerator = _arguments(self._parse_argument())
+            denominator = _arguments(self._parse_argument())
+            function = "binom" if name.endswith("binom") else "frac"
+            atoms.append(_Atom(f"{function}({numerator}, {denominator})"))
+            return
+        if name == "sqrt":
+            index = self._read_optional()
+            body = _arguments(self._parse_argument())
+            atoms.append(_Atom(f"root({index}, {body})" if index else f"sqrt({body})"))
+            return
+        if name in ("text", "textrm", "mbox", "textnormal", "textbf", "textit"):
+            text = self._read_braced_raw()
+            if "\\" in text or "$" in text:
+                raise UnsupportedLatex("commands inside \\text")
+            quoted = _quote(text)
+            wrapper = {"textbf": "bold", "textit": "italic"}.get(name)
+            atoms.append(_Atom(f"{wrapper}({quoted})" if wrapper else quoted))
+            return
+        if name == "operatorname":
+            limits = self._peek() == "*"
+            if limits:
+                self.pos += 1
+            text = self._read_braced_raw().strip()
+            if not re.fullmatch(r"[A-Za-z]+", text):
+                raise UnsupportedLatex("complex \\operatorname")
+            atoms.append(_Atom(f'op("{text}", limits: #true)' if limits else f'op("{text}")'))
+            return
+        if name == "not":
+            self._skip_spaces()
+            if self._peek() == "=":
+                self.pos += 1
+                atoms.append(_Atom("eq.not"))
+                return
+            if self.source.startswith("\\in", self.pos) and not self.source[self.pos + 3:self.pos + 4].isalpha():
+                self.pos += 3
+                atoms.append(_Atom("in.not"))
+                return
+            raise UnsupportedLatex("\\not")
+        if name == "left":
+            atoms.append(_Atom(self._parse_left_right()))
+            return
+        if name == "begin":
+            atoms.append(_Atom(self._parse_environment()))
+            return
+        raise UnsupportedLatex(f"\\{name}")
+
+    def _read_delimiter(self):
+        self._skip_spaces()
+        if self._peek() == "\\":
+            start = self.pos
+            self._read_command()
+            token = self.source[start:self.pos]
+        else:
+            token = self._peek()
+            self.pos += 1
+        if token not in DELIMITERS:
+            raise UnsupportedLatex(f"delimiter {token!r}")
+        return DELIMITERS[token]
+
+    def _parse_left_right(self):
+        opening = self._read_delimiter()
+        body = _render(self._parse_atoms(stop=None))
+        if not self._at_command("right"):
+            raise UnsupportedLatex("\\left without \\right")
+        self.pos += len("\\right")
+        closing = self._read_delimiter()
+        if opening and closing:
+            return f"lr({opening} {body} {closing})"
+        # \left. / \right.：lr() 中不成对的括号无法编译，只输出有的一侧（与 pandoc 相同）
+        parts = [LONE_DELIMITERS.get(opening, opening), body, LONE_DELIMITERS.get(closing, closing)]
+        return " ".join(part for part in parts if part)
+
+    def _parse_environment(self):
+        name = self._read_environment_name()
+        if name in MATRIX_DELIMITERS or name == "cases":
+            rows = self._parse_cells()
+            self._expect_end(name)
+            if name == "cases":
+                return "cases(" + ", ".join(" & ".join(cells) for cells in rows) + ")"
+            body = "; ".join(", ".join(cells) for cells in rows)
+            return f"mat(delim: {MATRIX_DELIMITERS[name]}, {body})"
+        if name in ALIGNED_ENVIRONMENTS:
+            body = self._parse_sequence(rows=True)
+            self._expect_end(name)
+            return body
+        raise UnsupportedLatex(f"environment {name}")
+
+    def _parse_cells(self):
+        """矩阵/cases 的单元格：[[cell, ...], ...]，单元格内容按函数参数转义"""
+        rows, cells = [], []
+        while True:
+            atoms = []
+            while self.pos < len(self.source):
+                char = self.source[self.pos]
+                if char == "&" or self.source.startswith("\\\\", self.pos) or self._at_command("end"):
+                    break
+                if char == "}":
+                    raise UnsupportedLatex("unexpected }")
+                self._parse_token(atoms, stop=None)
+            cells.append(_arguments(atoms))
+            if self.source.startswith("&", self.pos):
+                self.pos += 1
+                continue
+            if self.source.startswith("\\\\", self.pos):
+                self.pos += 2
+                self._read_optional_row_spacing()
+                rows.append(cells)
+                cells = []
+                continue
+            break
+        if any(cells):
+            rows.append(cells)
+        if not rows:
+            raise UnsupportedLatex("empty environment")
+        return rows
+
+    def _expect_end(self, name):
+        self._skip_spaces()
+        if not self._at_command("end"):
+            raise UnsupportedLatex(f"missing \\end{{{name}}}")
+        self.pos += len("\\end")
+        if self._read_environment_name() != name:
+            raise UnsupportedLatex(f"mismatched \\end for {name}")
+
+
+def _render(atoms):
+    return " ".join(atom.render() for atom in atoms)
+
+
+def _arguments(atoms):
+    """渲染为函数参数：顶层的逗号与分号需要转义"""
+    parts = []
+    for atom in atoms:
+        rendered = atom.render()
+        if rendered in (",", ";"):
+            rendered = "\\" + rendered
+        parts.append(rendered)
+    return " ".join(parts)
+
+
+def _script(atoms):
+    """上下标内容：单个简单原子不加括号，否则用括号分组"""
+    if len(atoms) == 1 and atoms[0].sub is None and atoms[0].sup is None and not atoms[0].primes:
+        text = atoms[0].text
+        if _SIMPLE_SCRIPT.fullmatch(text) or atoms[0].simple:
+            return text
+    return "(" + _render(atoms) + ")"
+
+
+def _quote(text):
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def latex_math_to_typst(math):
+    """转换一段数学模式的LaTeX（不含定界符）"""
+    return _MathParser(math).parse(rows=True)
+
+
+# 文档级：文字与公式混排
+
+# 公式定界符与公式环境
+_MATH_PATTERN = re.compile(
+    r"\\\((?P<inline>.*?)\\\)"
+    r"|\$\$(?P<display_dollars>.*?)\$\$"
+    r"|\\\[(?P<display>.*?)\\\]"
+    r"|\$(?P<inline_dollars>[^$]*?)\$"
+    r"|\\begin\{(?P<env>align\*?|equation\*?|gather\*?)\}(?P<env_body>.*?)\\end\{(?P=env)\}",
+    re.S,
+)
+
+# 文字部分允许的转义
+_TEXT_ESCAPES = {"\\%": "%", "\\&": "&", "\\#": "#", "\\_": "_", "\\$": "$", "\\{": "{", "\\}": "}"}
+
+
+def _split_document(text):
+    """拆分为 [(kind, content)]：kind 为 text、inline 或 display；display 的环境转为 aligned 内容"""
+    parts, position = [], 0
+    for match in _MATH_PATTERN.finditer(text):
+        if match.start() > position:
+            parts.append(("text", text[position:match.start()]))
+        if match.group("inline") is not None:
+            parts.append(("inline", match.group("inline")))
+        elif match.group("inline_dollars") is not None:
+            parts.append(("inline", match.group("inline_dollars")))
+        elif match.group("env") is not None:
+            parts.append(("environment", match.group("env_body")))
+        else:
+            body = match.group("display") if match.group("display") is not None else match.group("display_dollars")
+            parts.append(("display", body))
+        position = match.end()
+    if position < len(text):
+        parts.append(("text", text[position:]))
+    return parts
+
+
+def _plain_text(text):
+    """文字部分：只支持纯文本与少量转义，其余（命令、花括号、注释等）交给 pandoc"""
+    unescaped = re.sub(r"\\[%&#_${}]", "", text)
+    if re.search(r"[\\{}%~^$]|--|``|''", unescaped):
+        raise UnsupportedLatex("LaTeX markup in text")
+    return re.sub(r"\\([%&#_${}])", lambda match: _TEXT_ESCAPES[match.group()], text)
+
+
+def _paragraphs(parts, render_text, render_math):
+    """按LaTeX规则合并空白：段内换行视为空格，空行分段"""
+    output = []
+    for kind, content in parts:
+        if kind == "text":
+            output.append(render_text(_plain_text(content)))
+        else:
+            output.append(render_math(kind, content))
+    document = "".join(output)
+    paragraphs = [re.sub(r"\s+", " ", paragraph).strip() for paragraph in re.split(r"\n\s*\n", document)]
+    return "\n\n".join(paragraph for paragraph in paragraphs if paragraph) + "\n"
+
+
+_TYPST_TEXT_ESCAPE = re.compile(r"([\\#*_$@<>`\[\]])")
+_MARKDOWN_TEXT_ESCAPE = re.compile(r"([\\*_`\[\]<>#|$])")
+
+
+def latex_to_typst(text):
+    """公式与纯文字混排的LaTeX转为 Typst：行内公式 $x$，独立公式 $ x $"""
+
+    def render_math(kind, content):
+        body = latex_math_to_typst(content).strip()
+        if kind == "inline":
+            return f"${body}$"
+        return f" $ {body} $ "
+
+    return _paragraphs(_split_document(text), lambda plain: _TYPST_TEXT_ESCAPE.sub(r"\\\1", plain), render_math)
+
+
+def latex_to_markdown(text):
+    """转为 pandoc Markdown：公式保持TeX，行内 $x$，独立公式 $$x$$（align 等环境转为 aligned）"""
+
+    def render_math(kind, content):
+        # 确认公式在支持的子集内，与 Typst 的行为保持一致
+        latex_math_to_typst(content)
+        body = content.strip()
+        if kind == "inline":
+            return f"${body}$"
+        if kind == "environment":
+            return f" $$\\begin{{aligned}}\n{body}\n\\end{{aligned}}$$ "
+        return f" $${body}$$ "
+
+    return _paragraphs(
+        _split_document(text), lambda plain: _MARKDOWN_TEXT_ESCAPE.sub(r"\\\1", plain), render_math
+    )
+
+
+CONVERTERS = {"typst": latex_to_typst, "markdown": latex_to_markdown}
+
+
+def convert_latex(text, to):
+    """用内置转换器转换；格式或写法不受支持时抛出 UnsupportedLatex"""
+    converter = CONVERTERS.get(to)
+    if converter is None:
+        raise UnsupportedLatex(f"format {to}")
+    return converter(text)
+
+
+def supported_command(name):
+    return (
+        name in SYMBOLS or name in FUNCTIONS or name in WRAPPERS or name in SPACES or name in IGNORED
+        or name in ("frac", "dfrac", "tfrac", "cfrac", "binom", "dbinom", "tbinom", "sqrt", "text", "textrm",
+                    "mbox", "textnormal", "textbf", "textit", "operatorname", "not", "left", "right", "prime",
+                    "begin", "end")
+        or name in ESCAPED
+    )
+
+
+def vocab_commands(vocab_path):
+    """分词器 vocab.json 中作为完整token出现的LaTeX命令名（即模型能输出的命令）"""
+    with open(vocab_path, encoding="utf-8") as f:
+        vocab = json.load(f)
+    commands = set()
+    for token in vocab:
+        # 字节级BPE用 Ġ 表示前导空格
+        match = re.fullmatch(r"\\([A-Za-z]+)", token.lstrip("Ġ"))
+        if match:
+            commands.add(match.group(1))
+    return commands
+
+
+def convert_align_to_equations(text):
+    """转换align环境为单行公式"""
+    text = re.sub(r"\\begin\{align\*\}|\\end\{align\*\}", "", text).replace("&", "")
+    equations = text.strip().split("\\\\")
+    converted = []
+    for eq in equations:
+        eq = eq.strip().replace("\\[", "").replace("\\]", "").replace("\n", "")
+        if eq:
+            converted.append(f"$$ {eq} $$")
+    return "\n".join(converted)
+
+
+def format_latex(generated_text, use_dollars=False, convert_align=False):
+    """模型生成的原始文本到接口返回的LaTeX：\\[ \\] 改为 align* 环境并转义 %，可选转换为单行公式与 $ 定界符"""
+    result = (
+        generated_text.replace("\\[", "\\begin{align*}")
+        .replace("\\]", "\\end{align*}")
+        .replace("%", "\\%")
+    )
+
+    if convert_align:
+        result = convert_align_to_equations(result)
+
+    if use_dollars:
+        result = result.replace("\\(", "$").replace("\\)", "$")
+    return result
@@ -0,0 +1,183 @@
+import bisect
+import threading
+
+# 延迟直方图的默认桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 单步解码的桶（秒）
+STEP_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# 每张图片生成token数的桶
+TOKEN_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """指标基类：按标签值保存各序列的状态，snapshot() 返回可pickle的副本（用于跨进程汇总）"""
+
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._series)
+
+    def _render_series(self, lines, label_pairs, value):
+        lines.append(f"{self.name}{_format_labels(label_pairs)} {_format_value(value)}")
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def _render_series(self, lines, label_pairs, value):
+        counts, total, count = value
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            labels = _format_labels(label_pairs + [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(label_pairs)} {_format_value(float(total))}")
+        lines.append(f"{self.name}_count{_format_labels(label_pairs)} {count}")
+
+
+class Registry:
+    """一组指标，按Prometheus文本格式输出"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        """所有指标的当前值 {名称: {标签值: 状态}}"""
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def render(self, extra_snapshots=()):
+        """输出文本格式；extra_snapshots 为 (附加标签dict, snapshot()) 列表，
+        例如各工作进程发来的快照，与本进程的序列一起输出在同一指标下"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            sources = [({}, metric.snapshot())]
+            sources += [(labels, snapshot.get(metric.name, {})) for labels, snapshot in extra_snapshots]
+            for extra_labels, series in sources:
+                for key, value in sorted(series.items()):
+                    label_pairs = list(zip(metric.labelnames, key)) + list(extra_labels.items())
+                    metric._render_series(lines, label_pairs, value)
+        return "\n".join(lines) + "\n"
+
+
+# 本进程的指标；process 模式下推理相关的指标在工作进程中记录，定期发给前端汇总
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "mixtex_stage_seconds",
+    "Time spent per pipeline stage: decode, preprocess, postprocess and pandoc per image; "
+    "normalize and encoder per batch",
+    ["stage"],
+)
+DECODER_STEP_SECONDS = REGISTRY.histogram(
+    "mixtex_decoder_step_seconds",
+    "Decoder time per step (one decoder call over the whole batch; with speculative decoding "
+    "a step can yield several tokens per row)",
+    buckets=STEP_BUCKETS,
+)
+GENERATED_TOKENS = REGISTRY.histogram(
+    "mixtex_generated_tokens", "Tokens generated per image", buckets=TOKEN_BUCKETS
+)
+GENERATION_STOPS = REGISTRY.counter(
+    "mixtex_generation_stops_total",
+    "Why generation of an image stopped: eos, repetition, max_length or cancelled",
+    ["reason"],
+)
+FORMAT_CONVERSIONS = REGISTRY.counter(
+    "mixtex_format_conversions_total",
+    "Format conversions by backend: native (in-process converter) or pandoc (fallback)",
+    ["backend"],
+)
+DRAFT_TOKENS = REGISTRY.counter(
+    "mixtex_draft_tokens_total",
+    "Speculative decoding draft tokens by verification result: accepted or rejected",
+    ["result"],
+)
@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import os
+import time
+from collections import namedtuple
+
+from detokenize import build_token_bytes
+from fast_tokenizer import FastTokenizer
+from ort_config import DEFAULT_SETTINGS, create_session
+from preprocess import ImagePreprocessor
+from quantize import ensure_quantized, quantized_path
+from shared_weights import SHARED_SESSION_SETTINGS, ensure_shared_model
+
+logger = logging.getLogger(__name__)
+
+ENCODER_FILE = "encoder_model.onnx"
+DECODER_FILE = "decoder_model_merged.onnx"
+
+# 模型变体：fp32 为原始模型；int8 只量化解码器（主要开销）；int8-full 同时量化编码器
+MODEL_VARIANTS = {
+    "fp32": (False, False),
+    "int8": (False, True),
+    "int8-full": (True, True),
+}
+
+MixTexModel = namedtuple(
+    "MixTexModel",
+    ["tokenizer", "preprocessor", "encoder_session", "decoder_session", "version", "token_bytes"],
+)
+
+
+def variant_files(path, variant="fp32"):
+    """返回变体使用的 (编码器, 解码器) 文件路径"""
+    if variant not in MODEL_VARIANTS:
+        raise ValueError(f"Unknown model variant: {variant} (expected one of {', '.join(MODEL_VARIANTS)})")
+    quantize_encoder, quantize_decoder = MODEL_VARIANTS[variant]
+    encoder = os.path.join(path, ENCODER_FILE)
+    decoder = os.path.join(path, DECODER_FILE)
+    return (
+        quantized_path(encoder) if quantize_encoder else encoder,
+        quantized_path(decoder) if quantize_decoder else decoder,
+    )
+
+
+def compute_model_version(path, files=None):
+    """根据模型文件的名称、大小和修改时间计算版本标识"""
+    files = files or [os.path.join(path, ENCODER_FILE), os.path.join(path, DECODER_FILE)]
+    digest = hashlib.sha256()
+    for file in list(files) + [os.path.join(path, "tokenizer.json")]:
+        stat = os.stat(file)
+        digest.update(f"{os.path.basename(file)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:12]
+
+
+def load_tokenizer(path, backend="fast"):
+    """加载分词器：fast 使用 tokenizers，transformers 使用 RobertaTokenizer"""
+    if backend == "transformers":
+        from transformers import RobertaTokenizer
+
+        return RobertaTokenizer.from_pretrained(path)
+    return FastTokenizer.from_pretrained(path)
+
+
+def build_model(path, variant="fp32", tokenizer_backend="fast", ort_settings=None, ort_cache_dir=None,
+                timings=None, load_sessions=True, shared_weights=False):
+    """从模型目录构建 MixTexModel
+
+    量化变体的文件不存在时先由 FP32 模型生成。timings 不为 None 时写入各阶段耗时（秒）。
+    shared_weights 为 True 时从按页对齐的外部数据文件加载权重（见 shared_weights.py），
+    多个进程共享同一份内存；load_sessions 为 False 时只准备文件、不创建会话
+    （多进程模式下的前端进程只需要预处理器与版本号），encoder/decoder_session 为 None。
+    """
+    if ort_settings is None:
+        ort_settings = {"encoder": DEFAULT_SETTINGS, "decoder": DEFAULT_SETTINGS}
+    if timings is None:
+        timings = {}
+
+    start = time.perf_counter()
+    tokenizer = load_tokenizer(path, tokenizer_backend)
+    preprocessor = ImagePreprocessor.from_pretrained(path)
+    timings["tokenizer"] = time.perf_counter() - start
+
+    encoder_file, decoder_file = variant_files(path, variant)
+    if variant != "fp32":
+        start = time.perf_counter()
+        ensure_quantized(path, encoder_file, decoder_file)
+        timings["quantize"] = time.perf_counter() - start
+
+    version = compute_model_version(path, [encoder_file, decoder_file])
+    encoder_settings, decoder_settings = ort_settings["encoder"], ort_settings["decoder"]
+    if shared_weights:
+        start = time.perf_counter()
+        encoder_file = ensure_shared_model(encoder_file)
+        decoder_file = ensure_shared_model(decoder_file)
+        timings["shared weights"] = time.perf_counter() - start
+        encoder_settings = {**encoder_settings, **SHARED_SESSION_SETTINGS}
+        decoder_settings = {**decoder_settings, **SHARED_SESSION_SETTINGS}
+
+    encoder_session = decoder_session = None
+    if load_sessions:
+        start = time.perf_counter()
+        encoder_session = create_session(encoder_file, encoder_settings, ort_cache_dir)
+        timings["encoder session"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decoder_session = create_session(decoder_file, decoder_settings, ort_cache_dir)
+        timings["decoder session"] = time.perf_counter() - start
+
+    token_bytes = build_token_bytes(tokenizer.get_vocab(), tokenizer.all_special_ids)
+    return MixTexModel(tokenizer, preprocessor, encoder_session, decoder_session, version, token_bytes)
@@ -0,0 +1,66 @@
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 模型根目录下的版本目录与当前版本指针
+VERSIONS_DIR = "versions"
+CURRENT_FILE = "CURRENT"
+
+
+def resolve_model_dir(root):
+    """返回模型根目录当前使用的模型目录
+
+    根目录下有 CURRENT 文件时，其内容为相对根目录的版本目录（如 versions/20250101-120000）；
+    否则为旧的平铺布局，模型文件直接位于根目录。
+    """
+    root = Path(root)
+    pointer = root / CURRENT_FILE
+    try:
+        name = pointer.read_text(encoding="utf-8").strip()
+    except OSError:
+        return str(root)
+    if name and (root / name).is_dir():
+        return str(root / name)
+    logger.warning(f"{pointer} points to missing directory {name!r}, using {root}")
+    return str(root)
+
+
+def new_version_dir(root):
+    """为新下载的模型分配一个版本目录路径（不创建）"""
+    versions = Path(root) / VERSIONS_DIR
+    name = time.strftime("%Y%m%d-%H%M%S")
+    candidate = versions / name
+    suffix = 1
+    while candidate.exists() or candidate.with_name(candidate.name + ".staging").exists():
+        candidate = versions / f"{name}-{suffix}"
+        suffix += 1
+    return candidate
+
+
+def activate_version(root, version_dir):
+    """原子地把 CURRENT 指向 version_dir"""
+    root = Path(root)
+    relative = Path(version_dir).resolve().relative_to(root.resolve()).as_posix()
+    tmp_path = root / f"{CURRENT_FILE}.{os.getpid()}.tmp"
+    tmp_path.write_text(relative + "\n", encoding="utf-8")
+    os.replace(tmp_path, root / CURRENT_FILE)
+    logger.info(f"Activated model version {relative}")
+
+
+def prune_versions(root, keep):
+    """删除 keep 之外的旧版本目录与未完成的暂存目录"""
+    versions = Path(root) / VERSIONS_DIR
+    keep = {Path(path).resolve() for path in keep if path}
+    if not versions.is_dir():
+        return
+    for path in versions.iterdir():
+        if path.is_dir() and path.resolve() not in keep:
+            try:
+                shutil.rmtree(path)
+                logger.info(f"Removed old model version {path.name}")
+            except OSError as e:
+                logger.warning(f"Could not remove old model version {path}: {e}")
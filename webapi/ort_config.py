@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import os
+import platform
+from pathlib import Path
+
+import onnxruntime as ort
+
+logger = logging.getLogger(__name__)
+
+# 默认值即ORT自身的默认行为：bench_ort_sweep.py 的扫描中没有更快的组合（差异在测量噪声以内，
+# parallel 执行模式慢一个数量级）；其他主机可用它生成自己的配置文件
+DEFAULT_SETTINGS = {
+    "intra_op_num_threads": 0,  # 0 表示由ORT决定（物理核数）
+    "inter_op_num_threads": 0,
+    "graph_optimization_level": "all",  # disable / basic / extended / all
+    "execution_mode": "sequential",  # sequential / parallel
+    "enable_cpu_mem_arena": True,
+    "enable_mem_pattern": True,
+    "optimized_model_cache": True,  # 把优化后的图保存为ORT格式，下次启动直接加载
+    "disable_prepacking": False,  # 多进程共享权重时需禁用预打包
+}
+
+# 环境变量 -> 配置项，环境变量优先于配置文件
+ENV_SETTINGS = {
+    "MIXTEX_ORT_INTRA_OP_THREADS": "intra_op_num_threads",
+    "MIXTEX_ORT_INTER_OP_THREADS": "inter_op_num_threads",
+    "MIXTEX_ORT_OPT_LEVEL": "graph_optimization_level",
+    "MIXTEX_ORT_EXECUTION_MODE": "execution_mode",
+    "MIXTEX_ORT_CPU_MEM_ARENA": "enable_cpu_mem_arena",
+    "MIXTEX_ORT_MEM_PATTERN": "enable_mem_pattern",
+    "MIXTEX_ORT_CACHE": "optimized_model_cache",
+}
+
+SESSION_NAMES = ("encoder", "decoder")
+
+OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def _coerce(key, value):
+    """把环境变量或JSON中的值转换为配置项的类型并校验"""
+    default = DEFAULT_SETTINGS[key]
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            return value.strip().lower() not in ("0", "false", "no", "off", "")
+        return bool(value)
+    if isinstance(default, int):
+        return int(value)
+    value = str(value).lower()
+    choices = OPTIMIZATION_LEVELS if key == "graph_optimization_level" else EXECUTION_MODES
+    if value not in choices:
+        raise ValueError(f"Invalid {key}: {value} (expected one of {', '.join(choices)})")
+    return value
+
+
+def load_ort_settings(config_path=None, environ=os.environ):
+    """读取会话配置：默认值 < 配置文件 < 环境变量
+
+    配置文件为JSON，顶层是两个会话共用的配置项，可用 "encoder" / "decoder"
+    子对象为单个会话覆盖。返回 {"encoder": {...}, "decoder": {...}}。
+    """
+    common = dict(DEFAULT_SETTINGS)
+    overrides = {name: {} for name in SESSION_NAMES}
+
+    if config_path:
+        with open(config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        for key, value in config.items():
+            if key in SESSION_NAMES:
+                overrides[key] = {k: _coerce(k, v) for k, v in value.items() if k in DEFAULT_SETTINGS}
+            elif key in DEFAULT_SETTINGS:
+                common[key] = _coerce(key, value)
+            else:
+                logger.warning(f"Unknown ORT setting in {config_path}: {key}")
+
+    env = {key: _coerce(key, environ[name]) for name, key in ENV_SETTINGS.items() if environ.get(name, "") != ""}
+    return {name: {**common, **overrides[name], **env} for name in SESSION_NAMES}
+
+
+def session_options(settings):
+    """由配置项构造 SessionOptions"""
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = settings["intra_op_num_threads"]
+    options.inter_op_num_threads = settings["inter_op_num_threads"]
+    options.graph_optimization_level = OPTIMIZATION_LEVELS[settings["graph_optimization_level"]]
+    options.execution_mode = EXECUTION_MODES[settings["execution_mode"]]
+    options.enable_cpu_mem_arena = settings["enable_cpu_mem_arena"]
+    options.enable_mem_pattern = settings["enable_mem_pattern"]
+    if settings.get("disable_prepacking"):
+        options.add_session_config_entry("session.disable_prepacking", "1")
+    return options
+
+
+def optimized_model_path(model_path, settings, cache_dir):
+    """优化后模型的缓存路径
+
+    文件名包含原模型的大小与修改时间、ORT版本、CPU架构和优化级别，
+    任何一项变化都会生成新的缓存文件，而不会误用旧的优化结果。
+    """
+    model_path = Path(model_path)
+    stat = model_path.stat()
+    digest = hashlib.sha256(
+        f"{model_path.name}:{stat.st_size}:{stat.st_mtime_ns}:{ort.__version__}:"
+        f"{platform.machine()}:{settings['graph_optimization_level']}".encode()
+    ).hexdigest()[:12]
+    return Path(cache_dir) / f"{model_path.stem}.{digest}.ort"
+
+
+def create_session(model_path, settings, cache_dir=None, providers=("CPUExecutionProvider",)):
+    """按配置创建 InferenceSession，并使用/生成优化后模型的缓存"""
+    options = session_options(settings)
+    providers = list(providers)
+
+    if not settings["optimized_model_cache"] or settings["graph_optimization_level"] == "disable":
+        return ort.InferenceSession(str(model_path), sess_options=options, providers=providers)
+
+    cache_dir = Path(cache_dir) if cache_dir else Path(model_path).parent / ".ort_cache"
+    cached_path = optimized_model_path(model_path, settings, cache_dir)
+    if cached_path.exists():
+        try:
+            session = ort.InferenceSession(str(cached_path), sess_options=options, providers=providers)
+            logger.info(f"Loaded optimized model from cache: {cached_path}")
+            return session
+        except Exception as e:
+            logger.warning(f"Optimized model cache {cached_path} unusable, rebuilding: {e}")
+            try:
+                cached_path.unlink()
+            except OSError:
+                pass
+
+    tmp_path = cached_path.with_suffix(f".{os.getpid()}.ort")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        options.optimized_model_filepath = str(tmp_path)
+        options.add_session_config_entry("session.save_model_format", "ORT")
+        session = ort.InferenceSession(str(model_path), sess_options=options, providers=providers)
+        os.replace(tmp_path, cached_path)
+        logger.info(f"Saved optimized model to cache: {cached_path}")
+        # 删除同一模型的旧缓存（模型文件、ORT版本或优化级别已变化）
+        for stale in cache_dir.glob(f"{Path(model_path).stem}.*.ort"):
+            if stale != cached_path and stale.name.count(".") == 2:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+        return session
+    except Exception as e:
+        logger.warning(f"Could not cache optimized model for {model_path}: {e}")
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        return ort.InferenceSession(str(model_path), sess_options=session_options(settings), providers=providers)
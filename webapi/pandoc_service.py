@@ -0,0 +1,260 @@
+import json
+import logging
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 等待 pandoc server 启动的最长时间（秒）
+STARTUP_TIMEOUT = 10
+
+# 单次转换的超时（秒），同时作为 pandoc server 的 --timeout
+CONVERT_TIMEOUT = 10
+
+# pypandoc 接受而 pandoc 本身（包括 pandoc server）不接受的格式别名
+FORMAT_ALIASES = {"tex": "latex"}
+
+
+class PandocError(RuntimeError):
+    """pandoc 转换失败"""
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class PandocService:
+    """LaTeX 片段格式转换，避免每次调用都启动一个 pandoc 进程
+
+    优先使用常驻的 pandoc server（server_url 指定的外部服务，或首次使用时由
+    pandoc_path 启动的 `pandoc server` 子进程，异常退出后自动重启）；pandoc 不支持
+    server 模式时退回到 pypandoc 逐次调用。(format, to, text) 的结果缓存在
+    cache_size 条的LRU中。方法均为阻塞调用，应在线程池中执行。
+    """
+
+    def __init__(self, pandoc_path="pandoc", server_url=None, cache_size=1024, workers=4, timeout=CONVERT_TIMEOUT):
+        self.pandoc_path = pandoc_path
+        self.server_url = server_url.rstrip("/") if server_url else None
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.mode = None
+        self._base_url = self.server_url
+        self._process = None
+        self._start_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="pandoc")
+        self.hits = 0
+        self.misses = 0
+        self.restarts = 0
+
+    def convert(self, text, to, format="latex"):
+        """转换单个片段，失败时抛出 PandocError"""
+        result = self.convert_batch([text], to, format)[0]
+        if isinstance(result, PandocError):
+            raise result
+        return result
+
+    def convert_batch(self, texts, to, format="latex"):
+        """批量转换，返回与 texts 等长的列表；转换失败的片段对应一个 PandocError 实例"""
+        format = FORMAT_ALIASES.get(format, format)
+        results = [None] * len(texts)
+        missing = {}
+        with self._cache_lock:
+            for index, text in enumerate(texts):
+                key = (format, to, text)
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    results[index] = self._cache[key]
+                    self.hits += 1
+                else:
+                    missing.setdefault(text, []).append(index)
+                    self.misses += 1
+        if not missing:
+            return results
+
+        unique = list(missing)
+        converted = self._convert_uncached(unique, to, format)
+        with self._cache_lock:
+            for text, output in zip(unique, converted):
+                for index in missing[text]:
+                    results[index] = output
+                if not isinstance(output, PandocError) and self.cache_size > 0:
+                    self._cache[(format, to, text)] = output
+                    self._cache.move_to_end((format, to, text))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+    def stats(self):
+        with self._cache_lock:
+            lookups = self.hits + self.misses
+            return {
+                "mode": self.mode,
+                "server_url": self._base_url,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._cache),
+                "restarts": self.restarts,
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        with self._start_lock:
+            self._stop_server()
+
+    # 转换后端
+
+    def _convert_uncached(self, texts, to, format):
+        self._ensure_started()
+        if self.mode == "server":
+            process = self._process
+            try:
+                return self._convert_server(texts, to, format)
+            except OSError as e:
+                if self.server_url or not self._server_down(e, process):
+                    # 超时等只影响本次请求的错误不重启共享的 server，避免中断其他请求正在进行的转换
+                    return [PandocError(f"pandoc server request failed: {e}")] * len(texts)
+                # 自己启动的 server 已退出或拒绝连接：重启（并发失败的请求只重启一次）后重试
+                logger.warning(f"pandoc server unavailable ({e}), restarting it")
+                with self._start_lock:
+                    if self._process is process:
+                        self._stop_server()
+                        self.restarts += 1
+                        if not self._start_server():
+                            self.mode = "subprocess"
+            if self.mode == "server":
+                try:
+                    return self._convert_server(texts, to, format)
+                except OSError as e:
+                    return [PandocError(f"pandoc server request failed: {e}")] * len(texts)
+        return list(self._executor.map(lambda text: self._convert_subprocess(text, to, format), texts))
+
+    @staticmethod
+    def _server_down(error, process):
+        """请求失败是否因为 server 不可用：进程已退出，或连接被拒绝/重置"""
+        if process is not None and process.poll() is not None:
+            return True
+        reason = error.reason if isinstance(error, urllib.error.URLError) else error
+        return isinstance(reason, ConnectionError)
+
+    def _post(self, path, payload):
+        request = urllib.request.Request(
+            self._base_url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout + 5) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    @staticmethod
+    def _output(result):
+        if isinstance(result, str):
+            return result
+        if result.get("base64"):
+            return PandocError("binary output formats are not supported")
+        return result["output"]
+
+    def _convert_one_server(self, text, to, format):
+        try:
+            return self._output(self._post("/", {"text": text, "from": format, "to": to}))
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", "replace").strip()
+            return PandocError(detail or f"pandoc server returned HTTP {e.code}")
+
+    def _convert_server(self, texts, to, format):
+        if len(texts) == 1:
+            return [self._convert_one_server(texts[0], to, format)]
+        try:
+            outputs = self._post("/batch", [{"text": text, "from": format, "to": to} for text in texts])
+            return [self._output(output) for output in outputs]
+        except urllib.error.HTTPError:
+            # 批量请求中有片段失败时整个请求失败，逐个重试以定位失败的片段
+            return list(self._executor.map(lambda text: self._convert_one_server(text, to, format), texts))
+
+    def _convert_subprocess(self, text, to, format):
+        from pypandoc import convert_text
+
+        try:
+            return convert_text(text, to=to, format=format)
+        except Exception as e:
+            return PandocError(str(e))
+
+    # pandoc server 子进程
+
+    def _ensure_started(self):
+        if self.mode is not None:
+            return
+        with self._start_lock:
+            if self.mode is not None:
+                return
+            if self.server_url:
+                self.mode = "server"
+            elif self._start_server():
+                self.mode = "server"
+            else:
+                logger.warning("pandoc server is not available, converting with one pandoc process per call")
+                self.mode = "subprocess"
+
+    def _start_server(self):
+        executable = shutil.which(self.pandoc_path)
+        if executable is None:
+            # pypandoc 可能自带 pandoc（pypandoc_binary）
+            try:
+                from pypandoc import get_pandoc_path
+
+                executable = get_pandoc_path()
+            except Exception:
+                pass
+        if executable is None:
+            logger.warning(f"pandoc executable not found: {self.pandoc_path}")
+            return False
+        port = _free_port()
+        try:
+            self._process = subprocess.Popen(
+                [executable, "server", "--port", str(port), "--timeout", str(self.timeout)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError as e:
+            logger.warning(f"Could not start pandoc server: {e}")
+            return False
+        self._base_url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                logger.warning(f"pandoc server exited with code {self._process.returncode} during startup")
+                self._stop_server()
+                return False
+            try:
+                with urllib.request.urlopen(self._base_url + "/version", timeout=1) as response:
+                    version = response.read().decode("utf-8", "replace").strip()
+                logger.info(f"Started pandoc server {version} on port {port} (pid {self._process.pid})")
+                return True
+            except OSError:
+                time.sleep(0.05)
+        logger.warning("pandoc server did not start in time")
+        self._stop_server()
+        return False
+
+    def _stop_server(self):
+        if self._process is not None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+            self._process = None
+        if not self.server_url:
+            self._base_url = None
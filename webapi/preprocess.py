@@ -0,0 +1,118 @@
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZE = (448, 448)
+
+
+def pad_image(img, out_size=IMAGE_SIZE):
+    """调整图片大小并填充（原有实现，作为 ImagePreprocessor.canvas 的参照）"""
+    x_img, y_img = out_size
+    background = Image.new("RGB", (x_img, y_img), (255, 255, 255))
+    width, height = img.size
+
+    if width < x_img and height < y_img:
+        x = (x_img - width) // 2
+        y = (y_img - height) // 2
+        background.paste(img, (x, y))
+    else:
+        scale = min(x_img / width, y_img / height)
+        new_width = int(width * scale)
+        new_height = int(height * scale)
+        img_resized = img.resize((new_width, new_height), Image.LANCZOS)
+        x = (x_img - new_width) // 2
+        y = (y_img - new_height) // 2
+        background.paste(img_resized, (x, y))
+
+    return background
+
+
+class ImagePreprocessor:
+    """图片预处理：缩放填充到白色画布，再归一化为 float32 [N, 3, H, W]
+
+    canvas() 与 pad_image 逐像素一致（同一次 LANCZOS 缩放），但直接写入 uint8
+    数组，不再创建PIL画布；其字节同时用作结果缓存的键。normalize() 用每个通道
+    256项的查找表把 uint8 映射为 (x * rescale_factor - mean) / std，一步写入
+    预分配的输出缓冲区，代替 ViTImageProcessor 的校验、缩放、rescale 与
+    normalize 多次遍历。
+    """
+
+    def __init__(self, size=IMAGE_SIZE, image_mean=(0.5, 0.5, 0.5), image_std=(0.5, 0.5, 0.5),
+                 rescale_factor=1 / 255, do_rescale=True, do_normalize=True):
+        self.size = tuple(size)
+        values = np.arange(256, dtype=np.float64)
+        if do_rescale:
+            values = values * rescale_factor
+        mean = np.asarray(image_mean if do_normalize else (0.0, 0.0, 0.0), dtype=np.float64)
+        std = np.asarray(image_std if do_normalize else (1.0, 1.0, 1.0), dtype=np.float64)
+        # _lut[c, v] 为通道 c 上像素值 v 归一化后的结果
+        self._lut = ((values[None, :] - mean[:, None]) / std[:, None]).astype(np.float32)
+        self._buffer = None
+
+    @classmethod
+    def from_pretrained(cls, model_dir):
+        """从模型目录的 preprocessor_config.json 读取尺寸与 mean/std"""
+        with open(Path(model_dir) / "preprocessor_config.json", "r", encoding="utf-8") as f:
+            config = json.load(f)
+        size = config.get("size", {})
+        if isinstance(size, dict):
+            size = (size.get("width", IMAGE_SIZE[0]), size.get("height", IMAGE_SIZE[1]))
+        elif isinstance(size, int):
+            size = (size, size)
+        return cls(
+            size=size,
+            image_mean=config.get("image_mean", (0.5, 0.5, 0.5)),
+            image_std=config.get("image_std", (0.5, 0.5, 0.5)),
+            rescale_factor=config.get("rescale_factor", 1 / 255),
+            do_rescale=config.get("do_rescale", True),
+            do_normalize=config.get("do_normalize", True),
+        )
+
+    def canvas(self, image):
+        """缩放（仅在超出尺寸时）并居中放到白色画布上，返回 uint8 [H, W, 3]"""
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        x_img, y_img = self.size
+        width, height = image.size
+
+        if not (width < x_img and height < y_img):
+            scale = min(x_img / width, y_img / height)
+            image = image.resize((int(width * scale), int(height * scale)), Image.LANCZOS)
+            width, height = image.size
+
+        canvas = np.full((y_img, x_img, 3), 255, dtype=np.uint8)
+        x = (x_img - width) // 2
+        y = (y_img - height) // 2
+        canvas[y : y + height, x : x + width] = np.asarray(image)
+        return canvas
+
+    def normalize(self, canvases, out=None):
+        """把一组画布归一化写入 out（float32 [N, 3, H, W]），out 为 None 时新建"""
+        x_img, y_img = self.size
+        if out is None:
+            out = np.empty((len(canvases), 3, y_img, x_img), dtype=np.float32)
+        for i, canvas in enumerate(canvases):
+            for c in range(3):
+                np.take(self._lut[c], canvas[:, :, c], out=out[i, c])
+        return out
+
+    def normalize_into_buffer(self, canvases):
+        """归一化到复用的内部缓冲区，返回其前 N 行的视图
+
+        缓冲区只在需要更大的批次时扩容；返回的视图在下一次调用前有效，
+        因此只能由单个线程（批处理调度线程）使用。
+        """
+        x_img, y_img = self.size
+        n = len(canvases)
+        if self._buffer is None or self._buffer.shape[0] < n:
+            self._buffer = np.empty((n, 3, y_img, x_img), dtype=np.float32)
+        return self.normalize(canvases, out=self._buffer[:n])
+
+    def __call__(self, images):
+        """从PIL图片直接得到归一化的 float32 [N, 3, H, W]"""
+        return self.normalize([self.canvas(image) for image in images])
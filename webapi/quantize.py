@@ -0,0 +1,100 @@
+"""生成INT8动态量化的模型变体
+
+    python quantize.py [--model-dir ../model] [--encoder]
+
+默认只量化解码器（decoder_model_merged_int8.onnx），--encoder 同时量化编码器。
+服务端以 MIXTEX_MODEL_VARIANT=int8 / int8-full 加载时，缺少的量化文件也会自动生成。
+"""
+import argparse
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+QUANTIZED_SUFFIX = "_int8"
+
+
+class QuantizationUnavailable(RuntimeError):
+    """缺少生成量化模型所需的依赖"""
+
+
+def quantized_path(model_file):
+    """FP32 模型文件对应的量化文件路径"""
+    model_file = Path(model_file)
+    return str(model_file.with_name(f"{model_file.stem}{QUANTIZED_SUFFIX}{model_file.suffix}"))
+
+
+def source_path(quantized_file):
+    """量化文件对应的 FP32 模型文件路径"""
+    quantized_file = Path(quantized_file)
+    stem = quantized_file.stem
+    if not stem.endswith(QUANTIZED_SUFFIX):
+        raise ValueError(f"Not a quantized model file: {quantized_file}")
+    return str(quantized_file.with_name(f"{stem[: -len(QUANTIZED_SUFFIX)]}{quantized_file.suffix}"))
+
+
+def quantize_model_file(model_file, output_file):
+    """对 MatMul/Gemm 的权重做逐张量INT8动态量化
+
+    只量化常量权重（MatMulConstBOnly），注意力中两个激活相乘的 MatMul 保持FP32；
+    词嵌入（Gather）也不量化，以减少精度损失。先写入临时文件再原子替换。
+    缺少 onnx 包时抛出 QuantizationUnavailable。
+    """
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as e:
+        raise QuantizationUnavailable(
+            f"Generating INT8 model files requires the onnx package (pip install onnx): {e}"
+        ) from e
+
+    tmp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        quantize_dynamic(
+            model_file,
+            tmp_file,
+            op_types_to_quantize=["MatMul", "Gemm"],
+            weight_type=QuantType.QInt8,
+            extra_options={"MatMulConstBOnly": True},
+        )
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    logger.info(
+        f"Quantized {os.path.basename(model_file)}: "
+        f"{os.path.getsize(model_file) / 2**20:.1f} MiB -> {os.path.getsize(output_file) / 2**20:.1f} MiB"
+    )
+
+
+def ensure_quantized(path, *model_files):
+    """为不存在的量化文件从 FP32 模型生成"""
+    for model_file in model_files:
+        if Path(model_file).stem.endswith(QUANTIZED_SUFFIX) and not os.path.exists(model_file):
+            logger.info(f"Generating {os.path.basename(model_file)} (one-time)")
+            quantize_model_file(source_path(model_file), model_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate INT8 dynamic-quantized MixTeX model files")
+    parser.add_argument("--model-dir", default=os.path.abspath("../model"))
+    parser.add_argument("--encoder", action="store_true", help="also quantize the encoder")
+    parser.add_argument("--force", action="store_true", help="regenerate existing quantized files")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    names = ["decoder_model_merged.onnx"] + (["encoder_model.onnx"] if args.encoder else [])
+    for name in names:
+        model_file = os.path.join(args.model_dir, name)
+        output_file = quantized_path(model_file)
+        if args.force or not os.path.exists(output_file):
+            try:
+                quantize_model_file(model_file, output_file)
+            except QuantizationUnavailable as e:
+                raise SystemExit(str(e))
+        else:
+            logger.info(f"{output_file} already exists (use --force to regenerate)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import collections
+import hashlib
+import math
+import time
+
+
+def client_id(api_key, address):
+    """客户端标识：有API key时为 key:<哈希前缀>（不在日志与指标中暴露key本身），否则为 ip:<地址>"""
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+    return f"ip:{address or 'unknown'}"
+
+
+def parse_weights(spec):
+    """解析 "key:<api key>=4,ip:10.0.0.5=2" 形式的客户端权重，返回 {客户端标识: 权重}"""
+    weights = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.strip().rpartition("=")
+        kind, _, value = name.partition(":")
+        if kind not in ("key", "ip") or not value:
+            raise ValueError(f"client weight {item!r} must look like key:<api key>=<weight> or ip:<address>=<weight>")
+        identity = client_id(value, None) if kind == "key" else f"ip:{value}"
+        weights[identity] = float(weight)
+    return weights
+
+
+class RateLimiter:
+    """按客户端的令牌桶限流
+
+    每个客户端的桶每秒补充 rate × weight 个令牌，最多积累 burst × weight 个；
+    一次请求消耗 cost 个令牌（批量请求按图片数计）。cost 超过桶容量时只要求
+    桶是满的，扣成负数，之后的请求等待补足。只保留最近活跃的 max_clients 个桶。
+    只在事件循环线程中调用，无需加锁。每个桶同时记录被限流的次数，用于导出各客户端用量。
+    """
+
+    def __init__(self, rate, burst, max_clients=1024, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.max_clients = max_clients
+        self.clock = clock
+        # client -> [tokens, last refill time, limited count]
+        self._buckets = collections.OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def acquire(self, client, cost=1, weight=1.0):
+        """消耗令牌；允许时返回0，否则返回建议的重试等待秒数（不消耗令牌）"""
+        if not self.enabled:
+            return 0
+        now = self.clock()
+        rate = self.rate * weight
+        capacity = self.burst * weight
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [capacity, now, 0]
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        needed = min(cost, capacity)
+        if bucket[0] < needed:
+            bucket[2] += 1
+            return max(1, math.ceil((needed - bucket[0]) / rate))
+        bucket[0] -= cost
+        return 0
+
+    def client_stats(self):
+        """各客户端最近一次请求后剩余的令牌数与被限流的次数"""
+        return {
+            client: {"tokens": round(tokens, 3), "rate_limited": limited}
+            for client, (tokens, _, limited) in self._buckets.items()
+        }
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+def check_repetition(s, repeats=12):
+    """检查字符串重复"""
+    for pattern_length in range(1, len(s) // repeats + 1):
+        for start in range(len(s) - repeats * pattern_length + 1):
+            pattern = s[start : start + pattern_length]
+            if s[start : start + repeats * pattern_length] == pattern * repeats:
+                return True
+    return False
+
+
+class RepetitionDetector:
+    """增量重复检测器，与 check_repetition 的判定完全一致
+
+    check_repetition 每次都重新扫描整个字符串；而解码时文本只会在末尾追加，
+    之前的前缀已被判定为无重复，所以新出现的重复一定以新追加的字符结尾。
+    因此只需对每个周期 p 维护 runs[p]：以当前末尾结尾、满足 s[i] == s[i-p]
+    的连续位置数。末尾长度为 repeats * p 的子串由 repeats 个相同片段组成，
+    当且仅当 runs[p] >= (repeats - 1) * p。
+
+    每追加一个字符，用向量化比较更新所有 p <= len // repeats 的 runs，
+    不再构造 pattern * repeats 之类的临时字符串。
+    """
+
+    def __init__(self, repeats=12, capacity=4096):
+        self.repeats = repeats
+        self.length = 0
+        self.detected = False
+        self._chars = np.empty(capacity, dtype=np.int32)
+        # _runs[p] 对应周期 p，下标0不用
+        self._runs = np.zeros(capacity // repeats + 2, dtype=np.int64)
+        self._periods = np.arange(self._runs.shape[0], dtype=np.int64)
+        self._thresholds = (repeats - 1) * self._periods
+
+    def _grow(self):
+        capacity = self._chars.shape[0] * 2
+        chars = np.empty(capacity, dtype=np.int32)
+        chars[: self.length] = self._chars[: self.length]
+        self._chars = chars
+
+        runs = np.zeros(capacity // self.repeats + 2, dtype=np.int64)
+        runs[: self._runs.shape[0]] = self._runs
+        self._runs = runs
+        self._periods = np.arange(runs.shape[0], dtype=np.int64)
+        self._thresholds = (self.repeats - 1) * self._periods
+
+    def _admit_period(self, p, n):
+        """周期 p 首次进入检查范围时，直接计算以末尾结尾的匹配长度"""
+        chars = self._chars
+        mismatches = np.flatnonzero(chars[p:n] != chars[: n - p])
+        self._runs[p] = (n - p) - (mismatches[-1] + 1) if mismatches.size else n - p
+
+    def feed(self, text):
+        """追加文本；出现重复时返回 True（此后一直为 True）"""
+        if self.detected:
+            return True
+
+        repeats = self.repeats
+        for char in text:
+            if self.length == self._chars.shape[0]:
+                self._grow()
+
+            n = self.length
+            code = ord(char)
+            self._chars[n] = code
+            self.length = n = n + 1
+
+            max_period = n // repeats
+            if max_period == 0:
+                continue
+
+            # 已在检查范围内的周期：比较 s[n-1] 与 s[n-1-p]，p = 1..old_max
+            old_max = (n - 1) // repeats
+            if old_max:
+                runs = self._runs[1 : old_max + 1]
+                matches = self._chars[n - 1 - old_max : n - 1][::-1] == code
+                runs += 1
+                runs *= matches
+
+            if max_period > old_max:
+                self._admit_period(max_period, n)
+
+            if np.any(self._runs[1 : max_period + 1] >= self._thresholds[1 : max_period + 1]):
+                self.detected = True
+                return True
+
+        return False
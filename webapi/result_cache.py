@@ -0,0 +1,231 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 每个内存条目除文本外的估算开销（键、时间戳、OrderedDict节点）
+ENTRY_OVERHEAD = 200
+
+
+def content_key(model_version, max_length, pixel_bytes):
+    """由模型版本、生成长度和归一化后的像素计算缓存键"""
+    digest = hashlib.sha256()
+    digest.update(f"{model_version}:{max_length}:".encode())
+    digest.update(pixel_bytes)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """内容寻址的推理结果缓存
+
+    缓存的是模型生成的原始文本，格式相关的参数（use_dollars 等）在命中后再应用，
+    因此一份缓存可以服务所有参数组合。内存层按 LRU + TTL 淘汰并受字节上限约束；
+    可选的磁盘层（disk_dir）在重启后仍然有效。相同键的并发请求只计算一次。
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=24 * 3600, disk_dir=None, disk_max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = float(ttl)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = int(disk_max_bytes)
+
+        self._entries = collections.OrderedDict()  # key -> (text, created, size)
+        self._bytes = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._disk_bytes = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(f.stat().st_size for f in self.disk_dir.glob("*/*.json"))
+
+    def _expired(self, created, now):
+        return self.ttl > 0 and now - created > self.ttl
+
+    def get(self, key):
+        """查找缓存，未命中返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                text, created, _ = entry
+                if not self._expired(created, now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return text
+                self._remove(key)
+
+        text = self._disk_get(key, now)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, text, now)
+        return text
+
+    def put(self, key, text):
+        """写入缓存（内存层与磁盘层）"""
+        now = time.time()
+        with self._lock:
+            self._insert(key, text, now)
+        self._disk_put(key, text, now)
+
+    def get_or_compute(self, key, compute):
+        """命中则直接返回，否则调用 compute() 并写入缓存；同一键的并发请求共享一次计算"""
+        text = self.get(key)
+        if text is not None:
+            return text
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                owner = True
+                pending = self._inflight[key] = Future()
+            else:
+                owner = False
+
+        if not owner:
+            return pending.result()
+
+        try:
+            text = compute()
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        else:
+            self.put(key, text)
+            pending.set_result(text)
+            return text
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        """清空内存层"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """命中率与容量统计"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "disk_enabled": self.disk_dir is not None,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    # 以下方法需在持有 self._lock 时调用
+
+    def _insert(self, key, text, created):
+        size = len(text.encode("utf-8")) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (text, created, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    # 磁盘层：每个条目一个JSON文件，按键的前两位分目录
+
+    def _disk_path(self, key):
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key, now):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Corrupt cache entry {path}: {e}")
+            return None
+        if self._expired(entry["created"], now):
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                with self._lock:
+                    self._disk_bytes -= size
+            except OSError:
+                pass
+            return None
+        return entry["text"]
+
+    def _disk_put(self, key, text, created):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"text": text, "created": created}, f, ensure_ascii=False)
+            size = tmp_path.stat().st_size
+            if path.exists():
+                size -= path.stat().st_size
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {path}: {e}")
+            return
+
+        with self._lock:
+            self._disk_bytes += size
+            over_limit = self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._disk_prune()
+
+    def _disk_prune(self):
+        """磁盘层超出上限时，按修改时间删除最旧的条目直到降到上限的90%"""
+        files = []
+        for f in self.disk_dir.glob("*/*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        for _, size, f in files:
+            if total <= target:
+                break
+            try:
+                f.unlink()
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# 外部数据中每个张量的起始偏移按64KiB对齐（Windows的映射粒度，也是Linux页大小的倍数），
+# ONNX Runtime 才会直接 mmap 外部数据文件而不是把权重读入堆内存
+ALIGNMENT = 64 * 1024
+
+# 小于该大小的张量仍内联在模型文件中
+MIN_EXTERNAL_BYTES = 64 * 1024
+
+# 共享会话的额外配置：禁用权重预打包（预打包会为每个进程生成一份私有的权重副本），
+# 也不使用ORT格式的优化模型缓存（其初始化器会被读入堆内存）
+SHARED_SESSION_SETTINGS = {"disable_prepacking": True, "optimized_model_cache": False}
+
+
+def _graph_initializers(graph):
+    """遍历图及其子图（If 分支等）中的初始化器"""
+    from onnx import AttributeProto
+
+    yield from graph.initializer
+    for node in graph.node:
+        for attribute in node.attribute:
+            if attribute.type == AttributeProto.GRAPH:
+                yield from _graph_initializers(attribute.g)
+            elif attribute.type == AttributeProto.GRAPHS:
+                for subgraph in attribute.graphs:
+                    yield from _graph_initializers(subgraph)
+
+
+def shared_model_path(model_file, cache_dir=None):
+    """模型的共享权重版本路径，文件名包含原模型的大小与修改时间"""
+    model_file = Path(model_file)
+    stat = model_file.stat()
+    digest = hashlib.sha256(f"{model_file.name}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+    cache_dir = Path(cache_dir) if cache_dir else model_file.parent / ".shared"
+    return cache_dir / f"{model_file.stem}.{digest}.onnx"
+
+
+def export_shared_model(model_file, output_file):
+    """把模型的大张量写入按 ALIGNMENT 对齐的外部数据文件
+
+    多个工作进程加载同一份文件时，权重只在页缓存中存在一份（只读共享映射）。
+    """
+    import onnx
+    from onnx import TensorProto
+    from onnx.external_data_helper import set_external_data
+
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    data_name = f"{output_file.stem}.weights"
+    tmp_suffix = f".{os.getpid()}.tmp"
+    tmp_model = output_file.with_name(output_file.name + tmp_suffix)
+    tmp_data = output_file.with_name(data_name + tmp_suffix)
+
+    model = onnx.load(str(model_file))
+    offset = 0
+    try:
+        with open(tmp_data, "wb") as f:
+            for tensor in _graph_initializers(model.graph):
+                if tensor.data_location == TensorProto.EXTERNAL or len(tensor.raw_data) < MIN_EXTERNAL_BYTES:
+                    continue
+                padding = -offset % ALIGNMENT
+                f.write(b"\0" * padding)
+                offset += padding
+                data = tensor.raw_data
+                f.write(data)
+                set_external_data(tensor, data_name, offset, len(data))
+                tensor.ClearField("raw_data")
+                tensor.data_location = TensorProto.EXTERNAL
+                offset += len(data)
+        onnx.save_model(model, str(tmp_model))
+        os.replace(tmp_data, output_file.with_name(data_name))
+        os.replace(tmp_model, output_file)
+    finally:
+        for tmp in (tmp_model, tmp_data):
+            if tmp.exists():
+                tmp.unlink()
+    logger.info(f"Exported shared-weight model {output_file.name} ({offset / 2**20:.1f} MiB of external weights)")
+
+
+def ensure_shared_model(model_file, cache_dir=None):
+    """返回模型的共享权重版本，不存在时生成（并删除同一模型的旧版本）"""
+    output_file = shared_model_path(model_file, cache_dir)
+    if not output_file.exists():
+        export_shared_model(model_file, output_file)
+        for stale in output_file.parent.glob(f"{Path(model_file).stem}.*"):
+            if stale.name.split(".")[1] != output_file.name.split(".")[1] and stale.suffix in (".onnx", ".weights"):
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+    return str(output_file)
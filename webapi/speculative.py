@@ -0,0 +1,93 @@
+import threading
+from collections import OrderedDict
+
+# 查找时使用的最长与最短n-gram
+MAX_NGRAM = 3
+MIN_NGRAM = 1
+
+# 跨请求n-gram表的容量（键的个数）
+NGRAM_TABLE_SIZE = 32768
+
+
+class NgramTable:
+    """跨请求共享的n-gram续写表：最近一次出现在 n 个token之后的若干个token
+
+    公式里常见的片段（\\frac{、^{2}、\\right) 等）在不同请求间反复出现，
+    当前请求自己的历史还很短时，用它为草稿提供候选。只影响草稿的命中率，
+    不影响输出。容量满时淘汰最久未使用的键。
+    """
+
+    def __init__(self, capacity=NGRAM_TABLE_SIZE, max_ngram=MAX_NGRAM, continuation=8):
+        self.capacity = capacity
+        self.max_ngram = max_ngram
+        self.continuation = continuation
+        self._table = OrderedDict()
+        self._lock = threading.Lock()
+
+    def update(self, tokens):
+        """记录一次完整生成的token序列"""
+        tokens = tuple(tokens)
+        with self._lock:
+            for end in range(len(tokens) - 1):
+                following = tokens[end + 1:end + 1 + self.continuation]
+                for n in range(MIN_NGRAM, min(self.max_ngram, end + 1) + 1):
+                    key = tokens[end + 1 - n:end + 1]
+                    self._table[key] = following
+                    self._table.move_to_end(key)
+            while len(self._table) > self.capacity:
+                self._table.popitem(last=False)
+
+    def lookup(self, tokens, k):
+        """按末尾的 n-gram（从长到短）查找续写，没有时返回空列表"""
+        with self._lock:
+            for n in range(min(self.max_ngram, len(tokens)), MIN_NGRAM - 1, -1):
+                following = self._table.get(tuple(tokens[-n:]))
+                if following:
+                    return list(following[:k])
+        return []
+
+    def clear(self):
+        with self._lock:
+            self._table.clear()
+
+    def __len__(self):
+        return len(self._table)
+
+
+ngram_table = NgramTable()
+
+
+class PromptLookupDrafter:
+    """单行解码的草稿生成：在已生成的token中查找与末尾 n-gram 相同的更早位置，
+    把其后的token作为草稿（prompt lookup decoding）；找不到时查询 NgramTable。
+
+    _index 记录每个 n-gram 最近一次出现时的结束位置，只包含当前末尾之前的位置，
+    每追加一个token只做 MAX_NGRAM 次字典更新。
+    """
+
+    def __init__(self, table=ngram_table, max_ngram=MAX_NGRAM):
+        self.table = table
+        self.max_ngram = max_ngram
+        self.tokens = []
+        self._index = {}
+
+    def extend(self, tokens):
+        for token in tokens:
+            # 原来的末尾变为“更早的位置”，加入索引
+            end = len(self.tokens) - 1
+            for n in range(MIN_NGRAM, min(self.max_ngram, end + 1) + 1):
+                self._index[tuple(self.tokens[end + 1 - n:end + 1])] = end
+            self.tokens.append(token)
+
+    def draft(self, k):
+        """最多 k 个草稿token"""
+        if k <= 0 or not self.tokens:
+            return []
+        tokens = self.tokens
+        for n in range(min(self.max_ngram, len(tokens)), MIN_NGRAM - 1, -1):
+            end = self._index.get(tuple(tokens[-n:]))
+            if end is not None:
+                return tokens[end + 1:end + 1 + k]
+        if self.table is not None:
+            return self.table.lookup(tokens, k)
+        return []
@@ -0,0 +1,441 @@
+import functools
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+logger = logging.getLogger(__name__)
+
+# 工作进程异常退出后，重启前的等待时间（秒），避免启动即崩溃时反复重启
+RESTART_DELAY = 1.0
+
+# 分发线程轮询取消事件与进程状态的间隔（秒）
+POLL_INTERVAL = 0.05
+
+# 工作进程向前端发送指标快照的间隔（秒）
+METRICS_INTERVAL = 1.0
+
+
+def worker_main(index, requests_conn, results_conn, config):
+    """推理工作进程入口
+
+    加载共享权重的模型并预热，之后才报告就绪；预热失败时进程以异常退出。
+    从 requests_conn 接收请求，通过 results_conn 回传流式片段与结果。
+    收到 None 后处理完已排队的请求再退出。
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s",
+    )
+    from batching import BatchScheduler
+    from generation import InferenceItem, generate_items, warm_up
+    from metrics import REGISTRY
+    from model_loader import build_model
+
+    model = build_model(
+        config["model_path"],
+        variant=config["variant"],
+        tokenizer_backend=config["tokenizer_backend"],
+        ort_settings=config["ort_settings"],
+        shared_weights=True,
+    )
+    warm_up(model, config.get("warmup_batch_sizes", (1,)), use_iobinding=config["use_iobinding"])
+
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            results_conn.send(message)
+
+    scheduler = BatchScheduler(
+        lambda items: generate_items(model, items, config["use_iobinding"], config.get("draft_tokens", 0)),
+        config["batch_max_size"],
+        config["batch_max_wait_ms"],
+        name=f"worker-{index}-batch",
+    )
+    cancel_events = {}
+
+    def reply(request_id, future):
+        cancel_events.pop(request_id, None)
+        error = future.exception()
+        if error is not None:
+            send(("error", request_id, str(error)))
+        else:
+            send(("done", request_id, future.result()))
+
+    def report_metrics():
+        # 推理指标在工作进程中记录，定期把快照发给前端，由 /metrics 汇总输出
+        while True:
+            time.sleep(METRICS_INTERVAL)
+            try:
+                send(("metrics", None, REGISTRY.snapshot()))
+            except (OSError, ValueError):
+                return
+
+    send(("ready", None, {"pid": os.getpid(), "version": model.version}))
+    threading.Thread(target=report_metrics, name=f"worker-{index}-metrics", daemon=True).start()
+    while True:
+        try:
+            message = requests_conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        kind, request_id, payload = message
+        if kind == "cancel":
+            event = cancel_events.get(request_id)
+            if event is not None:
+                event.set()
+            continue
+
+        canvas, max_length, stream = payload
+        cancel_event = cancel_events[request_id] = threading.Event()
+        on_text = functools.partial(lambda rid, text: send(("text", rid, text)), request_id) if stream else None
+        future = scheduler.submit(InferenceItem(canvas, max_length, on_text, cancel_event))
+        future.add_done_callback(functools.partial(reply, request_id))
+
+    scheduler.close()
+
+
+class ModelChangedError(RuntimeError):
+    """请求绑定的模型版本已没有可用的工作进程（模型在排队前被切换），调用方应以当前模型重试"""
+
+
+class _Pending:
+    """前端进程中等待结果的请求"""
+
+    __slots__ = ("future", "on_text", "cancel_event", "cancel_sent")
+
+    def __init__(self, future, on_text, cancel_event):
+        self.future = future
+        self.on_text = on_text
+        self.cancel_event = cancel_event
+        self.cancel_sent = False
+
+
+class _Worker:
+    """一个工作进程及其管道与在途请求"""
+
+    def __init__(self, index, process, requests_conn, results_conn, restarts=0, model_version=None):
+        self.index = index
+        # 配置中的模型版本，进程就绪前即可用于分配请求
+        self.model_version = model_version
+        self.process = process
+        self.requests_conn = requests_conn
+        self.results_conn = results_conn
+        self.pending = {}
+        self.send_lock = threading.Lock()
+        self.ready = False
+        self.failed = False
+        self.retiring = False
+        self.version = None
+        self.restarts = restarts
+        self.completed = 0
+        self.metrics = {}
+
+    def send(self, message):
+        with self.send_lock:
+            self.requests_conn.send(message)
+
+
+class WorkerPool:
+    """多进程推理工作池
+
+    前端进程只做请求解析、预处理与结果缓存；推理分发到 num_workers 个工作进程，
+    每个进程有自己的ONNX会话和批处理调度器，权重通过只读内存映射在进程间共享。
+    submit() 与 BatchScheduler.submit 接口一致（InferenceItem -> Future），
+    请求发给在途请求最少的工作进程；异常退出的进程在 RESTART_DELAY 秒后自动重启，
+    其在途请求以 RuntimeError 结束。
+
+    一个分发线程负责接收所有工作进程的结果、转发取消事件并监控进程状态。
+    replace() 用于热切换模型：新一组进程全部预热就绪后才接收请求。
+    """
+
+    def __init__(self, num_workers, config):
+        self.num_workers = max(1, int(num_workers))
+        self.config = config
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = False
+        self._restart_at = {}
+        self._retired = []
+        self._staging = []
+        # 已关闭管道但尚未回收的进程，由分发线程在 _check_workers 中非阻塞地回收
+        self._exited = []
+        self._workers = [self._spawn(index) for index in range(self.num_workers)]
+        self._thread = threading.Thread(target=self._dispatch_loop, name="worker-dispatch", daemon=True)
+        self._thread.start()
+
+    def _spawn(self, index, restarts=0, config=None):
+        requests_reader, requests_writer = self._context.Pipe(duplex=False)
+        results_reader, results_writer = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=worker_main,
+            args=(index, requests_reader, results_writer, config or self.config),
+            name=f"mixtex-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        # 前端只保留自己这一端，工作进程退出时 results_reader 才能读到EOF
+        requests_reader.close()
+        results_writer.close()
+        logger.info(f"Started inference worker {index} (pid {process.pid})")
+        return _Worker(
+            index, process, requests_writer, results_reader, restarts, (config or self.config).get("model_version")
+        )
+
+    def submit(self, item):
+        """提交单个 InferenceItem，返回 concurrent.futures.Future
+
+        item.model 不为空时只发给加载了同一版本模型的进程；热切换后已没有这样的进程时
+        抛出 ModelChangedError，避免新模型的结果被写入旧版本的缓存键。
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Worker pool is closed")
+            workers = [w for w in self._workers if w is not None]
+            if not workers:
+                raise RuntimeError("No inference worker is running")
+            if item.model is not None:
+                workers = [w for w in workers if w.model_version in (None, item.model.version)]
+                if not workers:
+                    raise ModelChangedError(f"No inference worker runs model version {item.model.version}")
+            # 优先选择已就绪的进程，其次在途请求最少的
+            worker = min(workers, key=lambda w: (not w.ready, len(w.pending)))
+            request_id = next(self._ids)
+            worker.pending[request_id] = _Pending(future, item.on_text, item.cancel_event)
+
+        try:
+            worker.send(("infer", request_id, (item.canvas, item.max_length, item.on_text is not None)))
+        except OSError as e:
+            # 进程已退出，分发线程会负责重启
+            self._fail(worker, request_id, RuntimeError(f"Inference worker {worker.index} unavailable: {e}"))
+        return future
+
+    def replace(self, config, timeout=600):
+        """热切换：用新配置启动一组进程，全部预热就绪后替换当前进程组
+
+        切换前请求仍发给旧进程；切换后旧进程不再接收请求，处理完在途请求后退出。
+        新进程启动失败或超时则终止它们并抛出 RuntimeError，旧进程组保持不变。
+        """
+        with self._lock:
+            staging = [self._spawn(index, config=config) for index in range(self.num_workers)]
+            self._staging.extend(staging)
+
+        deadline = time.monotonic() + timeout
+        error = None
+        while error is None and not all(w.ready for w in staging):
+            if any(w.failed for w in staging):
+                error = "a new inference worker exited during startup or warm-up"
+            elif time.monotonic() > deadline:
+                error = f"new inference workers not ready after {timeout} s"
+            else:
+                time.sleep(POLL_INTERVAL)
+
+        if error is not None:
+            # 终止新进程，由分发线程在读到EOF后清理
+            with self._lock:
+                self._staging = [w for w in self._staging if w not in staging]
+                for worker in staging:
+                    if worker.results_conn is not None:
+                        worker.retiring = True
+                        self._retired.append(worker)
+            for worker in staging:
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            raise RuntimeError(f"Worker replacement failed: {error}")
+
+        with self._lock:
+            self.config = config
+            self._staging = [w for w in self._staging if w not in staging]
+            old = [w for w in self._workers if w is not None]
+            self._workers = staging
+            self._restart_at.clear()
+            for worker in old:
+                worker.retiring = True
+            self._retired.extend(old)
+        for worker in old:
+            try:
+                worker.send(None)
+            except OSError:
+                pass
+        logger.info(f"Switched to {len(staging)} new inference workers")
+
+    def close(self):
+        """停止所有工作进程（已提交的请求仍会执行完）"""
+        with self._lock:
+            self._closed = True
+            workers = self._all_workers()
+        for worker in workers:
+            try:
+                worker.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(timeout=30)
+        self._thread.join(timeout=1)
+
+    def ready(self):
+        """是否已有预热完成的工作进程（请求优先分给就绪的进程，不会落到仍在预热的进程上）"""
+        with self._lock:
+            return any(w is not None and w.ready for w in self._workers)
+
+    def metrics_snapshots(self):
+        """各工作进程最近一次发来的指标快照，[(标签dict, snapshot)]，供 Registry.render 汇总"""
+        with self._lock:
+            workers = [w for w in self._workers if w is not None]
+        return [({"worker": str(worker.index)}, worker.metrics) for worker in workers]
+
+    def stats(self):
+        """每个工作进程的状态与内存占用（uss 为进程独占的内存，不含共享的权重映射）"""
+        with self._lock:
+            workers = [w for w in self._workers if w is not None]
+        result = []
+        for worker in workers:
+            entry = {
+                "index": worker.index,
+                "pid": worker.process.pid,
+                "alive": worker.process.is_alive(),
+                "ready": worker.ready,
+                "in_flight": len(worker.pending),
+                "completed": worker.completed,
+                "restarts": worker.restarts,
+                "version": worker.version,
+            }
+            try:
+                import psutil
+
+                memory = psutil.Process(worker.process.pid).memory_full_info()
+                entry["rss_bytes"] = memory.rss
+                entry["uss_bytes"] = memory.uss
+            except Exception:
+                pass
+            result.append(entry)
+        return result
+
+    def _fail(self, worker, request_id, error):
+        with self._lock:
+            pending = worker.pending.pop(request_id, None)
+        if pending is not None and not pending.future.done():
+            pending.future.set_exception(error)
+
+    def _dispatch_loop(self):
+        while True:
+            with self._lock:
+                if self._closed and not any(w.process.is_alive() for w in self._all_workers()):
+                    return
+                conns = {w.results_conn: w for w in self._all_workers() if w.results_conn is not None}
+
+            for conn in wait(list(conns), timeout=POLL_INTERVAL) if conns else []:
+                worker = conns[conn]
+                try:
+                    kind, request_id, payload = conn.recv()
+                except Exception:
+                    # EOF（进程退出）或进程在发送途中被杀死留下的不完整消息
+                    self._handle_exit(worker)
+                    continue
+                self._handle_message(worker, kind, request_id, payload)
+
+            if not conns:
+                time.sleep(POLL_INTERVAL)
+            self._forward_cancels()
+            self._check_workers()
+
+    def _all_workers(self):
+        return [w for w in self._workers if w is not None] + self._retired + self._staging
+
+    def _handle_message(self, worker, kind, request_id, payload):
+        if kind == "ready":
+            worker.ready = True
+            worker.version = payload["version"]
+            logger.info(f"Inference worker {worker.index} ready (pid {payload['pid']}, version {payload['version']})")
+            return
+
+        if kind == "metrics":
+            worker.metrics = payload
+            return
+
+        if kind == "text":
+            pending = worker.pending.get(request_id)
+            if pending is not None and pending.on_text is not None:
+                try:
+                    pending.on_text(payload)
+                except Exception as e:
+                    logger.warning(f"Stream callback failed: {e}")
+            return
+
+        with self._lock:
+            pending = worker.pending.pop(request_id, None)
+        if pending is None:
+            return
+        worker.completed += 1
+        if kind == "done":
+            pending.future.set_result(payload)
+        else:
+            pending.future.set_exception(RuntimeError(payload))
+
+    def _forward_cancels(self):
+        for worker in self._all_workers():
+            for request_id, pending in list(worker.pending.items()):
+                if pending.cancel_event is not None and not pending.cancel_sent and pending.cancel_event.is_set():
+                    pending.cancel_sent = True
+                    try:
+                        worker.send(("cancel", request_id, None))
+                    except OSError:
+                        pass
+
+    def _handle_exit(self, worker):
+        """工作进程退出：让其在途请求失败，并安排重启（正在退役的进程除外）"""
+        worker.results_conn.close()
+        worker.results_conn = None
+        # 管道EOF时进程可能还没有完全退出；不在分发线程中等待，之后由 _check_workers 回收
+        worker.process.join(timeout=0)
+        exitcode = worker.process.exitcode
+        if exitcode is None:
+            self._exited.append(worker)
+        status = "exited" if exitcode is None else f"exited with code {exitcode}"
+
+        with self._lock:
+            pending = list(worker.pending.values())
+            worker.pending.clear()
+            if worker.retiring:
+                self._retired.remove(worker)
+            elif worker in self._staging:
+                worker.failed = True
+            elif self._workers[worker.index] is worker:
+                self._workers[worker.index] = None
+                if not self._closed:
+                    self._restart_at[worker.index] = (time.monotonic() + RESTART_DELAY, worker.restarts + 1)
+
+        if worker.failed:
+            logger.error(f"New inference worker {worker.index} {status} before it was ready")
+        elif not worker.retiring and not self._closed:
+            logger.error(f"Inference worker {worker.index} {status}, restarting")
+        error = RuntimeError(f"Inference worker {worker.index} {status}")
+        for entry in pending:
+            if not entry.future.done():
+                entry.future.set_exception(error)
+
+    def _check_workers(self):
+        """回收已退出的进程，重启到期的工作进程（进程退出由结果管道的EOF发现）"""
+        for worker in list(self._exited):
+            worker.process.join(timeout=0)
+            if worker.process.exitcode is not None:
+                self._exited.remove(worker)
+                logger.info(f"Inference worker {worker.index} (pid {worker.process.pid}) reaped, exit code {worker.process.exitcode}")
+
+        now = time.monotonic()
+        with self._lock:
+            due = [(index, restarts) for index, (at, restarts) in self._restart_at.items() if at <= now]
+            for index, restarts in due:
+                del self._restart_at[index]
+                if not self._closed and self._workers[index] is None:
+                    self._workers[index] = self._spawn(index, restarts)